@@ -0,0 +1,225 @@
+"""
+Offline Pipeline Benchmark for HelpSteer2
+Measures framework throughput of the baseline evaluation and a small MIPROv2 run against LocalLM
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+import dspy
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from dspy.teleprompt import MIPROv2
+from dspy.evaluate import Evaluate
+
+import optimizer.mipro_optimizer as mipro
+from src.budget import OutputBudget
+from src.concurrency import AIMDController, controlled
+from src.config import configure_dspy_with_azure
+from src.evaluator import HelpSteer2Evaluator
+from src.generator import HelpSteer2Generator
+from src.heuristics import HeuristicScorer
+
+logger = logging.getLogger(__name__)
+
+BENCH_DIR = os.path.join(mipro.DATA_DIR, 'benchmarks')
+
+_TOPICS = ["photosynthesis", "TCP handshakes", "compound interest", "vaccines", "binary search",
+           "inflation", "black holes", "REST APIs", "climate models", "neural networks"]
+_TEMPLATES = [
+    "Hi there!",
+    "Is {t} important?",
+    "What is {t}?",
+    "How does {t} work, and why does it matter?",
+    "Explain {t} to a beginner. What are the main parts? Give one example?",
+    "Write a short article comparing {t} with a related idea, covering history, mechanics and limitations.",
+]
+
+
+def synthetic_examples(n: int, seed: int = 0) -> list:
+    """Deterministic prompt mix covering every question type the verbosity rubric distinguishes."""
+    rng = random.Random(seed)
+    return [
+        dspy.Example(
+            prompt=rng.choice(_TEMPLATES).format(t=rng.choice(_TOPICS)),
+            response="",
+        ).with_inputs("prompt")
+        for _ in range(n)
+    ]
+
+
+def _measure(tracker, label: str, num_examples: int, fn) -> dict:
+    before  = tracker.accountant.totals()
+    start   = time.perf_counter()
+    score   = fn()
+    elapsed = time.perf_counter() - start
+    after   = tracker.accountant.totals()
+
+    calls             = after["calls"] - before["calls"]
+    prompt_tokens     = after["prompt_tokens"] - before["prompt_tokens"]
+    completion_tokens = after["completion_tokens"] - before["completion_tokens"]
+    result = {
+        "benchmark":              label,
+        "score":                  round(float(score), 4) if score is not None else None,
+        "examples":               num_examples,
+        "seconds":                round(elapsed, 3),
+        "examples_per_sec":       round(num_examples / elapsed, 2) if elapsed else None,
+        "lm_calls":               calls,
+        "lm_calls_per_example":   round(calls / num_examples, 2) if num_examples else None,
+        "prompt_tokens_per_call": round(prompt_tokens / calls, 1) if calls else None,
+        "completion_tokens":      completion_tokens,
+        "lm_errors":              after["errors"] - before["errors"],
+    }
+    logger.info(
+        f"  {label:<12} {result['seconds']:>8.2f}s | {result['examples_per_sec']} ex/s | "
+        f"{result['lm_calls_per_example']} calls/ex | {result['prompt_tokens_per_call']} prompt tok/call"
+    )
+    return result
+
+
+def run_benchmarks(num_examples: int = 20, threads: int = 2, judge_mode: str = "per_attribute",
+                   concurrent_judge: bool = False, heuristic_judge: bool = False,
+                   skip_mipro: bool = False, seed: int = 0, max_concurrency: int = 0,
+                   token_budget: bool = False) -> dict:
+    lm         = configure_dspy_with_azure(backend="local")
+    local_lm   = lm
+    controller = None
+    if max_concurrency:
+        controller = AIMDController(max_limit=max_concurrency)
+        lm         = controlled(lm, controller)
+        threads    = max_concurrency
+        dspy.settings.configure(lm=lm)
+
+    tracker  = mipro.TokenTracker(lm)
+    examples = synthetic_examples(num_examples, seed=seed)
+
+    mipro.evaluator_module = HelpSteer2Evaluator(
+        mode=judge_mode, concurrent=concurrent_judge,
+        heuristic=HeuristicScorer() if heuristic_judge else None,
+    )
+
+    logger.info("─" * 50)
+    logger.info(f"OFFLINE BENCHMARK ({num_examples} examples, {threads} threads, judge={judge_mode})")
+    logger.info("─" * 50)
+
+    results = []
+    program = HelpSteer2Generator()
+    evaluate = Evaluate(devset=examples, metric=mipro.helpsteer_metric,
+                        num_threads=threads, display_progress=False)
+    results.append(_measure(tracker, "baseline", num_examples, lambda: evaluate(program)))
+
+    budget_report = None
+    if token_budget:
+        # Same prompts twice: the 2000-token ceiling everywhere, then per-prompt budgets
+        runs = {}
+        for label, budget, judge_budget in (("unbudgeted", OutputBudget.unbudgeted(), False),
+                                             ("budgeted", OutputBudget(), True)):
+            budget.install(lm)
+            mipro.evaluator_module = HelpSteer2Evaluator(
+                mode=judge_mode, concurrent=concurrent_judge, budget=judge_budget,
+                heuristic=HeuristicScorer() if heuristic_judge else None,
+            )
+            measured = _measure(tracker, label, num_examples, lambda: evaluate(HelpSteer2Generator(budget=budget)))
+            runs[label] = {**budget.stats(), "total_completion_tokens": measured["completion_tokens"]}
+            results.append(measured)
+
+        before, after = runs["unbudgeted"], runs["budgeted"]
+        budget_report = {
+            "generation_tokens_saved": before["completion_tokens"] - after["completion_tokens"],
+            "total_tokens_saved":      before["total_completion_tokens"] - after["total_completion_tokens"],
+            "p99_latency_ms_before":   before["p99_latency_ms"],
+            "p99_latency_ms_after":    after["p99_latency_ms"],
+            "truncated_retries":       after["retries"],
+            "runs":                    runs,
+        }
+        logger.info(f"  Output tokens saved: {budget_report['total_tokens_saved']:,} "
+                    f"({budget_report['generation_tokens_saved']:,} generation) | generation p99 "
+                    f"{before['p99_latency_ms']} → {after['p99_latency_ms']} ms | {after['retries']} retries")
+
+    if not skip_mipro:
+        half = max(2, num_examples // 2)
+        trainset, valset = examples[:half], examples[half:] or examples[:half]
+
+        def compile_small():
+            optimizer = MIPROv2(
+                metric=mipro.helpsteer_metric, auto=None, num_candidates=2,
+                max_bootstrapped_demos=0, max_labeled_demos=0,
+                num_threads=threads, seed=42,
+            )
+            optimizer.compile(
+                HelpSteer2Generator(), trainset=trainset, valset=valset, num_trials=3,
+                requires_permission_to_run=False, minibatch=False,
+            )
+            return None
+
+        results.append(_measure(tracker, "mipro_small", len(valset), compile_small))
+
+    logger.info("─" * 50)
+    return {
+        "timestamp":        time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "num_examples":     num_examples,
+        "threads":          threads,
+        "judge_mode":       judge_mode,
+        "concurrent_judge": concurrent_judge,
+        "heuristic_judge":  heuristic_judge,
+        "lm_latency_ms":    local_lm.latency_ms,
+        "lm_failure_rate":  local_lm.failure_rate,
+        "concurrency":      controller.report() if controller else None,
+        "output_budget":    budget_report,
+        "results":          results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline HelpSteer2 pipeline benchmark (LocalLM)")
+    parser.add_argument("--num-examples", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--judge-mode", choices=HelpSteer2Evaluator.MODES, default="per_attribute")
+    parser.add_argument("--concurrent-judge", action="store_true")
+    parser.add_argument("--heuristic-judge", action="store_true")
+    parser.add_argument("--skip-mipro", action="store_true", help="Only benchmark the baseline evaluation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-concurrency", type=int, default=0,
+                        help="Run under the AIMD controller with this upper limit (replaces --threads); 0 disables")
+    parser.add_argument("--latency-ms", type=float, default=None, help="Simulated LM latency (LOCAL_LM_LATENCY_MS)")
+    parser.add_argument("--token-budget", action="store_true",
+                        help="Also compare the baseline with and without per-prompt output budgets")
+    parser.add_argument("--ms-per-token", type=float, default=None,
+                        help="Simulated decode time per output token (LOCAL_LM_MS_PER_TOKEN)")
+    parser.add_argument("--failure-rate", type=float, default=None, help="Simulated 429 rate (LOCAL_LM_FAILURE_RATE)")
+    args = parser.parse_args()
+
+    if args.latency_ms is not None:
+        os.environ["LOCAL_LM_LATENCY_MS"] = str(args.latency_ms)
+    if args.failure_rate is not None:
+        os.environ["LOCAL_LM_FAILURE_RATE"] = str(args.failure_rate)
+    if args.ms_per_token is not None:
+        os.environ["LOCAL_LM_MS_PER_TOKEN"] = str(args.ms_per_token)
+
+    report = run_benchmarks(
+        num_examples=args.num_examples,
+        threads=args.threads,
+        judge_mode=args.judge_mode,
+        concurrent_judge=args.concurrent_judge,
+        heuristic_judge=args.heuristic_judge,
+        skip_mipro=args.skip_mipro,
+        seed=args.seed,
+        max_concurrency=args.max_concurrency,
+        token_budget=args.token_budget,
+    )
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    out_path = os.path.join(BENCH_DIR, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Saved → {os.path.relpath(out_path, project_root)}")
+
+
+if __name__ == "__main__":
+    main()
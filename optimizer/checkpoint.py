@@ -0,0 +1,218 @@
+"""
+Crash-safe Checkpointing for run_optimization
+Periodically persists the split, baseline, instruction candidates, trial scores and per-example metric results
+"""
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+
+import dspy
+from dspy.teleprompt import MIPROv2
+from dspy.utils.callback import BaseCallback
+
+from src.dataset import to_example
+
+logger = logging.getLogger(__name__)
+
+# Settings that change the split, the candidates or what a score means; resuming under
+# different ones would silently mix a stale split and cached scores into the new run
+RESUME_KEYS = ("judge_mode", "seed", "heuristic_judge", "early_stop", "coreset", "module",
+               "num_candidates", "num_trials", "sample_size", "train_size", "prescreen_keep",
+               "token_budget")
+
+
+class RunCheckpoint(BaseCallback):
+    """
+    One run's state as a single JSON file, replaced atomically on every save.
+
+    Saves happen at most every `save_every` seconds while examples are being
+    scored, at every phase boundary, and once more at interpreter exit — which
+    covers Ctrl-C and uncaught exceptions. Per-example scores live in the
+    SequentialStopper, which is what lets a resumed run skip every (candidate,
+    example) pair that was already paid for.
+    """
+
+    def __init__(self, path: str, config: dict, save_every: float = 30.0):
+        self.path       = path
+        self.save_every = save_every
+        self.state = {
+            "version":                1,
+            "config":                 config,
+            "split":                  None,
+            "baseline_score":         None,
+            "instruction_candidates": None,
+            "trial_scores":           [],
+            "example_scores":         {},
+            "stopped":                {},
+            "completed":              False,
+        }
+
+        self.stopper       = None
+        self._track_trials = False
+        self._trials_seen  = 0
+        self._last_save    = 0.0
+        self._lock         = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        atexit.register(self.save, force=True)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    @classmethod
+    def fresh(cls, path: str, config: dict, **kwargs) -> "RunCheckpoint":
+        """A new run's checkpoint; an unfinished one already at path is moved aside, never overwritten."""
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    completed = json.load(f).get("completed", False)
+            except (OSError, ValueError):
+                completed = False
+            if not completed:
+                root, ext = os.path.splitext(path)
+                aside = f"{root}.{time.strftime('%Y%m%d_%H%M%S')}{ext}"
+                os.replace(path, aside)
+                logger.warning(f"Unfinished checkpoint moved to {aside} (use --resume to continue a run)")
+        return cls(path, config, **kwargs)
+
+    @classmethod
+    def load(cls, path: str, config: dict, **kwargs) -> "RunCheckpoint":
+        ckpt = cls(path, config, **kwargs)
+        if not os.path.exists(path):
+            logger.warning(f"No checkpoint at {path} — starting a fresh run")
+            return ckpt
+
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+
+        for key in RESUME_KEYS:
+            if saved["config"].get(key) != config.get(key):
+                raise ValueError(
+                    f"Checkpoint was written with {key}={saved['config'].get(key)!r}, "
+                    f"this run has {key}={config.get(key)!r}"
+                )
+
+        ckpt.state.update(saved)
+        ckpt.state["config"] = {**saved["config"], **config}
+        logger.info(
+            f"Resuming from checkpoint: baseline={'done' if saved['baseline_score'] is not None else 'pending'}, "
+            f"{len(saved['trial_scores'])} trials, "
+            f"{sum(map(len, saved['example_scores'].values()))} scored examples"
+        )
+        return ckpt
+
+    # ── State ────────────────────────────────────────────────────────────────
+    def split(self):
+        split = self.state["split"]
+        if split is None:
+            return None
+        return [to_example(r) for r in split["train"]], [to_example(r) for r in split["dev"]]
+
+    def set_split(self, trainset: list, devset: list):
+        self.state["split"] = {
+            "train": [ex.toDict() for ex in trainset],
+            "dev":   [ex.toDict() for ex in devset],
+        }
+        self.save(force=True)
+
+    @property
+    def baseline_score(self):
+        return self.state["baseline_score"]
+
+    def set_baseline_score(self, score: float):
+        self.state["baseline_score"] = score
+        self.save(force=True)
+
+    def attach(self, stopper):
+        """Restores per-example scores into the stopper and saves them from there on."""
+        self.stopper = stopper
+        # Stopped candidates are an early-stopping decision; without it they are scored in full
+        stopper.restore(self.state["example_scores"], self.state["stopped"] if stopper.early_stop else {})
+
+    def mark_completed(self):
+        self.state["completed"] = True
+        self.save(force=True)
+
+    # ── Saving ───────────────────────────────────────────────────────────────
+    def save(self, force: bool = False):
+        now = time.time()
+        if not force and now - self._last_save < self.save_every:
+            return
+
+        with self._lock:
+            self._last_save = now
+            if self.stopper is not None:
+                scores, stopped = self.stopper.state()
+                self.state["example_scores"] = scores
+                self.state["stopped"]        = stopped
+
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    def wrap_metric(self, metric):
+        """Metric that gives the checkpoint a chance to save after every scored example."""
+        def checkpointed_metric(example, prediction, trace=None):
+            score = metric(example, prediction, trace)
+            self.save()
+            return score
+
+        return checkpointed_metric
+
+    # ── Trial tracking (dspy callback) ───────────────────────────────────────
+    def install(self) -> "RunCheckpoint":
+        dspy.settings.configure(callbacks=[*(dspy.settings.callbacks or []), self])
+        return self
+
+    def track_trials(self, enabled: bool = True):
+        self._track_trials = enabled
+
+    def on_evaluate_end(self, call_id, outputs, exception=None):
+        if not self._track_trials or exception is not None:
+            return
+        try:
+            score = float(getattr(outputs, 'score', outputs))
+        except (TypeError, ValueError):
+            return
+
+        # A resumed run replays the saved trials from memoized scores; only new ones are appended
+        self._trials_seen += 1
+        if self._trials_seen <= len(self.state["trial_scores"]):
+            return
+        self.state["trial_scores"].append(round(score, 4))
+        logger.info(f"Checkpoint: trial {len(self.state['trial_scores'])} scored {score:.2f}")
+        self.save(force=True)
+
+
+class CheckpointedMIPROv2(MIPROv2):
+    """
+    MIPROv2 that proposes instruction candidates once and reuses them on resume.
+    An optional prescreen(candidates) → candidates hook narrows the proposals
+    before they are saved and searched.
+    """
+
+    def __init__(self, *args, checkpoint: RunCheckpoint = None, prescreen=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkpoint = checkpoint
+        self.prescreen  = prescreen
+
+    def _propose_instructions(self, *args, **kwargs):
+        saved = self.checkpoint.state["instruction_candidates"] if self.checkpoint else None
+        if saved is not None:
+            logger.info("Checkpoint: reusing saved instruction candidates (no proposal LM calls)")
+            return {int(i): candidates for i, candidates in saved.items()}
+
+        candidates = super()._propose_instructions(*args, **kwargs)
+        if self.prescreen is not None:
+            candidates = self.prescreen(candidates)
+        if self.checkpoint is not None:
+            self.checkpoint.state["instruction_candidates"] = {str(i): c for i, c in candidates.items()}
+            self.checkpoint.save(force=True)
+        return candidates
@@ -0,0 +1,188 @@
+"""
+Judge Comparison for HelpSteer2
+Reports drift between joint and per-attribute judging, and agreement of the
+local heuristic scorer with the LLM judge
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.config import configure_dspy_with_azure, role_lm
+from src.evaluator import HelpSteer2Evaluator
+from src.heuristics import HeuristicScorer
+from optimizer.mipro_optimizer import (
+    DATA_DIR,
+    TokenTracker,
+    composite_score,
+    load_dataset_as_examples,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _judge_all(evaluator, examples, tracker) -> tuple:
+    """Returns (per-example score dicts, tokens spent) for one judge mode."""
+    in_before, out_before = tracker.snapshot()
+    results = [
+        evaluator(prompt=ex.prompt, response=ex.response).scores
+        for ex in examples
+    ]
+    in_after, out_after = tracker.snapshot()
+    return results, (in_after - in_before) + (out_after - out_before)
+
+
+def compare_judge_modes(examples, tracker) -> dict:
+    per_attr_judge = HelpSteer2Evaluator(mode="per_attribute", lm=role_lm("judge"))
+    joint_judge    = HelpSteer2Evaluator(mode="joint", lm=role_lm("judge"))
+    per_attr_scores, per_attr_tokens = _judge_all(per_attr_judge, examples, tracker)
+    joint_scores,    joint_tokens    = _judge_all(joint_judge, examples, tracker)
+
+    n = len(examples)
+    attributes = {}
+    for attr in HelpSteer2Evaluator.ATTRIBUTES:
+        diffs = [j[attr] - p[attr] for p, j in zip(per_attr_scores, joint_scores)]
+        attributes[attr] = {
+            "mean_diff":     round(sum(diffs) / n, 4),
+            "mean_abs_diff": round(sum(abs(d) for d in diffs) / n, 4),
+            "exact_agree":   round(sum(d == 0 for d in diffs) / n, 4),
+            "within_1":      round(sum(abs(d) <= 1 for d in diffs) / n, 4),
+        }
+
+    composite_diffs = [
+        composite_score(j) - composite_score(p)
+        for p, j in zip(per_attr_scores, joint_scores)
+    ]
+
+    return {
+        "num_examples": n,
+        "attributes":   attributes,
+        "composite": {
+            "per_attribute_mean": round(sum(map(composite_score, per_attr_scores)) / n, 4),
+            "joint_mean":         round(sum(map(composite_score, joint_scores)) / n, 4),
+            "mean_abs_diff":      round(sum(abs(d) for d in composite_diffs) / n, 4),
+            "max_abs_diff":       round(max(abs(d) for d in composite_diffs), 4),
+        },
+        "tokens": {
+            "per_attribute": per_attr_tokens,
+            "joint":         joint_tokens,
+            "ratio":         round(per_attr_tokens / joint_tokens, 2) if joint_tokens else None,
+        },
+    }
+
+
+def _agreement(a: list, b: list) -> dict:
+    n = len(a)
+    if not n:
+        return {"n": 0, "exact": None, "within_1": None}
+    return {
+        "n":        n,
+        "exact":    round(sum(x == y for x, y in zip(a, b)) / n, 4),
+        "within_1": round(sum(abs(x - y) <= 1 for x, y in zip(a, b)) / n, 4),
+    }
+
+
+# The judge rubric scores verbosity and complexity against what the question
+# needs (2 = right length, 4 = far too long), while the HelpSteer2 labels only
+# grow with length and sophistication; the two scales have no common mapping,
+# so agreement with the human labels would measure nothing
+HUMAN_LABELS_NOTE = ("no *_vs_human rows: the rubric scores verbosity/complexity relative to the question, "
+                     "the HelpSteer2 labels are monotonic in length/sophistication")
+
+
+def compare_heuristic(examples, scorer: HeuristicScorer) -> dict:
+    """
+    Scores the dataset responses with the heuristic and the LLM judge and
+    reports their agreement — over all examples and over the confident subset
+    the evaluator would actually skip.
+    """
+    judge  = HelpSteer2Evaluator(mode="per_attribute", lm=role_lm("judge"))
+    report = {}
+
+    for attr in scorer.ATTRIBUTES:
+        local, llm, confident = [], [], []
+        for ex in examples:
+            h = scorer.score(attr, ex.prompt, ex.response)
+            local.append(h.score)
+            confident.append(h.confidence >= scorer.min_confidence)
+            llm.append(judge._judge_attr(attr, ex.prompt, ex.response)[0])
+
+        pick = lambda xs: [x for x, c in zip(xs, confident) if c]
+        report[attr] = {
+            "coverage":         round(sum(confident) / len(examples), 4),
+            "heuristic_vs_llm": _agreement(local, llm),
+            "confident_vs_llm": _agreement(pick(local), pick(llm)),
+            "note":             HUMAN_LABELS_NOTE,
+        }
+
+    return report
+
+
+def _log_heuristic(report: dict):
+    logger.info("─" * 50)
+    logger.info("HEURISTIC SCORER AGREEMENT (exact / ±1)")
+    logger.info("─" * 50)
+    for attr, stats in report.items():
+        logger.info(f"  {attr} — confident on {stats['coverage']:.0%} of examples")
+        for name in ("heuristic_vs_llm", "confident_vs_llm"):
+            a = stats[name]
+            if a["n"]:
+                logger.info(f"    {name:<20} {a['exact']:.0%} / {a['within_1']:.0%}  (n={a['n']})")
+    logger.info(f"  ({HUMAN_LABELS_NOTE})")
+    logger.info("─" * 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare judging strategies on the same examples")
+    parser.add_argument("--compare", choices=["modes", "heuristic"], default="modes",
+                        help="modes = joint vs per-attribute, heuristic = local scorer vs LLM judge")
+    parser.add_argument("--num-examples", type=int, default=20,
+                        help="Number of devset examples to judge")
+    args = parser.parse_args()
+
+    lm      = configure_dspy_with_azure()
+    tracker = TokenTracker(lm)
+    tracker.watch(role_lm("judge"))
+
+    _, devset = load_dataset_as_examples()
+    examples  = devset[:args.num_examples]
+
+    if args.compare == "heuristic":
+        report = compare_heuristic(examples, HeuristicScorer())
+        _log_heuristic(report)
+        out_path = os.path.join(DATA_DIR, "heuristic_agreement.json")
+        with open(out_path, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info("Saved → data/heuristic_agreement.json")
+        return
+
+    report = compare_judge_modes(examples, tracker)
+
+    logger.info("─" * 50)
+    logger.info(f"JUDGE MODE DRIFT ({report['num_examples']} examples, joint − per-attribute)")
+    logger.info("─" * 50)
+    for attr, stats in report["attributes"].items():
+        logger.info(
+            f"  {attr:<12} mean Δ {stats['mean_diff']:+.2f} | |Δ| {stats['mean_abs_diff']:.2f} | "
+            f"exact {stats['exact_agree']:.0%} | ±1 {stats['within_1']:.0%}"
+        )
+    comp = report["composite"]
+    logger.info(f"  composite    per-attr {comp['per_attribute_mean']:.4f} | joint {comp['joint_mean']:.4f} | "
+                f"|Δ| {comp['mean_abs_diff']:.4f} (max {comp['max_abs_diff']:.4f})")
+    logger.info(f"  tokens       per-attr {report['tokens']['per_attribute']:,} | joint {report['tokens']['joint']:,} "
+                f"| ratio {report['tokens']['ratio']}x")
+    logger.info("─" * 50)
+
+    out_path = os.path.join(DATA_DIR, "judge_comparison.json")
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info("Saved → data/judge_comparison.json")
+
+
+if __name__ == "__main__":
+    main()
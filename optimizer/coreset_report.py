@@ -0,0 +1,82 @@
+"""
+Coreset Ranking Fidelity
+Checks, from stored judge results, whether devset coresets rank candidates like the full devset — no LM calls
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.coreset import deduplicate, ranking_fidelity, select_coreset
+from src.score_store import ScoreStore, composite
+from optimizer.early_stopping import example_key
+from optimizer.mipro_optimizer import (
+    COMPLEXITY_MAP,
+    DATA_DIR,
+    METRIC_WEIGHTS,
+    VERBOSITY_MAP,
+    load_dataset_as_examples,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _fmt(value, spec: str) -> str:
+    """Random baselines are None when every sampled subset tied; show that instead of failing."""
+    return "n/a" if value is None else format(value, spec)
+
+
+def coreset_report(store: ScoreStore, sizes: list, runs: list = None, seed: int = 42) -> list:
+    """
+    One row per coreset size. The pool is the full devset of `seed`, so the runs
+    must have been scored on it (i.e. without --coreset).
+    """
+    _, devset = load_dataset_as_examples(seed=seed)
+    pool      = [example_key(ex.prompt) for ex in devset]
+    unique    = deduplicate(devset)
+
+    columns = store.load(runs)
+    values  = composite(columns['scores'], METRIC_WEIGHTS, {"complexity": COMPLEXITY_MAP, "verbosity": VERBOSITY_MAP})
+
+    rows = []
+    for size in sizes:
+        subset = [example_key(ex.prompt) for ex in select_coreset(unique, size, seed=seed)]
+        rows.append(ranking_fidelity(columns['candidate'], columns['example'], values, pool, subset, seed=seed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ranking fidelity of devset coresets against the full devset")
+    parser.add_argument("--sizes", default="8,12,16,20,24", help="Comma-separated coreset sizes")
+    parser.add_argument("--runs", nargs="*", help="Runs under data/scores (default: all)")
+    parser.add_argument("--seed", type=int, default=42, help="Split seed the runs were scored with")
+    parser.add_argument("--out", default=os.path.join(DATA_DIR, "coreset_fidelity.json"),
+                        help="Where to write the rows as JSON")
+    args = parser.parse_args()
+
+    rows = coreset_report(ScoreStore(), [int(s) for s in args.sizes.split(',')], runs=args.runs, seed=args.seed)
+
+    logger.info("─" * 50)
+    logger.info(f"CORESET FIDELITY ({rows[0]['candidates'] if rows else 0} fully scored candidates)")
+    logger.info("─" * 50)
+    for r in rows:
+        if r["spearman"] is None:
+            logger.info(f"  {r['subset']:>3}/{r['pool']} examples: need at least 3 fully scored candidates")
+            continue
+        logger.info(f"  {r['subset']:>3}/{r['pool']} examples: Spearman {r['spearman']:+.3f} "
+                    f"(random {_fmt(r['random_spearman'], '+.3f')}, beats {_fmt(r['beats_random'], '.0%')}) | "
+                    f"top-1 {'match' if r['top1_match'] else 'MISS'} (random {r['random_top1_match']:.0%})")
+    logger.info("─" * 50)
+
+    with open(args.out, "w") as f:
+        json.dump(rows, f, indent=2)
+    logger.info(f"Saved → {os.path.relpath(args.out, project_root)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Sequential Early Stopping for MIPROv2 Candidates
+Stops scoring an instruction candidate once it cannot beat the incumbent
+"""
+
+import math
+import logging
+import threading
+import dspy
+
+from src.cache import content_key
+from src.generator import HelpSteer2Generator
+
+logger = logging.getLogger(__name__)
+
+
+def example_key(prompt: str) -> str:
+    return content_key('example', prompt)[:16]
+
+
+def candidate_key(instructions: str) -> str:
+    return content_key('candidate', instructions)[:12]
+
+
+class SequentialStopper:
+    """
+    Per-example scores for every instruction candidate, streamed in as the metric runs.
+
+    The first candidate to be scored on the whole devset becomes the incumbent
+    (MIPROv2 always starts with the unmodified program). Each later candidate is
+    compared with the incumbent on the examples both have seen: once the one-sided
+    upper confidence bound of the paired score difference drops below zero, the
+    candidate is stopped and its remaining examples are answered with FLOOR
+    instead of a generation plus judge calls. With reuse=True a (candidate,
+    example) pair that was already scored is never scored again. With
+    early_stop=False and reuse=False the stopper only records scores, which is
+    what a checkpoint saves; MIPROv2 then scores every trial as it normally would.
+    """
+
+    # The metric's lowest score. A stopped candidate already trails the incumbent on
+    # the examples both have seen, so with FLOOR on the rest its devset mean stays
+    # below the incumbent's and MIPROv2 cannot pick it from partial data; its running
+    # mean could, since the paired examples are only part of the devset.
+    FLOOR = 0.0
+
+    def __init__(self, num_examples: int, min_examples: int = 8, z: float = 1.645,
+                 min_std: float = 0.05, calls_per_example: int = 6, early_stop: bool = True,
+                 reuse: bool = True):
+        self.num_examples      = num_examples
+        self.early_stop        = early_stop
+        self.reuse             = reuse
+        self.min_examples      = min_examples
+        self.z                 = z
+        self.min_std           = min_std
+        self.calls_per_example = calls_per_example
+
+        self.scores    = {}      # candidate → {example → score}
+        self.stopped   = {}      # candidate → examples seen when stopped
+        self.incumbent = None
+        self.skipped   = 0
+        self.reused    = 0
+        self._lock     = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        # MIPROv2 deep-copies the program per trial; all copies report into one stopper.
+        return self
+
+    # ── Lookups ──────────────────────────────────────────────────────────────
+    def lookup(self, candidate: str, example: str):
+        """A score that makes the LM calls unnecessary, or None if the example must be scored."""
+        with self._lock:
+            seen = self.scores.get(candidate, {})
+            if self.reuse and example in seen:
+                self.reused += 1
+                return seen[example]
+            if candidate in self.stopped:
+                self.skipped += 1
+                return self.FLOOR
+        return None
+
+    def record(self, candidate: str, example: str, score: float):
+        with self._lock:
+            seen = self.scores.setdefault(candidate, {})
+            if example in seen or candidate in self.stopped:
+                return
+            seen[example] = score
+
+            if len(seen) == self.num_examples:
+                self._maybe_promote(candidate)
+            else:
+                self._maybe_stop(candidate)
+
+    # ── Decisions ────────────────────────────────────────────────────────────
+    def _mean(self, seen: dict) -> float:
+        return round(sum(seen.values()) / len(seen), 4) if seen else 0.0
+
+    def _maybe_promote(self, candidate: str):
+        mean = self._mean(self.scores[candidate])
+        if self.incumbent is None or mean > self._mean(self.scores[self.incumbent]):
+            logger.info(f"Early stopping: incumbent is now {candidate} (mean {mean:.4f})")
+            self.incumbent = candidate
+
+    def _maybe_stop(self, candidate: str):
+        if not self.early_stop or self.incumbent is None or candidate == self.incumbent:
+            return
+
+        seen  = self.scores[candidate]
+        best  = self.scores[self.incumbent]
+        diffs = [score - best[ex] for ex, score in seen.items() if ex in best]
+        n     = len(diffs)
+        if n < self.min_examples:
+            return
+
+        mean_diff = sum(diffs) / n
+        std       = math.sqrt(sum((d - mean_diff) ** 2 for d in diffs) / (n - 1))
+        upper     = mean_diff + self.z * max(std, self.min_std) / math.sqrt(n)
+        if upper >= 0:
+            return
+
+        self.stopped[candidate] = len(seen)
+        remaining = self.num_examples - len(seen)
+        logger.info(
+            f"Early stopping: candidate {candidate} stopped after {len(seen)}/{self.num_examples} examples "
+            f"(mean Δ vs incumbent {mean_diff:+.4f}, upper bound {upper:+.4f}) — "
+            f"saves up to {remaining * self.calls_per_example} LM calls per evaluation"
+        )
+
+    # ── Checkpointing ────────────────────────────────────────────────────────
+    def state(self) -> tuple:
+        """(scores, stopped) as plain dicts, safe to serialise while the metric runs."""
+        with self._lock:
+            return {c: dict(seen) for c, seen in self.scores.items()}, dict(self.stopped)
+
+    def restore(self, scores: dict, stopped: dict):
+        """Reloads saved scores, re-deriving the incumbent from fully scored candidates."""
+        with self._lock:
+            self.scores  = {c: dict(seen) for c, seen in scores.items()}
+            self.stopped = dict(stopped)
+            for candidate, seen in self.scores.items():
+                if len(seen) == self.num_examples:
+                    self._maybe_promote(candidate)
+
+    # ── dspy integration ─────────────────────────────────────────────────────
+    def wrap_metric(self, metric):
+        """Metric that answers short-circuited predictions and records every fresh score."""
+        def stopping_metric(example, prediction, trace=None):
+            precomputed = getattr(prediction, 'precomputed_score', None)
+            if precomputed is not None:
+                return precomputed
+
+            score = metric(example, prediction, trace)
+            candidate = getattr(prediction, 'candidate', None)
+            if candidate is not None and trace is None:
+                self.record(candidate, example_key(example.prompt), score)
+            return score
+
+        return stopping_metric
+
+    def summary(self) -> dict:
+        saved = (self.skipped + self.reused) * self.calls_per_example
+        return {
+            "incumbent":        self.incumbent,
+            "candidates":       len(self.scores),
+            "stopped":          dict(self.stopped),
+            "skipped_examples": self.skipped,
+            "reused_examples":  self.reused,
+            "lm_calls_saved":   saved,
+        }
+
+    def report(self):
+        s = self.summary()
+        logger.info("─" * 50)
+        logger.info("EARLY STOPPING REPORT")
+        logger.info("─" * 50)
+        logger.info(f"  Candidates seen  : {s['candidates']}")
+        logger.info(f"  Stopped early    : {len(s['stopped'])}")
+        logger.info(f"  Skipped examples : {s['skipped_examples']}")
+        logger.info(f"  Reused examples  : {s['reused_examples']}")
+        logger.info(f"  LM calls saved   : {s['lm_calls_saved']:,}")
+        logger.info("─" * 50)
+        return s
+
+
+class StoppableGenerator(HelpSteer2Generator):
+    """HelpSteer2Generator that skips generation when the stopper already has a score."""
+
+    def __init__(self, stopper: SequentialStopper = None, **kwargs):
+        super().__init__(**kwargs)
+        self.stopper = stopper
+
+    def forward(self, prompt: str):
+        if self.stopper is None:
+            return super().forward(prompt)
+
+        predictor = getattr(self.generate, 'predict', self.generate)
+        candidate = candidate_key(predictor.signature.instructions)
+
+        score = self.stopper.lookup(candidate, example_key(prompt))
+        if score is not None:
+            return dspy.Prediction(response='', candidate=candidate, precomputed_score=score)
+
+        result = super().forward(prompt)
+        result['candidate'] = candidate
+        return result
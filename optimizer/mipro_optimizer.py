@@ -5,24 +5,41 @@ Auto-optimizes HelpSteer2Signature instructions via Bayesian search
 
 import os
 import sys
+import time
+import argparse
 import json
 import logging
-import random
 import dspy
 
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 
-from dspy.teleprompt import MIPROv2
 from dspy.evaluate import Evaluate
 
-from src.config import configure_dspy_with_azure
+from src.accounting import UsageAccountant
+from src.budget import OutputBudget
+from src.cache import GenerationCache, JudgeCache
+from src.concurrency import AIMDController, controlled, is_throttle, retry_after
+from src.coreset import deduplicate, select_coreset
+from src.config import configure_dspy_with_azure, role_lm
+from src.dataset import load_split
 from src.generator import HelpSteer2Generator
 from src.evaluator import HelpSteer2Evaluator
+from src.heuristics import HeuristicScorer
+from src.history import HISTORY_DIR, bound_history
+from src.registry import SignatureRegistry
+from src.score_store import ScoreStore
+from src.surrogate import SHARED_SCALE, SurrogateScorer
+from src.tracing import tracer
+from optimizer.checkpoint import CheckpointedMIPROv2, RunCheckpoint
+from optimizer.early_stopping import SequentialStopper, StoppableGenerator, example_key
+from optimizer.prescreen import prescreen_candidates
 
 DATA_DIR = os.path.join(project_root, 'data')
 os.makedirs(DATA_DIR, exist_ok=True)
 
+CHECKPOINT_PATH = os.path.join(DATA_DIR, 'checkpoints', 'run_state.json')
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -35,13 +52,38 @@ logger = logging.getLogger(__name__)
 
 # ── Token Tracker ─────────────────────────────────────────────────────────────
 class TokenTracker:
-    def __init__(self, lm):
+    """
+    Cost report over UsageAccountant counters, which are updated as each LM call
+    completes — no re-scan of lm.history, and tokens are split by module and phase.
+    """
+
+    def __init__(self, lm, judge_cache=None, generation_cache=None, stream_path=None):
         self.lm = lm
+        self.lms = [lm]
+        self.judge_cache = judge_cache
+        self.generation_cache = generation_cache
+        self.accountant = UsageAccountant(
+            attribute_names={desc: name for name, desc in HelpSteer2Evaluator.ATTRIBUTES.items()},
+            stream_path=stream_path,
+        ).install(lm)
+
+    def watch(self, lm):
+        """Also account for a second LM, e.g. a separate judge pool."""
+        if lm is not None and all(lm is not seen for seen in self.lms):
+            self.lms.append(lm)
+            self.accountant.install(lm)
+
+    def set_phase(self, phase: str, count_trials: bool = False):
+        self.accountant.set_phase(phase, count_trials=count_trials)
+        tracer.set_phase(phase)
 
     def snapshot(self):
-        total_in  = sum(h.get("usage", {}).get("prompt_tokens",     0) for h in self.lm.history)
-        total_out = sum(h.get("usage", {}).get("completion_tokens", 0) for h in self.lm.history)
-        return total_in, total_out
+        totals = self.accountant.totals()
+        return totals["prompt_tokens"], totals["completion_tokens"]
+
+    def breakdown(self) -> dict:
+        self.accountant.write_stream()
+        return self.accountant.summary()
 
     def report(self, label: str = ""):
         total_in, total_out = self.snapshot()
@@ -58,9 +100,13 @@ class TokenTracker:
         logger.info(f"  Input  cost   : ${input_cost:.4f}")
         logger.info(f"  Output cost   : ${output_cost:.4f}")
         logger.info(f"  TOTAL  COST   : ${total_cost:.4f}")
-        logger.info("─" * 50)
 
-        return {
+        by_module = self.accountant.summary()["by_module"]
+        for module, c in sorted(by_module.items(), key=lambda kv: -kv[1]["prompt_tokens"]):
+            logger.info(f"    {module:<32} {c['calls']:>5} calls | "
+                        f"{c['prompt_tokens'] + c['completion_tokens']:>9,} tok | {c['mean_latency_ms']:>7.0f} ms avg")
+
+        report = {
             "input_tokens":  total_in,
             "output_tokens": total_out,
             "total_tokens":  total_in + total_out,
@@ -69,89 +115,121 @@ class TokenTracker:
             "total_cost":    round(total_cost,  4),
         }
 
+        if self.judge_cache is not None:
+            cache_stats = self.judge_cache.stats()
+            logger.info(f"  Judge cache   : {cache_stats['hits']:,} hits / {cache_stats['misses']:,} misses "
+                        f"({cache_stats['hit_rate']:.1%}), {cache_stats['entries']:,} entries")
+            report["judge_cache"] = cache_stats
+
+        if self.generation_cache is not None:
+            cache_stats = self.generation_cache.stats()
+            logger.info(f"  Gen cache     : {cache_stats['hits']:,} hits / {cache_stats['misses']:,} misses "
+                        f"({cache_stats['hit_rate']:.1%}), {cache_stats['entries']:,} entries")
+            report["generation_cache"] = cache_stats
+
+        for lm in self.lms:
+            lm = getattr(lm, 'inner', lm)   # unwrap ControlledLM
+            if hasattr(lm, 'stats'):        # PooledLM
+                for name, m in lm.stats().items():
+                    logger.info(f"  Pool {name:<20}: {m['calls']:>5} calls | {m['failures']} failures | "
+                                f"{m['ewma_ms'] or 0:>7.0f} ms ewma{'' if m['healthy'] else ' | cooling down'}")
 
-# ── Load Dataset ──────────────────────────────────────────────────────────────
-def is_clean_prompt(example: dict) -> bool:
-    prompt_lower = example.get('prompt', '').lower()
-    if any(w in prompt_lower for w in ['dan', 'jailbreak', 'ignore previous', 'bypass', 'do anything now']):
-        return False
-    if any(p in prompt_lower for p in ["let's play a game", 'quizzer', 'repeat the above']):
-        return False
-    if any(p in prompt_lower for p in ['kill my', 'harm ', 'hurt my']):
-        return False
-    if prompt_lower.count('<extra_id_1>') > 6:
-        return False
-    return True
-
-
-def load_dataset_as_examples() -> tuple:
-    dataset_file = os.path.join(DATA_DIR, 'training_data.json')
-
-    with open(dataset_file, 'r', encoding='utf-8') as f:
-        dataset = json.load(f)
-
-    logger.info(f"Loaded {len(dataset)} records from training_data.json")
-
-    clean = [ex for ex in dataset if is_clean_prompt(ex)]
-    logger.info(f"Clean examples after filtering: {len(clean)}")
-
-    examples = [
-        dspy.Example(
-            prompt      = r["prompt"],
-            response    = r["response"],
-            helpfulness = r.get("helpfulness", 0),
-            correctness = r.get("correctness", 0),
-            coherence   = r.get("coherence",   0),
-            complexity  = r.get("complexity",  0),
-            verbosity   = r.get("verbosity",   0),
-            goodness    = r.get("goodness",    0.0),
-        ).with_inputs("prompt")
-        for r in clean
-    ]
-
-
-    sample   = random.sample(examples,200)  
-    trainset = sample[:160]     # 160 train
-    devset   = sample[160:]     # 40 dev  
+        logger.info("─" * 50)
+        return report
 
 
+# ── Load Dataset ──────────────────────────────────────────────────────────────
+def dataset_path() -> str:
+    """training_data.jsonl is streamed; the legacy training_data.json array is still accepted."""
+    jsonl_path = os.path.join(DATA_DIR, 'training_data.jsonl')
+    if os.path.exists(jsonl_path):
+        return jsonl_path
+    return os.path.join(DATA_DIR, 'training_data.json')
+
+
+def load_dataset_as_examples(seed: int = 42, coreset: int = 0, sample_size: int = 200,
+                             train_size: int = 160) -> tuple:
+    trainset, devset = load_split(dataset_path(), sample_size=sample_size, train_size=train_size, seed=seed)
+    if coreset:
+        # Every trial scores the whole devset, so it is where fewer examples pay off
+        trainset = deduplicate(trainset)
+        devset   = select_coreset(deduplicate(devset), coreset, seed=seed)
     logger.info(f"Trainset: {len(trainset)} | Devset: {len(devset)}")
     return trainset, devset
 
 
 # ── Metric — scored (0.0-1.0 float) so MIPROv2 can differentiate ─────────────
 evaluator_module = None
+score_store      = None
+surrogate        = None
+
+COMPLEXITY_MAP = {0: 0.0, 1: 0.7, 2: 1.0, 3: 0.3, 4: 0.0}
+VERBOSITY_MAP  = {0: 0.0, 1: 0.3, 2: 1.0, 3: 0.3, 4: 0.0}
+
+METRIC_WEIGHTS = {
+    "helpfulness": 0.30,
+    "correctness": 0.25,
+    "coherence":   0.25,
+    "complexity":  0.10,
+    "verbosity":   0.10,
+}
+
+
+def composite_score(s: dict) -> float:
+    """Weighted 0.0-1.0 composite of the five 0-4 attribute scores."""
+    help_score = s["helpfulness"] / 4.0
+    corr_score = s["correctness"] / 4.0
+    coh_score  = s["coherence"]   / 4.0
+
+    comp_score = COMPLEXITY_MAP.get(s["complexity"], 0.0)
+    verb_score = VERBOSITY_MAP.get(s["verbosity"],   0.0)
+
+    score = (
+        help_score * METRIC_WEIGHTS["helpfulness"] +
+        corr_score * METRIC_WEIGHTS["correctness"] +
+        coh_score  * METRIC_WEIGHTS["coherence"]   +
+        comp_score * METRIC_WEIGHTS["complexity"]  +
+        verb_score * METRIC_WEIGHTS["verbosity"]
+    )
 
-def helpsteer_metric(example, prediction, trace=None):
-    global evaluator_module
-    try:
-        eval_result = evaluator_module(
-            prompt=example.prompt,
-            response=prediction.response
-        )
-        s = eval_result.scores
+    return round(score, 4)
 
-        help_score = s["helpfulness"] / 4.0
-        corr_score = s["correctness"] / 4.0
-        coh_score  = s["coherence"]   / 4.0
 
-        complexity_map = {0: 0.0, 1: 0.7, 2: 1.0, 3: 0.3, 4: 0.0}
-        verbosity_map  = {0: 0.0, 1: 0.3, 2: 1.0, 3: 0.3, 4: 0.0}
+# ControlledLM already retries each throttled call; these are extra rounds per example
+# for a throttle that outlasted them (judge attributes already scored come from the cache)
+METRIC_THROTTLE_RETRIES = 3
 
-        comp_score = complexity_map.get(s["complexity"], 0.0)
-        verb_score = verbosity_map.get(s["verbosity"],   0.0)
 
-        score = (
-            help_score * 0.30 +
-            corr_score * 0.25 +
-            coh_score  * 0.25 +
-            comp_score * 0.10 +
-            verb_score * 0.10
-        )
+def judge_with_retry(example, prediction):
+    for attempt in range(METRIC_THROTTLE_RETRIES + 1):
+        try:
+            return evaluator_module(prompt=example.prompt, response=prediction.response)
+        except Exception as e:
+            if not is_throttle(e) or attempt == METRIC_THROTTLE_RETRIES:
+                raise
+            delay = retry_after(e) or 5.0 * 2 ** attempt
+            logger.warning(f"Metric: judge throttled ({e}), retrying example in {delay:.0f}s")
+            time.sleep(delay)
+
 
-        return round(score, 4)
+@tracer.traced("metric", "metric")
+def helpsteer_metric(example, prediction, trace=None):
+    global evaluator_module
+    try:
+        eval_result = judge_with_retry(example, prediction)
+        if score_store is not None:
+            score_store.record(getattr(prediction, 'candidate', None), example_key(example.prompt),
+                               eval_result.scores, eval_result.justifications)
+        if surrogate is not None:
+            surrogate.observe(example.prompt, prediction.response, eval_result.scores)
+        return composite_score(eval_result.scores)
 
     except Exception as e:
+        # A throttle that outlasts every retry goes to Evaluate, which still scores the
+        # example 0.0 but counts it toward max_errors, so a sustained outage aborts
+        # the evaluation instead of quietly dragging its score down
+        if is_throttle(e):
+            raise
         logger.warning(f"Metric evaluation failed: {e}")
         return 0.0
 
@@ -180,62 +258,195 @@ def log_signature_changes(before: dspy.Module, after: dspy.Module):
 
 
 # ── Main Optimization ─────────────────────────────────────────────────────────
-def run_optimization():
-    global evaluator_module
+def run_optimization(judge_mode: str = "per_attribute", concurrent_judge: bool = False,
+                     judge_cache: bool = True, generation_samples: int = 0, seed: int = 42,
+                     early_stop: bool = False, heuristic_judge: bool = False,
+                     checkpoint: bool = True, resume: bool = False,
+                     max_concurrency: int = 32, initial_concurrency: int = 4,
+                     publish: str = "none", run_name: str = None, prescreen_keep: int = 0,
+                     prescreen_examples: int = 8, coreset: int = 0, trace: str = None,
+                     token_budget: bool = False, history_buffer: int = 0, num_candidates: int = 6,
+                     num_trials: int = 10, module: str = "predict", sample_size: int = 200,
+                     train_size: int = 160, output_dir: str = None, quota=None):
+    global evaluator_module, score_store, surrogate
 
     logger.info("=" * 70)
     logger.info("MIPROv2 OPTIMIZATION — HelpSteer2 Middle 2000")
     logger.info("=" * 70)
 
-    lm      = configure_dspy_with_azure()
-    tracker = TokenTracker(lm)
+    # Spans cost one attribute check each unless a trace file is asked for
+    if trace:
+        tracer.enable(trace)
+    run_span = tracer.begin("run_optimization", "run", judge_mode=judge_mode, seed=seed)
+
+    # Sweeps run several of these at once; each one's outputs then go to its own directory
+    out_dir = output_dir or DATA_DIR
+    os.makedirs(out_dir, exist_ok=True)
+
+    # One AIMD limit across generator and judge calls; threads only need to exceed it
+    # (a sweep's SharedQuota adds one budget across all of its worker processes)
+    controller = AIMDController(initial=initial_concurrency, max_limit=max_concurrency, shared=quota)
+    lm         = controlled(configure_dspy_with_azure(), controller)
+    dspy.settings.configure(lm=lm)
+    tracer.install(lm)
+
+    # max_tokens per generation from the prompt's question type, instead of 2000 for every call
+    budget = OutputBudget().install(lm) if token_budget else None
+
+    cache     = JudgeCache() if judge_cache else None
+    gen_cache = GenerationCache(samples_per_key=generation_samples) if generation_samples else None
+    tracker   = TokenTracker(
+        lm, judge_cache=cache, generation_cache=gen_cache,
+        stream_path=os.path.join(out_dir, "usage_stream.jsonl"),
+    )
 
-    trainset, devset = load_dataset_as_examples()
+    # Every LM-backed result is checkpointed; --resume reloads it and re-scores nothing already paid for
+    ckpt = None
+    if checkpoint or resume:
+        config = {"judge_mode": judge_mode, "seed": seed, "heuristic_judge": heuristic_judge,
+                  "early_stop": early_stop, "coreset": coreset, "module": module,
+                  "num_candidates": num_candidates, "num_trials": num_trials, "sample_size": sample_size,
+                  "train_size": train_size, "prescreen_keep": prescreen_keep, "token_budget": token_budget}
+        ckpt_path = CHECKPOINT_PATH if output_dir is None else os.path.join(out_dir, 'run_state.json')
+        ckpt = (RunCheckpoint.load if resume else RunCheckpoint.fresh)(ckpt_path, config).install()
+
+    split = ckpt.split() if ckpt else None
+    if split is not None:
+        trainset, devset = split
+        logger.info(f"Trainset: {len(trainset)} | Devset: {len(devset)} (from checkpoint)")
+    else:
+        trainset, devset = load_dataset_as_examples(seed=seed, coreset=coreset, sample_size=sample_size,
+                                                    train_size=train_size)
+        if ckpt:
+            ckpt.set_split(trainset, devset)
+
+    judge_lm = controlled(role_lm("judge"), controller)
+    tracker.watch(judge_lm)
+    if judge_lm is not None:
+        tracer.install(judge_lm)
+
+    # Every judged example is kept per run for later re-analysis (optimizer/rescore.py)
+    # (a resumed run keeps appending to the run it started)
+    run_name = run_name or (ckpt.state["config"].get("run_name") if ckpt else None) \
+        or time.strftime("run_%Y%m%d_%H%M%S")
+    if ckpt:
+        ckpt.state["config"]["run_name"] = run_name
+    score_store = ScoreStore(run=run_name, phase_fn=lambda: tracker.accountant.phase)
+
+    # Counters above never read lm.history, so long runs can keep only its tail in memory
+    history = None
+    if history_buffer:
+        history = bound_history(history_buffer, os.path.join(HISTORY_DIR, f"{run_name}.jsonl.gz"),
+                                lms=tracker.lms)
+
+    heuristic        = HeuristicScorer() if heuristic_judge else None
+    evaluator_module = HelpSteer2Evaluator(mode=judge_mode, concurrent=concurrent_judge, cache=cache,
+                                           heuristic=heuristic, lm=judge_lm, budget=token_budget)
+
+    # Early stopping shares per-example scores between the baseline evaluation
+    # and the MIPROv2 trials, so trial 1 (the unmodified program) is free.
+    # Checkpointing records the same per-example scores, but only --resume and
+    # --early-stop reuse them; a plain run scores every trial like MIPROv2 does.
+    stopper = None
+    metric  = helpsteer_metric
+    if early_stop or ckpt:
+        judge_calls = 1 if judge_mode == "joint" else len(HelpSteer2Evaluator.ATTRIBUTES)
+        stopper  = SequentialStopper(num_examples=len(devset), calls_per_example=1 + judge_calls,
+                                     early_stop=early_stop, reuse=early_stop or resume)
+        metric   = stopper.wrap_metric(helpsteer_metric)
+        baseline = StoppableGenerator(stopper, cache=gen_cache, budget=budget, module=module)
+        if ckpt:
+            ckpt.attach(stopper)
+            metric = ckpt.wrap_metric(metric)
+    else:
+        baseline = HelpSteer2Generator(cache=gen_cache, budget=budget, module=module)
 
-    baseline         = HelpSteer2Generator()
-    evaluator_module = HelpSteer2Evaluator()
+    # Created before the baseline so the metric feeds it every judge result from there on
+    surrogate = None
+    if prescreen_keep:
+        surrogate = SurrogateScorer(composite_score)
+        surrogate.add_human_labels(trainset)
 
     # ── Baseline Evaluation ───────────────────────────────────────────────────
     logger.info("\nEvaluating baseline (plain signature)...")
+    tracker.set_phase("baseline")
     dspy_evaluator = Evaluate(
         devset=devset,
-        metric=helpsteer_metric,
-        num_threads=2,
+        metric=metric,
+        num_threads=max_concurrency,
         display_progress=True,
     )
 
-    baseline_result = dspy_evaluator(baseline)
-    baseline_score  = (float(baseline_result)  / 100.0)*100
-    logger.info(f"Baseline Score: {baseline_score:.1f}%") 
+    if ckpt and ckpt.baseline_score is not None:
+        baseline_score = ckpt.baseline_score
+        logger.info(f"Baseline Score: {baseline_score:.1f}% (from checkpoint)")
+    else:
+        baseline_result = dspy_evaluator(baseline)
+        baseline_score  = (float(baseline_result)  / 100.0)*100
+        logger.info(f"Baseline Score: {baseline_score:.1f}%") 
+        if ckpt:
+            ckpt.set_baseline_score(baseline_score)
     tracker.report("(after baseline)")
 
+    # ── Surrogate pre-screen ──────────────────────────────────────────────────
+    # Trained on the human labels plus the baseline's judge scores; ranks the
+    # proposed instructions locally so trials only run on the top contenders.
+    prescreen, prescreen_report = None, {}
+    if prescreen_keep:
+        def prescreen(candidates):
+            try:
+                surrogate.fit()
+            except ValueError as e:
+                # e.g. a resumed run whose baseline came from the checkpoint, so nothing was judged
+                logger.warning(f"Pre-screen skipped: {e}")
+                return candidates
+            kept, report = prescreen_candidates(candidates, surrogate, trainset[:prescreen_examples],
+                                                keep=prescreen_keep, threads=min(8, max_concurrency))
+            prescreen_report.update(report)
+            return kept
+
     # ── MIPROv2 ───────────────────────────────────────────────────────────────
     logger.info("\nStarting MIPROv2 (will auto-rewrite signature instructions)...")
-    optimizer = MIPROv2(
-        metric=helpsteer_metric,
+    tracker.set_phase("proposal", count_trials=True)
+    optimizer = CheckpointedMIPROv2(
+        metric=metric,
         auto=None,
-        num_candidates=6,
+        num_candidates=num_candidates,
         max_bootstrapped_demos=0,
         max_labeled_demos=0,      
-        num_threads=2,
-        seed=42,
+        num_threads=max_concurrency,
+        seed=seed,
+        checkpoint=ckpt,
+        prescreen=prescreen,
     )
+    if ckpt:
+        ckpt.track_trials()
 
     optimized_program = optimizer.compile(
         baseline,
         trainset=trainset,
         valset=devset,
-        num_trials=10,
+        num_trials=num_trials,
         requires_permission_to_run=False,
         minibatch=False,
     )
+    if ckpt:
+        ckpt.track_trials(False)
+        ckpt.save(force=True)
 
 
     log_signature_changes(baseline, optimized_program)
 
+    early_stopping = None
+    if stopper is not None and early_stop:
+        early_stopping = stopper.report()
+    if stopper is not None:
+        optimized_program.stopper = None   # final evaluation re-scores from scratch
+
     # ── Optimized Evaluation ──────────────────────────────────────────────────
     logger.info("\nEvaluating optimized program...")
-    optimized_result = dspy_evaluator(optimized_program)
+    tracker.set_phase("final")
+    optimized_result = dspy_evaluator(optimized_program, metric=helpsteer_metric)
     optimized_score  = (float(optimized_result) / 100.0)*100
 
     logger.info("─" * 50)
@@ -245,10 +456,36 @@ def run_optimization():
     logger.info("─" * 50)
 
     # ── Final report — call tracker.report() ONCE ────────────────────────────
+    score_store.flush()
     final_tokens = tracker.report("(final)")
-
-    optimized_program.save(os.path.join(DATA_DIR, "optimized_program.json"))
-    logger.info("Saved → data/optimized_program.json")
+    concurrency  = controller.report()
+    if tracer.enabled:
+        tracer.set_phase(None)
+        tracer.end(run_span)
+        tracer.report()
+        tracer.export()
+
+    program_path = os.path.join(out_dir, "optimized_program.json")
+    optimized_program.save(program_path)
+    logger.info(f"Saved → {os.path.relpath(program_path, project_root)}")
+
+    # Generators running with a registry pick this up on their next poll,
+    # so a run that did not beat its baseline is only ever staged as pending
+    registry_version = None
+    if publish != "none":
+        activate = publish == "current" and optimized_score > baseline_score
+        if publish == "current" and not activate:
+            logger.warning("Optimized score does not beat the baseline; publishing as pending, not current")
+        predictor = optimized_program.generate
+        predictor = getattr(predictor, 'predict', predictor)
+        registry_version = SignatureRegistry().publish(
+            predictor.signature.instructions,
+            demos=[demo.toDict() for demo in predictor.demos],
+            metadata={"baseline_score": round(baseline_score, 4), "optimized_score": round(optimized_score, 4),
+                      "judge_mode": judge_mode, "seed": seed},
+            activate=activate,
+            module=module,
+        )
 
     results = {
         "baseline_score":      round(baseline_score, 4),
@@ -256,18 +493,165 @@ def run_optimization():
         "improvement":         round(optimized_score - baseline_score, 4),
         "original_signature":  get_signature(baseline.generate).instructions,           
         "optimized_signature": get_signature(optimized_program.generate).instructions,
+        "judge_mode":          judge_mode,
+        "seed":                seed,
+        "module":              module,
+        "num_candidates":      num_candidates,
+        "num_trials":          num_trials,
+        "sample_size":         sample_size,
+        "run_name":            run_name,
         "token_usage":         final_tokens,
+        "usage_breakdown":     tracker.breakdown(),
+        "concurrency":         concurrency,
+        "registry_version":    registry_version,
+        "trace":               os.path.relpath(trace, project_root) if trace else None,
     }
+    if early_stopping is not None:
+        results["early_stopping"] = early_stopping
+    if heuristic is not None:
+        results["heuristic_judge"] = heuristic.stats()
+    if budget is not None:
+        results["output_budget"] = budget.report()
+    if history is not None:
+        results["lm_history"] = history.stats()
+    if surrogate is not None and surrogate.coef is not None:
+        # Judge results from the trials were never trained on; devset human labels neither
+        # (and only the attributes whose human scale matches the judge's are comparable)
+        human_labels = [{a: int(round(float(ex[a]))) for a in SHARED_SCALE} for ex in devset]
+        results["surrogate"] = {
+            "prescreen":         prescreen_report,
+            "fidelity_vs_judge": surrogate.heldout_fidelity(),
+            "fidelity_vs_human": surrogate.fidelity([(ex.prompt, ex.response) for ex in devset], human_labels),
+        }
+        logger.info(f"Surrogate rank fidelity vs judge: {results['surrogate']['fidelity_vs_judge']}")
 
-    with open(os.path.join(DATA_DIR, "optimization_results.json"), "w") as f:
+    results_path = os.path.join(out_dir, "optimization_results.json")
+    with open(results_path, "w") as f:
         json.dump(results, f, indent=2)
-    logger.info("Saved → data/optimization_results.json")
+    logger.info(f"Saved → {os.path.relpath(results_path, project_root)}")
+
+    if ckpt:
+        ckpt.mark_completed()
 
     return optimized_program, results
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="MIPROv2 optimization for HelpSteer2")
+    parser.add_argument(
+        "--judge-mode", choices=HelpSteer2Evaluator.MODES, default="per_attribute",
+        help="per_attribute = one judge call per attribute, joint = all five in one call",
+    )
+    parser.add_argument(
+        "--concurrent-judge", action="store_true",
+        help="Send the judge calls for one example concurrently (capped by MAX_CONCURRENT_JUDGE_CALLS)",
+    )
+    parser.add_argument(
+        "--no-judge-cache", action="store_true",
+        help="Re-score every judge call instead of reusing data/cache/judge_cache.sqlite",
+    )
+    parser.add_argument(
+        "--generation-samples", type=int, default=0, metavar="K",
+        help="Cache generator completions, reusing K stored samples per (instruction, prompt); 0 disables",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=42,
+        help="Seed for the train/dev sample (the split index is cached per seed) and for MIPROv2's search",
+    )
+    parser.add_argument(
+        "--early-stop", action="store_true",
+        help="Stop scoring a MIPROv2 candidate once it cannot beat the incumbent",
+    )
+    parser.add_argument(
+        "--heuristic-judge", action="store_true",
+        help="Score verbosity/complexity locally and call the LLM judge only for low-confidence cases",
+    )
+    parser.add_argument(
+        "--max-concurrency", type=int, default=32,
+        help="Upper bound for the adaptive in-flight LM call limit (also the Evaluate/MIPROv2 thread count)",
+    )
+    parser.add_argument(
+        "--initial-concurrency", type=int, default=4,
+        help="In-flight LM call limit to start from before AIMD adjusts it",
+    )
+    parser.add_argument(
+        "--publish", choices=["current", "pending", "none"], default="none",
+        help="Publish the optimized signature to data/registry as the current version (only if it "
+             "beats the baseline, pending otherwise) or as a pending one for shadow evaluation; off by default",
+    )
+    parser.add_argument(
+        "--run-name", default=None,
+        help="Name of this run's per-example scores under data/scores (default: run_<timestamp>)",
+    )
+    parser.add_argument(
+        "--prescreen-keep", type=int, default=0, metavar="K",
+        help="Rank proposed instructions with the local surrogate and search only the top K (0 disables)",
+    )
+    parser.add_argument(
+        "--prescreen-examples", type=int, default=8,
+        help="Trainset prompts each candidate answers for the surrogate pre-screen",
+    )
+    parser.add_argument(
+        "--coreset", type=int, default=0, metavar="N",
+        help="Deduplicate prompts and score trials on a stratified N-example devset coreset (0 = full devset)",
+    )
+    parser.add_argument(
+        "--trace", nargs="?", const=os.path.join(DATA_DIR, "traces", "run_trace.json"), default=None,
+        metavar="PATH", help="Record span timings to a Chrome-trace/Perfetto JSON file (default path: data/traces/)",
+    )
+    parser.add_argument(
+        "--token-budget", action="store_true",
+        help="Size max_tokens per prompt type (retrying truncated answers) and cap judge output",
+    )
+    parser.add_argument(
+        "--history-buffer", type=int, default=0, metavar="N",
+        help="Keep only the last N LM history entries in memory, spilling older ones to data/history/ (0 = dspy default)",
+    )
+    parser.add_argument("--num-candidates", type=int, default=6, help="Instruction candidates MIPROv2 proposes")
+    parser.add_argument("--num-trials", type=int, default=10, help="MIPROv2 search trials")
+    parser.add_argument("--module", choices=list(HelpSteer2Generator.MODULES), default="predict",
+                        help="Generator module: predict or cot (ChainOfThought)")
+    parser.add_argument("--sample-size", type=int, default=200, help="Clean records sampled for train + dev")
+    parser.add_argument("--train-size", type=int, default=160, help="Of those, how many go to the trainset")
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Continue from data/checkpoints/run_state.json without re-scoring anything already scored",
+    )
+    parser.add_argument(
+        "--no-checkpoint", action="store_true",
+        help="Do not write data/checkpoints/run_state.json during the run",
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    optimized_program, results = run_optimization()  # call ONCE only
+    args = parse_args()
+    optimized_program, results = run_optimization(
+        judge_mode=args.judge_mode,
+        concurrent_judge=args.concurrent_judge,
+        judge_cache=not args.no_judge_cache,
+        generation_samples=args.generation_samples,
+        seed=args.seed,
+        early_stop=args.early_stop,
+        heuristic_judge=args.heuristic_judge,
+        checkpoint=not args.no_checkpoint,
+        resume=args.resume,
+        max_concurrency=args.max_concurrency,
+        initial_concurrency=args.initial_concurrency,
+        publish=args.publish,
+        run_name=args.run_name,
+        prescreen_keep=args.prescreen_keep,
+        prescreen_examples=args.prescreen_examples,
+        coreset=args.coreset,
+        trace=args.trace,
+        token_budget=args.token_budget,
+        history_buffer=args.history_buffer,
+        num_candidates=args.num_candidates,
+        num_trials=args.num_trials,
+        module=args.module,
+        sample_size=args.sample_size,
+        train_size=args.train_size,
+    )  # call ONCE only
 
     logger.info("\n" + "=" * 70)
     logger.info("DONE")
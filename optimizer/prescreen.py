@@ -0,0 +1,50 @@
+"""
+Surrogate Pre-screening of MIPROv2 Instruction Candidates
+Ranks proposed instructions with the local surrogate so only the top contenders reach the LLM judge
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from src.registry import predictor_for
+from src.surrogate import SurrogateScorer
+
+logger = logging.getLogger(__name__)
+
+
+def _generate_all(instructions: str, examples: list, threads: int) -> list:
+    predictor = predictor_for({"instructions": instructions})
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(lambda ex: predictor(prompt=ex.prompt).response, examples))
+
+
+def prescreen_candidates(candidates: dict, surrogate: SurrogateScorer, examples: list,
+                         keep: int, threads: int = 8) -> tuple:
+    """
+    ({predictor index: kept instructions}, report). Every candidate answers the
+    same examples (generation only, no judge calls) and is ranked by the mean
+    surrogate composite. Index 0 — MIPROv2's unmodified instruction — is always
+    kept, so the search can still fall back to the baseline.
+    """
+    kept, report = {}, {}
+    for i, instructions in candidates.items():
+        if len(instructions) <= keep:
+            kept[i] = instructions
+            continue
+
+        scored = []
+        for j, instr in enumerate(instructions):
+            responses = _generate_all(instr, examples, threads)
+            pairs     = [(ex.prompt, r) for ex, r in zip(examples, responses)]
+            scored.append((float(surrogate.composite(pairs).mean()), j))
+
+        ranked   = [j for _, j in sorted(scored, reverse=True)]
+        top      = [0] + [j for j in ranked if j != 0][:keep - 1]
+        kept[i]  = [instructions[j] for j in sorted(top)]
+        report[i] = {
+            "surrogate_means": {j: round(m, 4) for m, j in sorted(scored, key=lambda t: t[1])},
+            "kept":            sorted(top),
+        }
+        logger.info(f"Pre-screen predictor {i}: kept candidates {sorted(top)} of {len(instructions)} "
+                    f"(surrogate means {', '.join(f'{m:.3f}' for m, _ in sorted(scored, key=lambda t: t[1]))})")
+    return kept, report
@@ -0,0 +1,106 @@
+"""
+Re-scoring of Stored Judge Results
+Recomputes the composite metric for every stored run under new weights or value maps — no LM calls
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.score_store import ScoreStore, composite, group_means
+from optimizer.mipro_optimizer import COMPLEXITY_MAP, METRIC_WEIGHTS, VERBOSITY_MAP
+
+logger = logging.getLogger(__name__)
+
+
+def _int_keys(mapping: dict) -> dict:
+    return {int(k): float(v) for k, v in mapping.items()}
+
+
+def rescore(store: ScoreStore, runs: list = None, weights: dict = None,
+            complexity_map: dict = None, verbosity_map: dict = None, by: tuple = ('run', 'phase')) -> dict:
+    start   = time.perf_counter()
+    columns = store.load(runs)
+    loaded  = time.perf_counter()
+
+    current = composite(columns['scores'], METRIC_WEIGHTS,
+                        {"complexity": COMPLEXITY_MAP, "verbosity": VERBOSITY_MAP})
+    new = composite(columns['scores'], {**METRIC_WEIGHTS, **(weights or {})}, {
+        "complexity": {**COMPLEXITY_MAP, **(complexity_map or {})},
+        "verbosity":  {**VERBOSITY_MAP,  **(verbosity_map or {})},
+    })
+    scored = time.perf_counter()
+
+    current_means = {key: mean for key, mean, _ in group_means(columns, current, by)}
+    groups = [
+        {**dict(zip(by, key)), "n": n, "current": round(current_means[key] * 100, 2), "rescored": round(mean * 100, 2)}
+        for key, mean, n in group_means(columns, new, by)
+    ]
+    return {
+        "rows":       int(len(columns['example'])),
+        "load_ms":    round((loaded - start) * 1000, 1),
+        "rescore_ms": round((scored - loaded) * 1000, 1),
+        "groups":     groups,
+    }
+
+
+def improvements(groups: list) -> list:
+    """Baseline → final per run, the comparison the README's run table reports."""
+    by_run = {}
+    for g in groups:
+        by_run.setdefault(g["run"], {})[g.get("phase")] = g
+    rows = []
+    for run, phases in by_run.items():
+        if "baseline" in phases and "final" in phases:
+            b, f = phases["baseline"], phases["final"]
+            rows.append({
+                "run":      run,
+                "baseline": b["rescored"],
+                "final":    f["rescored"],
+                "gain":     round(f["rescored"] - b["rescored"], 2),
+                "gain_at_current_weights": round(f["current"] - b["current"], 2),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored per-example judge results")
+    parser.add_argument("--runs", nargs="*", help="Runs under data/scores (default: all)")
+    parser.add_argument("--weights", type=json.loads, default=None,
+                        help='Attribute weight overrides, e.g. \'{"helpfulness": 0.4, "verbosity": 0.0}\'')
+    parser.add_argument("--complexity-map", type=json.loads, default=None, help='e.g. \'{"1": 0.5}\'')
+    parser.add_argument("--verbosity-map", type=json.loads, default=None, help='e.g. \'{"3": 0.6}\'')
+    parser.add_argument("--by", default="run,phase", help="Comma-separated grouping: run, phase, candidate")
+    args = parser.parse_args()
+
+    report = rescore(
+        ScoreStore(), runs=args.runs, weights=args.weights,
+        complexity_map=_int_keys(args.complexity_map or {}),
+        verbosity_map=_int_keys(args.verbosity_map or {}),
+        by=tuple(args.by.split(',')),
+    )
+
+    logger.info("─" * 50)
+    logger.info(f"RESCORE ({report['rows']:,} rows, load {report['load_ms']} ms, rescore {report['rescore_ms']} ms)")
+    logger.info("─" * 50)
+    for g in report["groups"]:
+        label = " / ".join(str(g[c]) for c in args.by.split(','))
+        logger.info(f"  {label:<40} n={g['n']:>4} | current {g['current']:6.2f}% | rescored {g['rescored']:6.2f}%")
+
+    rows = improvements(report["groups"]) if {"run", "phase"} <= set(args.by.split(',')) else []
+    if rows:
+        logger.info("─" * 50)
+        for r in rows:
+            logger.info(f"  {r['run']:<28} {r['baseline']:6.2f}% → {r['final']:6.2f}% ({r['gain']:+.2f}%, "
+                        f"{r['gain_at_current_weights']:+.2f}% at current weights)")
+    logger.info("─" * 50)
+
+
+if __name__ == "__main__":
+    main()
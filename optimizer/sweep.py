@@ -0,0 +1,249 @@
+"""
+Parallel Multi-Seed Optimization Sweeps
+Runs a grid of MIPROv2 configs in worker processes sharing one LM quota and the judge/generation caches
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import itertools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.cache import content_key
+from src.concurrency import SharedQuota
+from optimizer.mipro_optimizer import DATA_DIR, run_optimization
+
+logger = logging.getLogger(__name__)
+
+SWEEPS_DIR = os.path.join(DATA_DIR, 'sweeps')
+GRID_KEYS  = ("seed", "num_candidates", "num_trials", "sample_size", "module")
+
+# Two-sided 95% Student t critical values by degrees of freedom; ~normal beyond 30
+T_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+        10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 25: 2.060, 30: 2.042}
+
+
+# ── Grid ─────────────────────────────────────────────────────────────────────
+def expand_grid(grid: dict) -> list:
+    """Every combination of the grid's values, seeds varying fastest."""
+    keys = [k for k in GRID_KEYS if k != "seed"] + ["seed"]
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def config_id(config: dict) -> str:
+    return content_key('sweep', sorted(config.items()))[:10]
+
+
+# ── Worker ───────────────────────────────────────────────────────────────────
+_quota = None
+
+
+def _init_worker(quota: SharedQuota):
+    global _quota
+    _quota = quota
+
+
+def _run_one(sweep: str, config: dict, common: dict) -> dict:
+    """One optimization run in its own process and directory; never raises, so one failure can't stop the sweep."""
+    cid     = config_id(config)
+    run_dir = os.path.join(SWEEPS_DIR, sweep, cid)
+    start   = time.time()
+    row     = {"id": cid, "config": config}
+    try:
+        _, results = run_optimization(
+            **common, **config,
+            train_size=int(config["sample_size"] * 0.8),
+            run_name=f"{sweep}_{cid}",
+            output_dir=run_dir,
+            resume=os.path.exists(os.path.join(run_dir, 'run_state.json')),
+            publish="none",
+            quota=_quota,
+        )
+        usage = results["token_usage"]
+        row.update({
+            "baseline_score":  results["baseline_score"],
+            "optimized_score": results["optimized_score"],
+            "improvement":     results["improvement"],
+            "total_tokens":    usage["total_tokens"],
+            "total_cost":      usage["total_cost"],
+            "judge_cache":     usage.get("judge_cache"),
+        })
+    except Exception as e:
+        logger.exception(f"Sweep run {cid} failed")
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["seconds"] = round(time.time() - start, 1)
+    return row
+
+
+# ── Results table ────────────────────────────────────────────────────────────
+def mean_ci(values: list) -> tuple:
+    """(mean, 95% confidence half-width); the half-width is None for a single value."""
+    n    = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return round(mean, 4), None
+    sd = math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1))
+    df = n - 1
+    t  = T_95[max(k for k in T_95 if k <= df)] if df <= 30 else 1.96
+    return round(mean, 4), round(t * sd / math.sqrt(n), 4)
+
+
+def summarize(rows: list) -> list:
+    """One row per config, seeds pooled: mean ± 95% CI of the scores, mean cost per run."""
+    groups = {}
+    for row in rows:
+        if "error" not in row:
+            key = tuple((k, row["config"][k]) for k in GRID_KEYS if k != "seed")
+            groups.setdefault(key, []).append(row)
+
+    table = []
+    for key, runs in groups.items():
+        entry = {**dict(key), "runs": len(runs), "seeds": sorted(r["config"]["seed"] for r in runs)}
+        for metric in ("baseline_score", "optimized_score", "improvement"):
+            entry[metric], entry[f"{metric}_ci95"] = mean_ci([r[metric] for r in runs])
+        entry["cost_per_run"] = round(sum(r["total_cost"] for r in runs) / len(runs), 4)
+        table.append(entry)
+    return sorted(table, key=lambda e: -e["optimized_score"])
+
+
+def _fmt(mean, ci) -> str:
+    return f"{mean:6.2f}" + (f" ± {ci:5.2f}" if ci is not None else "        ")
+
+
+def log_table(table: list):
+    logger.info("─" * 100)
+    logger.info(f"  {'module':<8} {'cands':>5} {'trials':>6} {'sample':>6} {'runs':>4} | "
+                f"{'baseline':^15} | {'optimized':^15} | {'improvement':^15} | cost/run")
+    logger.info("─" * 100)
+    for e in table:
+        logger.info(f"  {e['module']:<8} {e['num_candidates']:>5} {e['num_trials']:>6} {e['sample_size']:>6} "
+                    f"{e['runs']:>4} | {_fmt(e['baseline_score'], e['baseline_score_ci95'])} | "
+                    f"{_fmt(e['optimized_score'], e['optimized_score_ci95'])} | "
+                    f"{_fmt(e['improvement'], e['improvement_ci95'])} | ${e['cost_per_run']:.4f}")
+    logger.info("─" * 100)
+
+
+# ── Orchestration ────────────────────────────────────────────────────────────
+def _load_rows(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_sweep(name: str, grid: dict, workers: int = 4, max_in_flight: int = 32, **common) -> dict:
+    """
+    Runs every config of the grid not already finished under data/sweeps/<name>.
+    Runs share the SQLite judge/generation caches (WAL, safe across processes)
+    and one SharedQuota of in-flight LM calls; an interrupted sweep resumes
+    from results.jsonl and each run's own checkpoint.
+    """
+    sweep_dir    = os.path.join(SWEEPS_DIR, name)
+    results_path = os.path.join(sweep_dir, 'results.jsonl')
+    os.makedirs(sweep_dir, exist_ok=True)
+
+    configs = expand_grid(grid)
+    rows    = [r for r in _load_rows(results_path) if "error" not in r]
+    done    = {r["id"] for r in rows}
+    pending = [c for c in configs if config_id(c) not in done]
+    logger.info(f"Sweep '{name}': {len(configs)} configs, {len(done)} already done, {len(pending)} to run "
+                f"on {workers} workers sharing {max_in_flight} in-flight LM calls")
+
+    context = multiprocessing.get_context("spawn")
+    quota   = SharedQuota(max_in_flight, context=context)
+    start   = time.time()
+
+    # One run per process: run_optimization keeps module-level state, and a fresh process drops it
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(quota,), max_tasks_per_child=1) as pool:
+        futures = [pool.submit(_run_one, name, config, common) for config in pending]
+        for future in as_completed(futures):
+            row = future.result()
+            with open(results_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(row) + '\n')
+            if "error" in row:
+                logger.warning(f"  {row['id']} failed after {row['seconds']:.0f}s: {row['error']}")
+            else:
+                rows.append(row)
+                logger.info(f"  {row['id']} {row['config']}: {row['baseline_score']:.2f} → "
+                            f"{row['optimized_score']:.2f} in {row['seconds']:.0f}s")
+
+    elapsed  = time.time() - start
+    ran      = [r for r in rows if r["id"] not in done]
+    table    = summarize(rows)
+    hits     = sum((r.get("judge_cache") or {}).get("hits", 0) for r in ran)
+    report   = {
+        "name":               name,
+        "grid":               grid,
+        "runs":               len(rows),
+        "failed":             len(pending) - len(ran),
+        "wall_seconds":       round(elapsed, 1),
+        "sequential_seconds": round(sum(r["seconds"] for r in ran), 1),
+        "judge_cache_hits":   hits,
+        "total_cost":         round(sum(r["total_cost"] for r in rows), 4),
+        "table":              table,
+    }
+
+    tmp_path = os.path.join(sweep_dir, 'table.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, os.path.join(sweep_dir, 'table.json'))
+
+    log_table(table)
+    logger.info(f"  Wall {elapsed / 60:.1f} min for {report['sequential_seconds'] / 60:.1f} min of runs | "
+                f"{hits:,} judge calls served from the shared cache | total ${report['total_cost']:.4f}")
+    logger.info(f"Saved → {os.path.relpath(os.path.join(sweep_dir, 'table.json'), project_root)}")
+    return report
+
+
+def _values(text: str, cast=int) -> list:
+    return [cast(v) for v in text.split(',') if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel grid of MIPROv2 runs sharing caches and LM quota")
+    parser.add_argument("--name", default=None, help="Sweep name under data/sweeps (re-use it to resume)")
+    parser.add_argument("--seeds", default="1,2,3", help="Comma-separated split seeds")
+    parser.add_argument("--num-candidates", default="6")
+    parser.add_argument("--num-trials", default="10")
+    parser.add_argument("--sample-size", default="200", help="Clean records per run (80%% train, 20%% dev)")
+    parser.add_argument("--module", default="predict", help="Comma-separated: predict, cot")
+    parser.add_argument("--workers", type=int, default=4, help="Runs in flight at once")
+    parser.add_argument("--max-in-flight", type=int, default=32, help="LM calls in flight across all workers")
+    parser.add_argument("--judge-mode", choices=("per_attribute", "joint"), default="per_attribute",
+                        help="per_attribute results land in the shared judge cache; joint ones are not cached")
+    parser.add_argument("--generation-samples", type=int, default=1,
+                        help="Completions stored per generation cache key, shared by every run (0 disables)")
+    parser.add_argument("--early-stop", action="store_true")
+    parser.add_argument("--heuristic-judge", action="store_true")
+    args = parser.parse_args()
+
+    grid = {
+        "seed":           _values(args.seeds),
+        "num_candidates": _values(args.num_candidates),
+        "num_trials":     _values(args.num_trials),
+        "sample_size":    _values(args.sample_size),
+        "module":         _values(args.module, str),
+    }
+    run_sweep(
+        args.name or time.strftime("sweep_%Y%m%d_%H%M%S"), grid,
+        workers=args.workers,
+        max_in_flight=args.max_in_flight,
+        judge_mode=args.judge_mode,
+        generation_samples=args.generation_samples,
+        early_stop=args.early_stop,
+        heuristic_judge=args.heuristic_judge,
+        max_concurrency=args.max_in_flight,
+    )
+
+
+if __name__ == "__main__":
+    main()
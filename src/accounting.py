@@ -0,0 +1,248 @@
+"""
+Incremental LM Usage Accounting
+dspy callback that tags every LM call by module, phase and model as it completes
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+
+import dspy
+from dspy.utils.callback import BaseCallback
+
+logger = logging.getLogger(__name__)
+
+_module_stack = contextvars.ContextVar('usage_module_stack', default=())
+_current_call = contextvars.ContextVar('usage_current_call', default=None)
+
+
+def add_history_listener(lm, listener):
+    """
+    Calls listener(entry) for every history entry the LM records, in the
+    thread/task that made the call. The hook is a plain function stored on the
+    instance, which deepcopy shares rather than copies, so LMs made with
+    lm.copy() (e.g. by the MIPROv2 proposer) keep reporting to the same listeners.
+    """
+    listeners = getattr(lm.update_history, 'listeners', None)
+    if listeners is not None:
+        listeners.append(listener)
+        return
+
+    listeners = [listener]
+    original  = lm.update_history
+
+    def update_history(entry):
+        original(entry)
+        _notify(listeners, entry)
+
+    update_history.listeners = listeners
+    lm.update_history = update_history
+
+
+def _notify(listeners: list, entry: dict):
+    for fn in listeners:
+        try:
+            fn(entry)
+        except Exception as e:
+            logger.warning(f"History listener failed: {e}")
+
+
+def notify_history_listeners(lm, entry: dict):
+    """
+    Hands entry to lm's history listeners without recording it in lm's history.
+    For wrappers that call lm.forward() directly, which never reaches the
+    wrapped LM's update_history.
+    """
+    _notify(getattr(lm.update_history, 'listeners', ()), entry)
+
+
+def _module_label(instance) -> str:
+    # Subclasses used by the optimizer (e.g. StoppableGenerator) report as their src/ base class
+    for cls in type(instance).__mro__:
+        if cls.__module__.startswith('src.'):
+            return cls.__name__
+    return type(instance).__name__
+
+
+def _new_counter() -> dict:
+    return {
+        "calls":             0,
+        "errors":            0,
+        "prompt_tokens":     0,
+        "completion_tokens": 0,
+        "latency_ms_total":  0.0,
+        "latency_hist":      [0] * (len(UsageAccountant.LATENCY_BUCKETS_MS) + 1),
+    }
+
+
+class UsageAccountant(BaseCallback):
+    """
+    Running token / latency counters keyed by (phase, module, model).
+
+    Module tags come from the dspy module call stack: the outermost module names
+    the caller and an `attribute` input (HelpSteer2Evaluator) adds the attribute
+    name. Phases are set by the caller; with count_trials=True every Evaluate
+    run inside that phase becomes its own "trial N" phase.
+    """
+
+    LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+    def __init__(self, attribute_names: dict = None, stream_path: str = None, stream_every: float = 30.0):
+        self.attribute_names = attribute_names or {}
+        self.stream_path     = stream_path
+        self.stream_every    = stream_every
+
+        self.phase         = "setup"
+        self._base_phase   = "setup"
+        self._count_trials = False
+        self.trials        = 0
+
+        self.counters      = {}
+        self._pending      = {}
+        self._lock         = threading.Lock()
+        self._last_stream  = time.time()
+
+        if stream_path:
+            os.makedirs(os.path.dirname(os.path.abspath(stream_path)), exist_ok=True)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def install(self, lm):
+        """Hooks the LM's history and registers this accountant as a global dspy callback (once)."""
+        add_history_listener(lm, self._on_history)
+        callbacks = dspy.settings.callbacks or []
+        if self not in callbacks:
+            dspy.settings.configure(callbacks=[*callbacks, self])
+        return self
+
+    def set_phase(self, phase: str, count_trials: bool = False):
+        self.phase         = phase
+        self._base_phase   = phase
+        self._count_trials = count_trials
+
+    # ── Module / evaluate callbacks ──────────────────────────────────────────
+    def on_module_start(self, call_id, instance, inputs):
+        kwargs = inputs.get('kwargs', inputs) if isinstance(inputs, dict) else {}
+        attr   = self.attribute_names.get(kwargs.get('attribute')) if isinstance(kwargs, dict) else None
+        _module_stack.set(_module_stack.get() + ((_module_label(instance), attr),))
+
+    def on_module_end(self, call_id, outputs, exception=None):
+        _module_stack.set(_module_stack.get()[:-1])
+
+    def on_evaluate_start(self, call_id, instance, inputs):
+        if self._count_trials:
+            with self._lock:
+                self.trials += 1
+                self.phase = f"trial {self.trials}"
+
+    def on_evaluate_end(self, call_id, outputs, exception=None):
+        if self._count_trials:
+            self.phase = self._base_phase
+
+    # ── LM callbacks ─────────────────────────────────────────────────────────
+    def _current_module(self) -> str:
+        stack = _module_stack.get()
+        if not stack:
+            return "unattributed"
+        label = stack[0][0]
+        attr  = next((a for _, a in reversed(stack) if a), None)
+        return f"{label}.{attr}" if attr else label
+
+    def on_lm_start(self, call_id, instance, inputs):
+        self._pending[call_id] = {
+            "start":  time.perf_counter(),
+            "phase":  self.phase,
+            "module": self._current_module(),
+            "model":  getattr(instance, 'model', 'unknown'),
+            "usage":  {},
+            "token":  _current_call.set(call_id),
+        }
+
+    def _on_history(self, entry: dict):
+        pending = self._pending.get(_current_call.get())
+        if pending is not None:
+            pending["usage"] = entry.get("usage") or {}
+            pending["model"] = entry.get("model") or pending["model"]
+
+    def on_lm_end(self, call_id, outputs, exception=None):
+        pending = self._pending.pop(call_id, None)
+        if pending is None:
+            return
+        try:
+            _current_call.reset(pending["token"])
+        except ValueError:
+            pass
+
+        latency_ms = (time.perf_counter() - pending["start"]) * 1000
+        usage      = pending["usage"]
+        key        = (pending["phase"], pending["module"], pending["model"])
+
+        with self._lock:
+            c = self.counters.setdefault(key, _new_counter())
+            c["calls"]             += 1
+            c["errors"]            += exception is not None
+            c["prompt_tokens"]     += usage.get("prompt_tokens", 0) or 0
+            c["completion_tokens"] += usage.get("completion_tokens", 0) or 0
+            c["latency_ms_total"]  += latency_ms
+            c["latency_hist"][bisect_left(self.LATENCY_BUCKETS_MS, latency_ms)] += 1
+
+            stream = self.stream_path and time.time() - self._last_stream >= self.stream_every
+            if stream:
+                self._last_stream = time.time()
+
+        if stream:
+            self.write_stream()
+
+    # ── Reporting ────────────────────────────────────────────────────────────
+    def totals(self) -> dict:
+        with self._lock:
+            return self._merge(self.counters.values())
+
+    def _merge(self, counters) -> dict:
+        total = _new_counter()
+        for c in counters:
+            for k in ("calls", "errors", "prompt_tokens", "completion_tokens", "latency_ms_total"):
+                total[k] += c[k]
+            total["latency_hist"] = [a + b for a, b in zip(total["latency_hist"], c["latency_hist"])]
+        total["latency_ms_total"] = round(total["latency_ms_total"], 1)
+        total["mean_latency_ms"]  = round(total["latency_ms_total"] / total["calls"], 1) if total["calls"] else 0.0
+        return total
+
+    def _group(self, index: int) -> dict:
+        groups = {}
+        for key, c in self.counters.items():
+            groups.setdefault(key[index], []).append(c)
+        return {name: self._merge(cs) for name, cs in groups.items()}
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "latency_buckets_ms": list(self.LATENCY_BUCKETS_MS),
+                "totals":    self._merge(self.counters.values()),
+                "by_phase":  self._group(0),
+                "by_module": self._group(1),
+                "by_model":  self._group(2),
+                "breakdown": [
+                    {"phase": p, "module": m, "model": mdl, **self._merge([c])}
+                    for (p, m, mdl), c in self.counters.items()
+                ],
+            }
+
+    def write_stream(self):
+        """Appends one JSONL snapshot (totals + per-module) to stream_path."""
+        if not self.stream_path:
+            return
+        with self._lock:
+            line = {
+                "ts":        time.time(),
+                "phase":     self.phase,
+                "totals":    self._merge(self.counters.values()),
+                "by_module": self._group(1),
+            }
+        with open(self.stream_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(line) + '\n')
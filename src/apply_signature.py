@@ -1,29 +1,25 @@
 """
 apply_optimized_signature.py
-Reads optimized_program.json and updates signatures.py automatically
+Publishes the optimized signature from optimization_results.json to the signature registry
 """
 
 import os
+import sys
 import json
 import re
+import argparse
 
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.registry import SignatureRegistry
 
 OPTIMIZED_JSON = os.path.join(project_root, 'data', 'optimization_results.json')
 SIGNATURES_FILE = os.path.join(project_root, 'src', 'signatures.py')
 
 
-def apply():
-    # ── Load optimized signature from results ─────────────────────────────────
-    with open(OPTIMIZED_JSON, 'r', encoding='utf-8') as f:
-        results = json.load(f)
-
-    new_sig = results["optimized_signature"]
-    old_sig = results["original_signature"]
-
-    print(f"OLD: {old_sig}")
-    print(f"NEW: {new_sig}")
-
+def rewrite_source(new_sig: str):
+    """Bakes the instructions into signatures.py as the built-in default (optional)."""
     # ── Read current signatures.py ────────────────────────────────────────────
     with open(SIGNATURES_FILE, 'r', encoding='utf-8') as f:
         content = f.read()
@@ -31,22 +27,63 @@ def apply():
     # ── Replace the docstring inside HelpSteer2Signature ─────────────────────
     # Matches: """...""" inside the class
     pattern = r'(class HelpSteer2Signature\(dspy\.Signature\):\s+""")(.*?)(""")'
-    replacement = rf'\g<1>{new_sig}\g<3>'
-
-    new_content = re.sub(pattern, replacement, content, flags=re.DOTALL)
+    new_content, matches = re.subn(pattern, lambda m: m.group(1) + new_sig + m.group(3), content,
+                                   count=1, flags=re.DOTALL)
 
-    if new_content == content:
-        print("WARNING: Pattern not matched — signatures.py was NOT updated.")
-        print("Check the class name or docstring format.")
-        return
+    if not matches:
+        raise RuntimeError("HelpSteer2Signature docstring not found in signatures.py — "
+                           "check the class name or docstring format")
 
     # ── Write back ────────────────────────────────────────────────────────────
     with open(SIGNATURES_FILE, 'w', encoding='utf-8') as f:
         f.write(new_content)
 
     print(f"\nSignatures.py updated successfully!")
-    print(f"\nNew HelpSteer2Signature docstring:\n  '{new_sig}'")
+
+
+def apply(pending: bool = False, source: bool = False):
+    # ── Load optimized signature from results ─────────────────────────────────
+    with open(OPTIMIZED_JSON, 'r', encoding='utf-8') as f:
+        results = json.load(f)
+
+    new_sig = results["optimized_signature"]
+    old_sig = results["original_signature"]
+    module  = results.get("module", "predict")
+
+    print(f"OLD: {old_sig}")
+    print(f"NEW: {new_sig}")
+
+    # ── Publish — running generators with a registry swap to it on their next poll
+    # (mipro_optimizer.py --publish may already have registered this exact signature)
+    registry = SignatureRegistry()
+    versions = registry.versions()
+    newest   = registry.load(versions[-1]) if versions else None
+    if (newest is not None and newest["instructions"] == new_sig and not newest["demos"]
+            and newest.get("module", "predict") == module):
+        version = newest["version"]
+        if pending:
+            registry.set_pending(version)
+        else:
+            registry.activate(version)
+        print(f"\nAlready registry v{version:04d}; made it {'pending' if pending else 'current'}")
+    else:
+        version = registry.publish(
+            new_sig,
+            metadata={k: results.get(k) for k in ("baseline_score", "optimized_score", "judge_mode", "seed")},
+            activate=not pending,
+            module=module,
+        )
+        print(f"\nPublished as registry v{version:04d} ({'pending' if pending else 'current'})")
+
+    if source:
+        rewrite_source(new_sig)
 
 
 if __name__ == "__main__":
-    apply()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Publish the optimized signature to the registry")
+    parser.add_argument("--pending", action="store_true",
+                        help="Stage the version for shadow evaluation instead of making it current")
+    parser.add_argument("--rewrite-source", action="store_true",
+                        help="Also rewrite the HelpSteer2Signature docstring in src/signatures.py")
+    args = parser.parse_args()
+    apply(pending=args.pending, source=args.rewrite_source)
@@ -0,0 +1,289 @@
+"""
+Streaming Batch Inference and Scoring
+Generates and judges every prompt of a JSONL file with bounded concurrency, resumable after interruption
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import dspy
+
+from src.accounting import UsageAccountant
+from src.cache import JudgeCache
+from src.concurrency import AIMDController, controlled
+from src.config import configure_dspy_with_azure, role_lm
+from src.evaluator import HelpSteer2Evaluator
+from src.generator import HelpSteer2Generator, saved_module
+from src.history import bound_history
+from src.registry import SignatureRegistry
+from src.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+project_root    = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PROGRAM = os.path.join(project_root, 'data', 'optimized_program.json')
+
+
+def iter_lines(path: str, start: int = 0):
+    """Yields (byte offset, raw line) from `start` on, one line in memory at a time."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                yield offset, line
+
+
+class BatchProgress:
+    """
+    Resume point of a batch job, kept next to the output as <output>.progress.json.
+
+    Rows finish out of order, so the saved offset is a low-water mark: every row
+    before it is in the output. Rows after it that also finished are found by
+    scanning the output's offsets on resume — at most one concurrency window.
+    Failed rows (e.g. out of throttle retries) are taken out of the output on
+    resume and run again.
+    """
+
+    def __init__(self, input_path: str, output_path: str, save_every: float = 5.0):
+        self.input_path = os.path.abspath(input_path)
+        self.path       = output_path + '.progress.json'
+        self.save_every = save_every
+        self.low_water  = 0
+        self.rows_done  = 0
+
+        self._open       = set()      # offsets submitted but not yet written
+        self._frontier   = 0          # end of the last submitted row
+        self._done_after = set()      # offsets written beyond the low-water mark
+        self._lock       = threading.Lock()
+        self._last_save  = 0.0
+
+    def load(self, output_path: str):
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved["input"] != self.input_path:
+                raise ValueError(f"{self.path} belongs to {saved['input']}, not {self.input_path}")
+            self.low_water = saved["low_water"]
+        if not os.path.exists(output_path):
+            return
+        if not os.path.exists(self.path):
+            logger.warning(f"No {os.path.basename(self.path)}; rebuilding progress from the output")
+
+        # The output is the source of truth for what finished, including rows past the mark
+        done, failed, torn = set(), set(), False
+        with open(output_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    torn = True
+                    break
+                row = json.loads(line)
+                (failed if "error" in row else done).add(row["offset"])
+
+        # Drop failed rows and a torn final write, so appends start on a clean line and those rows run again
+        if failed or torn:
+            tmp_path = output_path + '.tmp'
+            with open(output_path, 'rb') as f, open(tmp_path, 'wb') as out:
+                for line in f:
+                    if line.endswith(b'\n') and "error" not in json.loads(line):
+                        out.write(line)
+            os.replace(tmp_path, output_path)
+        if failed:
+            self.low_water = min(self.low_water, min(failed))
+
+        self.rows_done   = len(done)
+        self._done_after = {o for o in done if o >= self.low_water}
+        logger.info(f"Resuming at byte {self.low_water:,} ({self.rows_done:,} rows already done"
+                    + (f", {len(failed):,} failed rows to retry)" if failed else ")"))
+
+    def already_done(self, offset: int) -> bool:
+        return offset in self._done_after
+
+    def start(self, offset: int, next_offset: int):
+        with self._lock:
+            self._open.add(offset)
+            self._frontier = next_offset
+
+    def finish(self, offset: int):
+        with self._lock:
+            self._open.discard(offset)
+            self.rows_done += 1
+            # Everything before the oldest open row is written; with none open, everything submitted is
+            self.low_water = min(self._open) if self._open else self._frontier
+            self._done_after = {o for o in self._done_after if o >= self.low_water}
+            save = time.time() - self._last_save >= self.save_every
+        if save:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            self._last_save = time.time()
+            state = {"input": self.input_path, "low_water": self.low_water, "rows_done": self.rows_done}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+
+def load_generator(program_path: str, use_registry: bool, module: str = None) -> HelpSteer2Generator:
+    if use_registry:
+        return HelpSteer2Generator(registry=SignatureRegistry())
+    if program_path and os.path.exists(program_path):
+        module  = module or saved_module(program_path)
+        program = HelpSteer2Generator(module=module)
+        program.load(program_path)
+        logger.info(f"Loaded {module} program from {os.path.relpath(program_path, project_root)}")
+    else:
+        program = HelpSteer2Generator(module=module or 'predict')
+        logger.warning("No saved program — generating with the built-in signature")
+    return program
+
+
+def run_batch(input_path: str, output_path: str, field: str = "prompt", score: bool = True,
+              judge_mode: str = "per_attribute", concurrency: int = 16, program_path: str = DEFAULT_PROGRAM,
+              use_registry: bool = False, judge_cache: bool = True, report_every: float = 30.0,
+              trace: str = None, history_buffer: int = 200, module: str = None) -> dict:
+    if trace:
+        tracer.enable(trace)
+    controller = AIMDController(max_limit=concurrency)
+    lm         = controlled(configure_dspy_with_azure(), controller)
+    dspy.settings.configure(lm=lm)
+    judge_lm   = controlled(role_lm("judge"), controller)
+    tracer.install(lm)
+    if judge_lm is not None:
+        tracer.install(judge_lm)
+
+    accountant = UsageAccountant().install(lm)
+    if judge_lm is not None:
+        accountant.install(judge_lm)
+    # A batch job may make millions of calls; only the tail of the LM history stays resident
+    history = bound_history(history_buffer, output_path + '.history.jsonl.gz') if history_buffer else None
+
+    generator = load_generator(program_path, use_registry, module)
+    evaluator = HelpSteer2Evaluator(mode=judge_mode, cache=JudgeCache() if judge_cache else None,
+                                    lm=judge_lm) if score else None
+
+    progress = BatchProgress(input_path, output_path)
+    progress.load(output_path)
+
+    out_lock = threading.Lock()
+    out_file = open(output_path, 'a', encoding='utf-8')
+    # Bounded submission keeps memory flat: at most 2× concurrency rows exist at once
+    slots    = threading.BoundedSemaphore(concurrency * 2)
+    start    = time.time()
+    resumed  = progress.rows_done
+    errors   = 0
+    last_log = start
+
+    def process(offset: int, raw: bytes):
+        nonlocal errors
+        row = {"offset": offset}
+        try:
+            record = json.loads(raw)
+            prompt = record[field]
+            row["id"] = record.get("id", record.get("request_id"))
+            prediction = generator(prompt=prompt)
+            row["response"] = prediction.response
+            if evaluator is not None:
+                row["scores"] = evaluator(prompt=prompt, response=prediction.response).scores
+        except Exception as e:
+            row["error"] = f"{type(e).__name__}: {e}"
+            with out_lock:
+                errors += 1
+        finally:
+            with out_lock:
+                out_file.write(json.dumps(row, ensure_ascii=False) + '\n')
+                out_file.flush()
+            progress.finish(offset)
+            slots.release()
+
+    def log_rate(label: str) -> dict:
+        elapsed = time.time() - start
+        rows    = progress.rows_done - resumed
+        totals  = accountant.totals()
+        tokens  = totals["prompt_tokens"] + totals["completion_tokens"]
+        stats = {
+            "rows":           rows,
+            "rows_total":     progress.rows_done,
+            "errors":         errors,
+            "seconds":        round(elapsed, 1),
+            "rows_per_sec":   round(rows / elapsed, 2) if elapsed else None,
+            "tokens_per_row": round(tokens / rows, 1) if rows else None,
+            "lm_calls":       totals["calls"],
+        }
+        logger.info(f"{label}: {rows:,} rows ({stats['rows_total']:,} total) | {stats['rows_per_sec']} rows/s | "
+                    f"{stats['tokens_per_row']} tok/row | {errors} errors | limit {controller.limit:.1f}")
+        return stats
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            lines = iter_lines(input_path, progress.low_water)
+            current = next(lines, None)
+            while current is not None:
+                upcoming = next(lines, None)
+                offset, raw = current
+                next_offset = upcoming[0] if upcoming else os.path.getsize(input_path)
+                current = upcoming
+                if progress.already_done(offset):
+                    continue
+
+                slots.acquire()
+                progress.start(offset, next_offset)
+                pool.submit(process, offset, raw)
+
+                if time.time() - last_log >= report_every:
+                    last_log = time.time()
+                    log_rate("Progress")
+    finally:
+        out_file.close()
+        progress.save()
+
+    stats = log_rate("Done")
+    stats["concurrency"] = controller.stats()
+    if history is not None:
+        stats["lm_history"] = history.stats()
+    if tracer.enabled:
+        stats["top_sinks"] = tracer.report()
+        tracer.export()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and score every prompt of a JSONL file")
+    parser.add_argument("input", help="JSONL file with one prompt per line")
+    parser.add_argument("output", help="JSONL results, appended as rows finish (resumes if it exists, "
+                                       "re-running failed rows)")
+    parser.add_argument("--field", default="prompt", help="Field holding the prompt")
+    parser.add_argument("--no-score", action="store_true", help="Generate only, skip the judge")
+    parser.add_argument("--judge-mode", choices=HelpSteer2Evaluator.MODES, default="per_attribute")
+    parser.add_argument("--concurrency", type=int, default=16, help="Upper bound for in-flight LM calls")
+    parser.add_argument("--program", default=DEFAULT_PROGRAM, help="Saved program to generate with")
+    parser.add_argument("--module", choices=list(HelpSteer2Generator.MODULES), default=None,
+                        help="Module the program was optimized with (default: read from its optimization_results.json)")
+    parser.add_argument("--registry", action="store_true", help="Generate with the registry's current version")
+    parser.add_argument("--no-judge-cache", action="store_true")
+    parser.add_argument("--history-buffer", type=int, default=200,
+                        help="LM history entries kept in memory; older ones go to <output>.history.jsonl.gz (0 = unbounded)")
+    parser.add_argument("--trace", default=None, metavar="PATH", help="Write a Chrome-trace/Perfetto JSON of the run")
+    args = parser.parse_args()
+
+    stats = run_batch(
+        args.input, args.output, field=args.field, score=not args.no_score,
+        judge_mode=args.judge_mode, concurrency=args.concurrency, program_path=args.program,
+        use_registry=args.registry, judge_cache=not args.no_judge_cache, trace=args.trace,
+        history_buffer=args.history_buffer, module=args.module,
+    )
+    with open(args.output + '.stats.json', 'w') as f:
+        json.dump(stats, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Adaptive Output-Token Budgets
+Picks max_tokens per generation from the prompt's question type and retries truncated answers with more room
+"""
+
+import time
+import logging
+import threading
+import contextvars
+
+from src.accounting import add_history_listener
+from src.heuristics import _GREETING, classify_question, last_user_turn
+
+logger = logging.getLogger(__name__)
+
+_attempt = contextvars.ContextVar('budget_attempt', default=None)
+
+# The verbosity rubric caps ideal answers at 20-40 / 80-180 / 180-250 words; ~1.35 tokens
+# per word plus the adapter's field markers, with headroom so a good answer is never cut.
+GENERATION_BUDGETS = {
+    "greeting":    160,
+    "quick_fact":  320,
+    "explanation": 640,
+    "multi_part":  1024,
+}
+
+# A 0-4 digit and one or two sentences per attribute
+JUDGE_BUDGETS = {
+    "per_attribute": 200,
+    "joint":         700,
+}
+
+
+def prompt_class(prompt: str) -> str:
+    """greeting / quick_fact / explanation / multi_part, from the local question-type heuristics."""
+    qtype, _ = classify_question(prompt)
+    if qtype == 'simple':
+        return 'greeting' if _GREETING.match(last_user_turn(prompt)) else 'quick_fact'
+    return 'explanation' if qtype == 'explanation' else 'multi_part'
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+
+def finish_reason(entry: dict):
+    """finish_reason of the first choice in a dspy history entry, if the provider reported one."""
+    choices = getattr(entry.get("response"), "choices", None) or []
+    if not choices:
+        return None
+    choice = choices[0]
+    return choice.get("finish_reason") if isinstance(choice, dict) else getattr(choice, "finish_reason", None)
+
+
+class OutputBudget:
+    """
+    Per-request max_tokens for generation calls.
+
+    The budget comes from prompt_class(); a call that stops with
+    finish_reason == "length" (or fails to parse because it was cut off) is
+    retried with growth × the budget, up to the LM's own ceiling. Shared by
+    deep copies of the generator, like the caches.
+    """
+
+    def __init__(self, budgets: dict = None, ceiling: int = 2000, growth: float = 2.0,
+                 max_latencies: int = 100_000):
+        self.budgets       = {**GENERATION_BUDGETS, **(budgets or {})}
+        self.ceiling       = ceiling
+        self.growth        = growth
+        self.max_latencies = max_latencies
+
+        self.counters  = {c: {"calls": 0, "truncated": 0, "retries": 0, "completion_tokens": 0}
+                          for c in self.budgets}
+        self.latencies = []
+        self._lock     = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        return self
+
+    @classmethod
+    def unbudgeted(cls, ceiling: int = 2000) -> "OutputBudget":
+        """Every class at the ceiling — the old behaviour, with the same stats, for before/after runs."""
+        return cls(budgets={c: ceiling for c in GENERATION_BUDGETS}, ceiling=ceiling)
+
+    def install(self, lm):
+        """Watches the LM's history for finish_reason; call for every LM generations may run on."""
+        add_history_listener(lm, self._on_history)
+        return self
+
+    def _on_history(self, entry: dict):
+        attempt = _attempt.get()
+        if attempt is not None and attempt["budget"] is self:
+            attempt["truncated"]          = attempt["truncated"] or finish_reason(entry) == "length"
+            attempt["completion_tokens"] += (entry.get("usage") or {}).get("completion_tokens", 0) or 0
+
+    def generate(self, predictor, prompt: str):
+        """predictor(prompt=...) under the prompt's budget, growing it while the answer comes back truncated."""
+        category   = prompt_class(prompt)
+        max_tokens = min(self.budgets[category], self.ceiling)
+        start      = time.perf_counter()
+        tokens     = 0
+        retries    = 0
+        truncated  = False
+
+        while True:
+            attempt = {"budget": self, "truncated": False, "completion_tokens": 0}
+            token   = _attempt.set(attempt)
+            try:
+                result, error = predictor(prompt=prompt, config={"max_tokens": max_tokens}), None
+            except Exception as e:
+                result, error = None, e
+            finally:
+                _attempt.reset(token)
+            tokens += attempt["completion_tokens"]
+
+            # A cut-off answer often fails the adapter's parse; only that failure is worth a retry
+            if not attempt["truncated"] or max_tokens >= self.ceiling:
+                break
+            truncated  = True
+            retries   += 1
+            max_tokens = min(self.ceiling, int(max_tokens * self.growth))
+            logger.debug(f"OutputBudget: {category} answer truncated, retrying with max_tokens={max_tokens}")
+
+        with self._lock:
+            c = self.counters[category]
+            c["calls"]             += 1
+            c["truncated"]         += truncated
+            c["retries"]           += retries
+            c["completion_tokens"] += tokens
+            if len(self.latencies) < self.max_latencies:
+                self.latencies.append((time.perf_counter() - start) * 1000)
+
+        if error is not None:
+            raise error
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = sum(c["calls"] for c in self.counters.values())
+            return {
+                "budgets":            dict(self.budgets),
+                "ceiling":            self.ceiling,
+                "calls":              calls,
+                "truncated":          sum(c["truncated"] for c in self.counters.values()),
+                "retries":            sum(c["retries"] for c in self.counters.values()),
+                "completion_tokens":  sum(c["completion_tokens"] for c in self.counters.values()),
+                "p50_latency_ms":     percentile(self.latencies, 0.50),
+                "p99_latency_ms":     percentile(self.latencies, 0.99),
+                "by_class":           {k: dict(c) for k, c in self.counters.items()},
+            }
+
+    def report(self) -> dict:
+        s = self.stats()
+        logger.info("─" * 50)
+        logger.info("OUTPUT BUDGET REPORT")
+        logger.info("─" * 50)
+        for category, c in s["by_class"].items():
+            if c["calls"]:
+                logger.info(f"  {category:<12}: {c['calls']:>5,} calls | max_tokens {s['budgets'][category]:>5} | "
+                            f"{c['completion_tokens'] / c['calls']:7.1f} out tok/call | {c['truncated']} truncated")
+        logger.info(f"  Generation p50 / p99 : {s['p50_latency_ms']} / {s['p99_latency_ms']} ms")
+        logger.info("─" * 50)
+        return s
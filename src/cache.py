@@ -0,0 +1,221 @@
+"""
+Persistent LM Result Caches
+SQLite-backed, content-addressed caches shared across threads and runs
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(project_root, 'data', 'cache')
+
+
+def content_key(*parts) -> str:
+    """sha256 over the JSON encoding of every part, so any input change is a new key."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def lm_identity(lm) -> tuple:
+    """(model, temperature) of the LM a call will actually use."""
+    if lm is None:
+        return None, None
+    return getattr(lm, 'model', None), getattr(lm, 'kwargs', {}).get('temperature')
+
+
+class SQLiteCache:
+    """
+    Key → JSON value store with size- and age-based eviction.
+    Each thread gets its own connection; WAL mode lets several processes share one file.
+    """
+
+    TABLE = 'entries'
+    EVICT_EVERY = 500   # puts between eviction sweeps
+
+    def __init__(self, path: str, max_entries: int = 200_000, max_age_days: float = 30.0):
+        self.path         = path
+        self.max_entries  = max_entries
+        self.max_age_secs = max_age_days * 86400 if max_age_days else None
+
+        self._local      = threading.local()
+        self._lock       = threading.Lock()
+        self._puts       = 0
+        self.hits        = 0
+        self.misses      = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+            "  key        TEXT PRIMARY KEY,"
+            "  value      TEXT NOT NULL,"
+            "  created_at REAL NOT NULL,"
+            "  last_used  REAL NOT NULL"
+            ")"
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_last_used ON {self.TABLE}(last_used)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _fetch(self, key: str):
+        """Raw lookup — touches last_used but does not count as a hit or miss."""
+        now  = time.time()
+        conn = self._conn()
+        row  = conn.execute(
+            f"SELECT value, created_at FROM {self.TABLE} WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None or (self.max_age_secs and now - row[1] > self.max_age_secs):
+            return None
+
+        conn.execute(f"UPDATE {self.TABLE} SET last_used = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return json.loads(row[0])
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str):
+        value = self._fetch(key)
+        self._count(value is not None)
+        return value
+
+    def put(self, key: str, value):
+        now  = time.time()
+        conn = self._conn()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.TABLE} (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now, now),
+        )
+        conn.commit()
+        self._after_put()
+
+    def _after_put(self):
+        with self._lock:
+            self._puts += 1
+            sweep = self._puts % self.EVICT_EVERY == 0
+        if sweep:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drops expired entries, then least-recently-used ones above max_entries."""
+        conn    = self._conn()
+        removed = 0
+        if self.max_age_secs:
+            removed += conn.execute(
+                f"DELETE FROM {self.TABLE} WHERE created_at < ?", (time.time() - self.max_age_secs,)
+            ).rowcount
+        if self.max_entries:
+            removed += conn.execute(
+                f"DELETE FROM {self.TABLE} WHERE key IN ("
+                f"  SELECT key FROM {self.TABLE} ORDER BY last_used DESC LIMIT -1 OFFSET ?"
+                ")",
+                (self.max_entries,),
+            ).rowcount
+        conn.commit()
+        if removed:
+            logger.info(f"{type(self).__name__}: evicted {removed} entries")
+        return removed
+
+    def __len__(self) -> int:
+        return self._conn().execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits":     self.hits,
+            "misses":   self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries":  len(self),
+        }
+
+    def __deepcopy__(self, memo):
+        # dspy deep-copies modules per trial; every copy must share the same store.
+        return self
+
+
+class JudgeCache(SQLiteCache):
+    """Per-attribute judge results keyed by (prompt, response, rubric, judge prompt, model, temperature)."""
+
+    def __init__(self, path: str = os.path.join(CACHE_DIR, 'judge_cache.sqlite'), **kwargs):
+        super().__init__(path, **kwargs)
+
+    @staticmethod
+    def make_key(prompt: str, response: str, rubric: str, instructions: str, model, temperature) -> str:
+        return content_key('judge', prompt, response, rubric, instructions, model, temperature)
+
+
+class GenerationCache(SQLiteCache):
+    """
+    Generator completions keyed by (instructions, field descriptions, demos, prompt, model, sampling params).
+
+    Up to `samples_per_key` completions are stored per key. Until a key has that
+    many, every call is a miss and pays for a fresh completion; afterwards the
+    stored samples are served round-robin. samples_per_key=1 is plain memoisation.
+    """
+
+    def __init__(self, path: str = os.path.join(CACHE_DIR, 'generation_cache.sqlite'),
+                 samples_per_key: int = 1, **kwargs):
+        if samples_per_key < 1:
+            raise ValueError("samples_per_key must be >= 1")
+        super().__init__(path, **kwargs)
+        self.samples_per_key = samples_per_key
+        self._served = {}
+
+    @staticmethod
+    def make_key(instructions: str, fields: list, demos: list, prompt: str, model, sampling: dict) -> str:
+        return content_key('generation', instructions, fields, demos, prompt, model, sampling)
+
+    def lookup(self, key: str):
+        """A cached completion once the key holds samples_per_key samples, else None."""
+        value   = self._fetch(key)
+        samples = value['samples'] if value else []
+
+        if len(samples) < self.samples_per_key:
+            self._count(hit=False)
+            return None
+
+        with self._lock:
+            i = self._served.get(key, 0)
+            self._served[key] = i + 1
+        self._count(hit=True)
+        return samples[i % len(samples)]
+
+    def add(self, key: str, completion: str):
+        """Appends a fresh completion, atomically across threads and processes."""
+        now  = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(f"SELECT value FROM {self.TABLE} WHERE key = ?", (key,)).fetchone()
+            samples = json.loads(row[0])['samples'] if row else []
+            if len(samples) < self.samples_per_key:
+                samples.append(completion)
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.TABLE} (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps({'samples': samples}, ensure_ascii=False), now, now),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self._after_put()
@@ -0,0 +1,284 @@
+"""
+Adaptive (AIMD) Concurrency Control for LM Calls
+Grows in-flight LM calls while the deployment keeps up and halves them on throttling
+"""
+
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+
+import dspy
+
+from src.accounting import notify_history_listeners
+from src.tracing import span
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUS = {408, 429, 503}
+
+
+def is_throttle(error: Exception) -> bool:
+    """429s, timeouts and overload errors — worth retrying later, never worth scoring."""
+    if getattr(error, 'status_code', None) in THROTTLE_STATUS:
+        return True
+    name = type(error).__name__
+    return 'RateLimit' in name or 'Timeout' in name
+
+
+def retry_after(error: Exception) -> float:
+    """Seconds the provider asked us to wait, from the error or its HTTP response headers."""
+    value = getattr(error, 'retry_after', None)
+    if value is None:
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        value = headers.get('retry-after') or headers.get('Retry-After')
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class SharedQuota:
+    """
+    One in-flight budget for several worker processes (e.g. a sweep), layered
+    under each process's AIMDController: a call needs a local AIMD slot and a
+    shared one, and a Retry-After seen by any worker pauses them all. Made in
+    the parent and handed to workers at start-up (initializer args).
+    """
+
+    def __init__(self, max_in_flight: int = 32, context=None):
+        context = context or multiprocessing.get_context("spawn")
+        self.max_in_flight = max_in_flight
+        self._slots        = context.BoundedSemaphore(max_in_flight)
+        self._paused_until = context.Value('d', 0.0)
+
+    def try_acquire(self) -> bool:
+        return self._slots.acquire(block=False)
+
+    def release(self):
+        self._slots.release()
+
+    def pause(self, seconds: float):
+        with self._paused_until.get_lock():
+            self._paused_until.value = max(self._paused_until.value, time.time() + seconds)
+
+    def paused_until(self) -> float:
+        return self._paused_until.value
+
+
+class AIMDController:
+    """
+    Shared limit on in-flight LM calls, tuned like TCP congestion control.
+
+    Every healthy completion adds increase/limit (about +increase per window of
+    calls); a completion slower than latency_tolerance × the best latency seen
+    holds the limit instead. A throttled call multiplies the limit by `decrease`,
+    at most once per typical call latency (one "round trip") so a burst of 429s
+    from the same window counts as one signal, and a Retry-After pauses all new
+    calls until it has passed. With a SharedQuota, slots are also drawn from
+    the cross-process budget.
+    """
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 32,
+                 increase: float = 1.0, decrease: float = 0.5, latency_tolerance: float = 2.5,
+                 shared: SharedQuota = None):
+        self.limit             = float(initial)
+        self.min_limit         = min_limit
+        self.max_limit         = max_limit
+        self.increase          = increase
+        self.decrease          = decrease
+        self.latency_tolerance = latency_tolerance
+        self.shared            = shared
+
+        self.in_flight      = 0
+        self.paused_until   = 0.0
+        self.best_latency   = None
+        self.ewma_latency   = None
+        self._last_decrease = 0.0
+        self._cond          = threading.Condition()
+
+        self.peak_in_flight = 0
+        self.peak_limit     = self.limit
+        self.completed      = 0
+        self.throttled      = 0
+        self.decreases      = 0
+        self._started_at    = time.time()
+        self._area          = 0.0      # ∫ in_flight dt, for the time-weighted mean
+        self._last_change   = self._started_at
+
+    def __deepcopy__(self, memo):
+        return self
+
+    # ── Slots ────────────────────────────────────────────────────────────────
+    def _tick(self, now: float):
+        self._area += self.in_flight * (now - self._last_change)
+        self._last_change = now
+
+    def _try_acquire(self) -> float:
+        """0 on success, otherwise how long to wait before trying again."""
+        now = time.time()
+        paused_until = max(self.paused_until, self.shared.paused_until() if self.shared else 0.0)
+        if now < paused_until:
+            return paused_until - now
+        if self.in_flight >= int(self.limit):
+            return 0.05
+        if self.shared is not None and not self.shared.try_acquire():
+            return 0.01
+        self._tick(now)
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return 0.0
+
+    def acquire(self):
+        with self._cond:
+            while (wait := self._try_acquire()) > 0:
+                self._cond.wait(timeout=wait)
+
+    async def acquire_async(self):
+        while True:
+            with self._cond:
+                wait = self._try_acquire()
+            if wait == 0:
+                return
+            await asyncio.sleep(min(wait, 0.05))
+
+    def release(self, latency_ms: float = None, throttle: Exception = None):
+        with self._cond:
+            now = time.time()
+            self._tick(now)
+            self.in_flight -= 1
+            if self.shared is not None:
+                self.shared.release()
+
+            if throttle is not None:
+                self.throttled += 1
+                pause = retry_after(throttle)
+                if pause:
+                    self.paused_until = max(self.paused_until, now + pause)
+                    if self.shared is not None:
+                        self.shared.pause(pause)
+                window = (self.ewma_latency or 1000.0) / 1000
+                if now - self._last_decrease >= window:
+                    self._last_decrease = now
+                    self.decreases += 1
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    logger.info(f"AIMD: throttled, limit → {self.limit:.1f}"
+                                + (f", pausing {pause:.1f}s" if pause else ""))
+            elif latency_ms is not None:
+                self.completed += 1
+                self.best_latency = latency_ms if self.best_latency is None else min(self.best_latency, latency_ms)
+                self.ewma_latency = latency_ms if self.ewma_latency is None else 0.8 * self.ewma_latency + 0.2 * latency_ms
+                if latency_ms <= self.best_latency * self.latency_tolerance:
+                    self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+                    self.peak_limit = max(self.peak_limit, self.limit)
+
+            self._cond.notify_all()
+
+    # ── Reporting ────────────────────────────────────────────────────────────
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.time()
+            self._tick(now)
+            elapsed = now - self._started_at
+            return {
+                "limit":          round(self.limit, 2),
+                "peak_limit":     round(self.peak_limit, 2),
+                "peak_in_flight": self.peak_in_flight,
+                "mean_in_flight": round(self._area / elapsed, 2) if elapsed else 0.0,
+                "completed":      self.completed,
+                "throttled":      self.throttled,
+                "decreases":      self.decreases,
+            }
+
+    def report(self) -> dict:
+        s = self.stats()
+        logger.info("─" * 50)
+        logger.info("CONCURRENCY REPORT")
+        logger.info("─" * 50)
+        logger.info(f"  Limit now / peak : {s['limit']:.1f} / {s['peak_limit']:.1f}")
+        logger.info(f"  In-flight peak   : {s['peak_in_flight']}")
+        logger.info(f"  In-flight mean   : {s['mean_in_flight']:.2f}")
+        logger.info(f"  Throttled calls  : {s['throttled']:,} ({s['decreases']} decreases)")
+        logger.info("─" * 50)
+        return s
+
+
+class ControlledLM(dspy.BaseLM):
+    """
+    Wraps an LM so every call holds an AIMDController slot, and throttled calls
+    are retried (after Retry-After, or exponential backoff) instead of failing.
+    The inner LM's own retries are turned off so backoff happens in one place,
+    and its history listeners are fed the wrapper's history entries.
+    """
+
+    def __init__(self, inner, controller: AIMDController, max_attempts: int = 8, backoff_s: float = 1.0):
+        super().__init__(model=inner.model, model_type=getattr(inner, 'model_type', 'chat'),
+                         cache=False, **inner.kwargs)
+        if getattr(inner, 'num_retries', None):
+            inner.num_retries = 0
+        self.inner        = inner
+        self.controller   = controller
+        self.max_attempts = max_attempts
+        self.backoff_s    = backoff_s
+
+    def __deepcopy__(self, memo):
+        # lm.copy() deep-copies; clones share the inner LM and the controller
+        clone = ControlledLM.__new__(ControlledLM)
+        clone.__dict__.update(self.__dict__)
+        clone.kwargs  = dict(self.kwargs)
+        clone.history = []
+        return clone
+
+    def update_history(self, entry):
+        # dspy only records calls on the wrapper; the inner LM's listeners (e.g. the LM_RECORD_PATH recorder) hear of them here
+        super().update_history(entry)
+        notify_history_listeners(self.inner, entry)
+
+    def _backoff(self, error: Exception, attempt: int) -> float:
+        if attempt + 1 >= self.max_attempts:
+            raise error
+        delay = retry_after(error) or self.backoff_s * 2 ** attempt
+        logger.debug(f"ControlledLM: throttled ({error}), retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+    def forward(self, prompt=None, messages=None, **kwargs):
+        kwargs = {**self.kwargs, **kwargs}
+        for attempt in range(self.max_attempts):
+            with span("queue_wait", "wait"):
+                self.controller.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.inner.forward(prompt=prompt, messages=messages, **kwargs)
+            except Exception as e:
+                self.controller.release(throttle=e if is_throttle(e) else None)
+                if not is_throttle(e):
+                    raise
+                time.sleep(self._backoff(e, attempt))
+                continue
+            self.controller.release(latency_ms=(time.perf_counter() - start) * 1000)
+            return response
+
+    async def aforward(self, prompt=None, messages=None, **kwargs):
+        kwargs = {**self.kwargs, **kwargs}
+        for attempt in range(self.max_attempts):
+            with span("queue_wait", "wait"):
+                await self.controller.acquire_async()
+            start = time.perf_counter()
+            try:
+                response = await self.inner.aforward(prompt=prompt, messages=messages, **kwargs)
+            except Exception as e:
+                self.controller.release(throttle=e if is_throttle(e) else None)
+                if not is_throttle(e):
+                    raise
+                await asyncio.sleep(self._backoff(e, attempt))
+                continue
+            self.controller.release(latency_ms=(time.perf_counter() - start) * 1000)
+            return response
+
+
+def controlled(lm, controller: AIMDController):
+    """ControlledLM around lm (None passes through), reusing an existing wrapper."""
+    if lm is None or isinstance(lm, ControlledLM):
+        return lm
+    return ControlledLM(lm, controller)
@@ -4,6 +4,7 @@ Provides a simple function to configure DSPy with Azure OpenAI
 """
 
 import os
+import json
 import logging
 from dotenv import load_dotenv
 import dspy
@@ -12,14 +13,104 @@ import dspy
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+LM_ROLES   = ('generator', 'judge')
+_role_lms  = {}
 
-def configure_dspy_with_azure():
-    """Configure DSPy to use Azure OpenAI via dspy.LM with azure/ prefix."""
+
+def role_lm(role: str):
+    """The pooled LM configured for a role, or None when every role uses dspy.settings.lm."""
+    return _role_lms.get(role)
+
+
+def configure_local_lm():
+    """LocalLM stand-in: replays LOCAL_LM_REPLAY_PATH if set, synthesizes everything else."""
+    from src.local_lm import LocalLM
+
+    lm = LocalLM(
+        replay_path=os.getenv('LOCAL_LM_REPLAY_PATH') or None,
+        latency_ms=float(os.getenv('LOCAL_LM_LATENCY_MS', '0')),
+        latency_jitter_ms=float(os.getenv('LOCAL_LM_JITTER_MS', '0')),
+        failure_rate=float(os.getenv('LOCAL_LM_FAILURE_RATE', '0')),
+        on_miss=os.getenv('LOCAL_LM_ON_MISS', 'synthesize'),
+        seed=int(os.getenv('LOCAL_LM_SEED', '0')),
+        ms_per_token=float(os.getenv('LOCAL_LM_MS_PER_TOKEN', '0')),
+        temperature=0.7,
+        max_tokens=2000,
+    )
+    dspy.settings.configure(lm=lm)
+    logger.info("DSPy configured with LocalLM (offline stand-in)")
+    return lm
+
+
+def configure_lm_pools(spec: str):
+    """
+    One PooledLM per role from AZURE_OPENAI_DEPLOYMENTS, a JSON list like
+    [{"name": "eastus", "endpoint": "...", "api_key_env": "AZURE_OPENAI_KEY_EASTUS",
+      "deployment": "gpt-4o-mini", "model": "gpt-4o-mini", "roles": ["generator", "judge"]}]
+    "model" defaults to the deployment name and "roles" to every role. All members
+    of a role must share a model; the generator pool becomes dspy.settings.lm.
+    """
+    from src.lm_pool import PoolMember, PooledLM
+
+    by_role = {role: [] for role in LM_ROLES}
+    for i, entry in enumerate(json.loads(spec)):
+        name    = entry.get('name') or f"deployment-{i}"
+        api_key = entry.get('api_key') or os.getenv(entry.get('api_key_env', 'AZURE_OPENAI_KEY'))
+        if not entry.get('endpoint') or not api_key:
+            raise ValueError(f"Deployment '{name}' needs an endpoint and an api_key / api_key_env")
+
+        member = PoolMember(name, dspy.LM(
+            model=f"azure/{entry['deployment']}",
+            api_key=api_key,
+            api_base=entry['endpoint'],
+            api_version=entry.get('api_version') or os.getenv('AZURE_OPENAI_API_VERSION'),
+            model_type='chat',
+            temperature=0.7,
+            max_tokens=2000,
+            num_retries=1,      # the pool fails over instead of backing off on one deployment
+        ), model=f"azure/{entry.get('model') or entry['deployment']}")
+
+        for role in entry.get('roles', LM_ROLES):
+            if role not in by_role:
+                raise ValueError(f"Deployment '{name}' has unknown role '{role}', expected one of {LM_ROLES}")
+            by_role[role].append(member)
+
+    _role_lms.clear()
+    for role, members in by_role.items():
+        if not members:
+            raise ValueError(f"No deployment serves the '{role}' role")
+        models = {m.model for m in members}
+        if len(models) > 1:
+            raise ValueError(f"'{role}' deployments serve different models {sorted(models)}; "
+                             f"give each model its own role")
+        _role_lms[role] = PooledLM(members, model=models.pop(), temperature=0.7, max_tokens=2000)
+        logger.info(f"LM pool '{role}': {_role_lms[role].model} across {[m.name for m in members]}")
+
+    dspy.settings.configure(lm=_role_lms['generator'])
+    return _role_lms['generator']
+
+
+def configure_dspy_with_azure(backend: str = None):
+    """
+    Configure DSPy to use Azure OpenAI via dspy.LM with azure/ prefix.
+    LM_BACKEND=local (or backend='local') swaps in the offline LocalLM instead.
+    """
     # Load environment variables from project root
     project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     env_path = os.path.join(project_root, '.env')
     load_dotenv(env_path)
 
+    backend = backend or os.getenv('LM_BACKEND', 'azure')
+    if backend == 'local':
+        return configure_local_lm()
+    if backend != 'azure':
+        raise ValueError(f"Unknown LM_BACKEND '{backend}', expected 'azure' or 'local'")
+
+    # Several deployments (regions) pooled for more quota
+    deployments = os.getenv('AZURE_OPENAI_DEPLOYMENTS')
+    if deployments:
+        return configure_lm_pools(deployments)
+
     endpoint = os.getenv('AZURE_OPENAI_ENDPOINT')
     api_key = os.getenv('AZURE_OPENAI_KEY')
     api_version = os.getenv('AZURE_OPENAI_API_VERSION')
@@ -41,6 +132,14 @@ def configure_dspy_with_azure():
         max_tokens=2000,
     )
 
+    # Record every call for offline replay with LocalLM
+    record_path = os.getenv('LM_RECORD_PATH')
+    if record_path:
+        from src.accounting import add_history_listener
+        from src.local_lm import HistoryRecorder
+        add_history_listener(lm, HistoryRecorder(record_path))
+        logger.info(f"Recording LM calls → {record_path}")
+
     dspy.settings.configure(lm=lm)
     logger.info("DSPy configured successfully with Azure OpenAI")
     return lm
@@ -54,4 +153,4 @@ if __name__ == "__main__":
     except Exception as e:
         logger.error(f"FAILED: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
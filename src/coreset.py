@@ -0,0 +1,190 @@
+"""
+Devset Coreset Selection
+Drops near-duplicate prompts (MinHash/LSH) and picks a stratified coreset that ranks candidates like the full pool
+"""
+
+import re
+import random
+import hashlib
+import logging
+
+import numpy as np
+
+from src.heuristics import QUESTION_TYPES, classify_question, last_user_turn, word_count
+from src.surrogate import spearman
+
+logger = logging.getLogger(__name__)
+
+_TOKEN    = re.compile(r"[a-z0-9]+")
+_MERSENNE = (1 << 61) - 1
+
+
+# ── Near-duplicate removal ───────────────────────────────────────────────────
+def shingles(text: str, k: int = 5) -> set:
+    """Word k-shingles of the normalised text; short texts fall back to a single shingle."""
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) <= k:
+        return {' '.join(tokens)}
+    return {' '.join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+
+
+class MinHasher:
+    """num_perm universal hash permutations (a·h + b mod 2^61-1) over 64-bit shingle hashes."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 42):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params   = [(rng.randrange(1, _MERSENNE), rng.randrange(0, _MERSENNE)) for _ in range(num_perm)]
+
+    def signature(self, text: str) -> tuple:
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big')
+                  for s in shingles(text)]
+        return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in self.params)
+
+
+def near_duplicates(texts: list, threshold: float = 0.8, num_perm: int = 64, bands: int = 16) -> list:
+    """
+    Clusters of indices whose estimated Jaccard similarity is at least
+    `threshold`. LSH banding only compares texts that collide in some band, so
+    this stays close to linear in the number of texts.
+    """
+    hasher = MinHasher(num_perm)
+    rows   = num_perm // bands
+    sigs   = [hasher.signature(t) for t in texts]
+
+    parent = list(range(len(texts)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    buckets = {}
+    for i, sig in enumerate(sigs):
+        for band in range(bands):
+            buckets.setdefault((band, sig[band * rows:(band + 1) * rows]), []).append(i)
+
+    for members in buckets.values():
+        for j in members[1:]:
+            i = members[0]
+            if find(i) == find(j):
+                continue
+            similarity = sum(x == y for x, y in zip(sigs[i], sigs[j])) / num_perm
+            if similarity >= threshold:
+                parent[find(j)] = find(i)
+
+    clusters = {}
+    for i in range(len(texts)):
+        clusters.setdefault(find(i), []).append(i)
+    return sorted(clusters.values())
+
+
+def deduplicate(examples: list, threshold: float = 0.8) -> list:
+    """Keeps the first example of every near-duplicate prompt cluster, in the original order."""
+    clusters = near_duplicates([last_user_turn(ex.prompt) for ex in examples], threshold)
+    keep     = sorted(cluster[0] for cluster in clusters)
+    if len(keep) < len(examples):
+        logger.info(f"Coreset: dropped {len(examples) - len(keep)} near-duplicate prompts of {len(examples)}")
+    return [examples[i] for i in keep]
+
+
+# ── Stratified selection ─────────────────────────────────────────────────────
+LENGTH_BINS = ('short', 'medium', 'long')
+LABEL_BINS  = ('low', 'mid', 'high')
+
+
+def _label_bin(example) -> str:
+    helpfulness = float(example.helpfulness)
+    return 'low' if helpfulness < 2 else 'mid' if helpfulness < 3 else 'high'
+
+
+def strata(examples: list) -> list:
+    """(question type, prompt-length tercile, human helpfulness bin) per example."""
+    lengths = [word_count(last_user_turn(ex.prompt)) for ex in examples]
+    cuts    = np.quantile(lengths, [1 / 3, 2 / 3]) if lengths else (0, 0)
+    return [
+        (classify_question(ex.prompt)[0], LENGTH_BINS[int(np.searchsorted(cuts, n, side='right'))], _label_bin(ex))
+        for ex, n in zip(examples, lengths)
+    ]
+
+
+def select_coreset(examples: list, size: int, seed: int = 42) -> list:
+    """
+    `size` examples allocated to strata in proportion to their share of the
+    pool (largest remainder), with every stratum represented while the budget
+    allows; seeded random pick within a stratum. Keeps the pool's order.
+    """
+    if size >= len(examples):
+        return list(examples)
+
+    groups = {}
+    for i, key in enumerate(strata(examples)):
+        groups.setdefault(key, []).append(i)
+
+    # Largest strata first, so a small budget still covers the common prompt types
+    order  = sorted(groups, key=lambda k: (-len(groups[k]), QUESTION_TYPES.index(k[0]), k))
+    quota  = {k: 0 for k in order}
+    for k in order[:size]:
+        quota[k] = 1
+    shares = {k: len(groups[k]) * size / len(examples) for k in order}
+    for _ in range(size - sum(quota.values())):
+        k = max((k for k in order if quota[k] < len(groups[k])), key=lambda k: shares[k] - quota[k])
+        quota[k] += 1
+
+    rng    = random.Random(seed)
+    chosen = []
+    for k in order:
+        chosen += rng.sample(groups[k], quota[k])
+    logger.info(f"Coreset: {size} of {len(examples)} examples across {sum(q > 0 for q in quota.values())}"
+                f"/{len(groups)} strata")
+    return [examples[i] for i in sorted(chosen)]
+
+
+# ── Ranking fidelity ─────────────────────────────────────────────────────────
+def ranking_fidelity(candidate: np.ndarray, example: np.ndarray, values: np.ndarray,
+                     pool: list, subset: list, random_trials: int = 200, seed: int = 42) -> dict:
+    """
+    How well candidate rankings on `subset` match rankings on the whole `pool`
+    (both lists of example keys), from stored per-example scores. Compared with
+    random subsets of the same size, which is what the coreset has to beat.
+    """
+    pool_index = {key: j for j, key in enumerate(pool)}
+    rows       = np.array([c != "" and e in pool_index for c, e in zip(candidate, example)], dtype=bool)
+    names      = sorted(set(candidate[rows]))
+    cand_index = {name: i for i, name in enumerate(names)}
+
+    sums   = np.zeros((len(names), len(pool)))
+    counts = np.zeros((len(names), len(pool)))
+    for c, e, v in zip(candidate[rows], example[rows], values[rows]):
+        sums[cand_index[c], pool_index[e]]   += v
+        counts[cand_index[c], pool_index[e]] += 1
+
+    # Only candidates scored on every pool example can be ranked on both
+    complete = (counts > 0).all(axis=1)
+    matrix   = sums[complete] / counts[complete]
+    if len(matrix) < 3:
+        return {"candidates": int(len(matrix)), "pool": len(pool), "subset": len(subset), "spearman": None}
+
+    full = matrix.mean(axis=1)
+
+    def agreement(columns):
+        sub = matrix[:, columns].mean(axis=1)
+        return spearman(full, sub), bool(np.argmax(sub) == np.argmax(full))
+
+    rho, top1 = agreement([pool_index[key] for key in subset])
+
+    rng        = np.random.default_rng(seed)
+    baseline   = [agreement(rng.choice(len(pool), size=len(subset), replace=False)) for _ in range(random_trials)]
+    random_rho = np.array([r for r, _ in baseline if r is not None])
+
+    return {
+        "candidates":        int(len(matrix)),
+        "pool":              len(pool),
+        "subset":            len(subset),
+        "spearman":          rho,
+        "top1_match":        top1,
+        "random_spearman":   round(float(random_rho.mean()), 4) if len(random_rho) else None,
+        "random_top1_match": round(sum(t for _, t in baseline) / random_trials, 3),
+        "beats_random":      round(float((random_rho < rho).mean()), 3) if len(random_rho) and rho is not None else None,
+    }
@@ -0,0 +1,152 @@
+"""
+HelpSteer2 Dataset Pipeline
+Streams records, filters unsafe prompts and draws a seeded, cached train/dev split
+"""
+
+import os
+import re
+import json
+import random
+import logging
+import dspy
+
+from src.cache import CACHE_DIR, content_key
+
+logger = logging.getLogger(__name__)
+
+
+# ── Prompt Filter ─────────────────────────────────────────────────────────────
+BLOCKED_PHRASES = [
+    # jailbreaks
+    'dan', 'jailbreak', 'ignore previous', 'bypass', 'do anything now',
+    # games / prompt extraction
+    "let's play a game", 'quizzer', 'repeat the above',
+    # harm
+    'kill my', 'harm ', 'hurt my',
+]
+MAX_TURN_MARKERS = 6
+
+# Plain substring alternation — same matches as the old chain of `in` scans, one pass.
+_BLOCKED = re.compile('|'.join(re.escape(p) for p in BLOCKED_PHRASES))
+
+
+def is_clean_prompt(example: dict) -> bool:
+    prompt_lower = example.get('prompt', '').lower()
+    if _BLOCKED.search(prompt_lower):
+        return False
+    if prompt_lower.count('<extra_id_1>') > MAX_TURN_MARKERS:
+        return False
+    return True
+
+
+# ── Streaming ─────────────────────────────────────────────────────────────────
+def iter_records(path: str):
+    """
+    Yields (position, record). For JSONL the position is the byte offset of the
+    line, so a record can be re-read later with a single seek. A plain JSON
+    array has to be loaded whole; its position is the list index.
+    """
+    if path.endswith('.jsonl'):
+        with open(path, 'rb') as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    yield offset, json.loads(line)
+    else:
+        logger.warning(f"{os.path.basename(path)} is not JSONL — loading it whole")
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from enumerate(json.load(f))
+
+
+def read_records_at(path: str, positions: list) -> list:
+    """Re-reads only the records at the given positions, in the given order."""
+    if path.endswith('.jsonl'):
+        records = {}
+        with open(path, 'rb') as f:
+            for offset in sorted(positions):
+                f.seek(offset)
+                records[offset] = json.loads(f.readline())
+        return [records[p] for p in positions]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        dataset = json.load(f)
+    return [dataset[p] for p in positions]
+
+
+def reservoir_sample(items, k: int, rng: random.Random) -> list:
+    """Uniform sample of k items from a stream of unknown length (Algorithm R)."""
+    reservoir = []
+    for i, item in enumerate(items):
+        if i < k:
+            reservoir.append(item)
+        else:
+            j = rng.randint(0, i)
+            if j < k:
+                reservoir[j] = item
+    return reservoir
+
+
+def to_example(r: dict) -> dspy.Example:
+    return dspy.Example(
+        prompt      = r["prompt"],
+        response    = r["response"],
+        helpfulness = r.get("helpfulness", 0),
+        correctness = r.get("correctness", 0),
+        coherence   = r.get("coherence",   0),
+        complexity  = r.get("complexity",  0),
+        verbosity   = r.get("verbosity",   0),
+        goodness    = r.get("goodness",    0.0),
+    ).with_inputs("prompt")
+
+
+# ── Split ─────────────────────────────────────────────────────────────────────
+def _index_path(path: str, sample_size: int, seed: int) -> str:
+    stat = os.stat(path)
+    key  = content_key('split', os.path.abspath(path), stat.st_size, stat.st_mtime, sample_size, seed)
+    return os.path.join(CACHE_DIR, f"split_{key[:16]}.json")
+
+
+def sample_clean_positions(path: str, sample_size: int, seed: int) -> list:
+    """Positions of a seeded uniform sample of clean records, cached on disk per (file, size, seed)."""
+    index_path = _index_path(path, sample_size, seed)
+    if os.path.exists(index_path):
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+        logger.info(f"Loaded cached split index ({index['clean']} clean of {index['total']} records)")
+        return index['positions']
+
+    rng   = random.Random(seed)
+    stats = {'total': 0, 'clean': 0}
+
+    def clean_positions():
+        for position, record in iter_records(path):
+            stats['total'] += 1
+            if is_clean_prompt(record):
+                stats['clean'] += 1
+                yield position
+
+    positions = reservoir_sample(clean_positions(), sample_size, rng)
+    rng.shuffle(positions)   # reservoir keeps stream order for the first k slots
+
+    logger.info(f"Loaded {stats['total']} records from {os.path.basename(path)}")
+    logger.info(f"Clean examples after filtering: {stats['clean']}")
+    if len(positions) < sample_size:
+        raise ValueError(f"Only {len(positions)} clean records in {path}, need {sample_size}")
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Parallel sweep workers may build the same index; each writes its own tmp file
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'source': os.path.abspath(path), 'seed': seed, 'positions': positions, **stats}, f)
+    os.replace(tmp_path, index_path)
+    return positions
+
+
+def load_split(path: str, sample_size: int = 200, train_size: int = 160, seed: int = 42) -> tuple:
+    """Seeded train/dev split; dspy.Example objects are built only for the sampled records."""
+    positions = sample_clean_positions(path, sample_size, seed)
+    examples  = [to_example(r) for r in read_records_at(path, positions)]
+    return examples[:train_size], examples[train_size:]
@@ -3,14 +3,49 @@ HelpSteer2 Multi-Attribute Evaluator
 Evaluates responses on 5 HelpSteer2 dimensions using DSPy
 """
 
+import os
 import re
+import asyncio
 import logging
+import threading
+from contextlib import asynccontextmanager
+
 import dspy
 
-from src.signatures import EvaluationSignature
+from src.budget import JUDGE_BUDGETS
+from src.cache import JudgeCache, lm_identity
+from src.concurrency import is_throttle
+from src.heuristics import HeuristicScorer
+from src.signatures import EvaluationSignature, JointEvaluationSignature
+from src.tracing import span
 
 logger = logging.getLogger(__name__)
 
+# Per-process cap on in-flight async judge calls, shared by every evaluator
+# instance and every Evaluate worker thread.
+MAX_CONCURRENT_JUDGE_CALLS = int(os.getenv('MAX_CONCURRENT_JUDGE_CALLS', '8'))
+_judge_slots = threading.BoundedSemaphore(MAX_CONCURRENT_JUDGE_CALLS)
+
+
+@asynccontextmanager
+async def _judge_slot():
+    # Polling keeps the wait cancellable without tying up an executor thread.
+    with span("judge_slot", "wait"):
+        while not _judge_slots.acquire(blocking=False):
+            await asyncio.sleep(0.005)
+    try:
+        yield
+    finally:
+        _judge_slots.release()
+
+
+def _loop_running() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
 
 class HelpSteer2Evaluator(dspy.Module):
     """
@@ -79,24 +114,48 @@ class HelpSteer2Evaluator(dspy.Module):
         ),
     }
 
-    def __init__(self):
+    MODES = ('per_attribute', 'joint')
+
+    def __init__(self, mode: str = 'per_attribute', concurrent: bool = False, cache: JudgeCache = None,
+                 heuristic: HeuristicScorer = None, lm=None, budget: bool = False):
         super().__init__()
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown evaluator mode '{mode}', expected one of {self.MODES}")
+        self.mode = mode
+        self.concurrent = concurrent
+        self.cache = cache
+        self.heuristic = heuristic
         self.evaluate_attr = dspy.Predict(EvaluationSignature)
-        logger.info("Initialized HelpSteer2Evaluator with Predict")
+        self.evaluate_joint = dspy.Predict(JointEvaluationSignature)
+        self._joint_subsets = {}   # joint predictors for the attributes the heuristic left undecided
+        # A score and a sentence or two never need the generator's 2000-token ceiling
+        self.judge_config = {"max_tokens": JUDGE_BUDGETS[mode]} if budget else {}
+        if lm is not None:
+            # A dedicated judge LM (e.g. the 'judge' pool) — otherwise dspy.settings.lm
+            self.set_lm(lm)
+        logger.info(f"Initialized HelpSteer2Evaluator with Predict (mode={mode}, concurrent={concurrent})")
 
     def forward(self, prompt: str, response: str):
-        scores = {}
-        justifications = {}
+        if self.concurrent and not _loop_running():
+            return asyncio.run(self.aforward(prompt=prompt, response=response))
 
-        for attr_name, attr_desc in self.ATTRIBUTES.items():
-            result = self.evaluate_attr(
-                prompt=prompt,
-                response=response,
-                attribute=attr_desc
-            )
-            scores[attr_name] = self._extract_score(result.score)
-            justifications[attr_name] = getattr(result, 'justification', '')
+        if self.mode == 'joint':
+            scores, justifications = self._judge_joint(prompt, response)
+        else:
+            scores, justifications = self._judge_each(prompt, response, list(self.ATTRIBUTES))
+
+        return self._prediction(prompt, response, scores, justifications)
+
+    async def aforward(self, prompt: str, response: str):
+        """Async path — attribute calls are sent concurrently through the LM's async interface."""
+        if self.mode == 'joint':
+            scores, justifications = await self._ajudge_joint(prompt, response)
+        else:
+            scores, justifications = await self._ajudge_each(prompt, response, list(self.ATTRIBUTES))
+
+        return self._prediction(prompt, response, scores, justifications)
 
+    def _prediction(self, prompt: str, response: str, scores: dict, justifications: dict):
         return dspy.Prediction(
             scores=scores,
             justifications=justifications,
@@ -105,12 +164,223 @@ class HelpSteer2Evaluator(dspy.Module):
             response=response
         )
 
-    def _extract_score(self, text: str) -> int:
+    # ── Per-attribute judging ────────────────────────────────────────────────
+    def _cache_key(self, attr_name: str, prompt: str, response: str):
+        if self.cache is None:
+            return None
+        model, temperature = lm_identity(self.evaluate_attr.lm or dspy.settings.lm)
+        return self.cache.make_key(
+            prompt, response, self.ATTRIBUTES[attr_name],
+            self.evaluate_attr.signature.instructions, model, temperature,
+        )
+
+    def _local_score(self, attr_name: str, prompt: str, response: str):
+        """Confident heuristic (score, justification), or None when the LLM judge is needed."""
+        if self.heuristic is None:
+            return None
+        result = self.heuristic.decide(attr_name, prompt, response)
+        if result is None:
+            return None
+        return result.score, f"[heuristic] {result.reason}"
+
+    def _local_scores(self, prompt: str, response: str) -> tuple:
+        """(scores, justifications) of every attribute the heuristic is confident about."""
+        scores, justifications = {}, {}
+        for attr_name in self.ATTRIBUTES:
+            local = self._local_score(attr_name, prompt, response)
+            if local is not None:
+                scores[attr_name], justifications[attr_name] = local
+        return scores, justifications
+
+    def _judge_attr(self, attr_name: str, prompt: str, response: str, consult_heuristic: bool = True) -> tuple:
+        local = self._local_score(attr_name, prompt, response) if consult_heuristic else None
+        if local is not None:
+            return local
+
+        key = self._cache_key(attr_name, prompt, response)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached['score'], cached['justification']
+
+        result = self.evaluate_attr(
+            prompt=prompt,
+            response=response,
+            attribute=self.ATTRIBUTES[attr_name],
+            config=self.judge_config,
+        )
+        return self._store(key, attr_name, result)
+
+    async def _ajudge_attr(self, attr_name: str, prompt: str, response: str,
+                           consult_heuristic: bool = True) -> tuple:
+        local = self._local_score(attr_name, prompt, response) if consult_heuristic else None
+        if local is not None:
+            return local
+
+        key = self._cache_key(attr_name, prompt, response)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached['score'], cached['justification']
+
+        async with _judge_slot():
+            result = await self.evaluate_attr.acall(
+                prompt=prompt,
+                response=response,
+                attribute=self.ATTRIBUTES[attr_name],
+                config=self.judge_config,
+            )
+        return self._store(key, attr_name, result)
+
+    def _store(self, key, attr_name: str, result) -> tuple:
+        score = self._parse_score(result.score)
+        justification = getattr(result, 'justification', '')
+        if score is None:
+            # Unparseable judgements get the default but are never cached
+            return self._extract_score(result.score), justification
+        if key is not None:
+            self.cache.put(key, {'attribute': attr_name, 'score': score, 'justification': justification})
+        return score, justification
+
+    def _judge_each(self, prompt: str, response: str, attr_names: list, consult_heuristic: bool = True) -> tuple:
+        """One EvaluationSignature call per attribute."""
+        scores = {}
+        justifications = {}
+
+        for attr_name in attr_names:
+            scores[attr_name], justifications[attr_name] = self._judge_attr(
+                attr_name, prompt, response, consult_heuristic)
+
+        return scores, justifications
+
+    async def _ajudge_each(self, prompt: str, response: str, attr_names: list,
+                           consult_heuristic: bool = True) -> tuple:
+        results = await asyncio.gather(
+            *(self._ajudge_attr(attr_name, prompt, response, consult_heuristic) for attr_name in attr_names)
+        )
+        scores = {a: score for a, (score, _) in zip(attr_names, results)}
+        justifications = {a: just for a, (_, just) in zip(attr_names, results)}
+        return scores, justifications
+
+    # ── Joint judging ────────────────────────────────────────────────────────
+    def _joint_predictor(self, attr_names: list):
+        """evaluate_joint, or a predictor asking for attr_names only when the heuristic settled the rest."""
+        if len(attr_names) == len(self.ATTRIBUTES):
+            return self.evaluate_joint
+        key = ','.join(attr_names)
+        predictor = self._joint_subsets.get(key)
+        if predictor is None:
+            signature = JointEvaluationSignature.with_instructions(
+                "Evaluate response quality on the listed HelpSteer2 attributes in one pass (0-4 integer scale each)")
+            for attr_name in self.ATTRIBUTES:
+                if attr_name not in attr_names:
+                    signature = signature.delete(f'{attr_name}_score').delete(f'{attr_name}_justification')
+            predictor = self._joint_subsets.setdefault(key, dspy.Predict(signature))
+        predictor.lm = self.evaluate_joint.lm
+        return predictor
+
+    def _judge_joint(self, prompt: str, response: str) -> tuple:
+        """
+        One JointEvaluationSignature call for every attribute the heuristic
+        (if any) did not settle. Attributes whose score field is missing or
+        unparseable are re-judged individually, so a partial parse never costs
+        more than the per-attribute path.
+        """
+        scores, justifications = self._local_scores(prompt, response)
+        pending = [a for a in self.ATTRIBUTES if a not in scores]
+        if not pending:
+            return self._ordered(scores), self._ordered(justifications)
+
+        try:
+            result = self._joint_predictor(pending)(
+                prompt=prompt,
+                response=response,
+                rubrics=self.joint_rubrics(pending),
+                config=self.judge_config,
+            )
+        except Exception as e:
+            if is_throttle(e):
+                raise   # five more calls would only deepen the throttling
+            logger.warning(f"Joint evaluation failed ({e}), falling back to per-attribute calls")
+            result = None
+
+        failed = self._parse_joint(result, pending, scores, justifications)
+        if failed:
+            logger.info(f"Joint evaluation fallback for: {', '.join(failed)}")
+            with span("joint_fallback", "judge", attributes=len(failed)):
+                fb_scores, fb_justifications = self._judge_each(prompt, response, failed, consult_heuristic=False)
+            scores.update(fb_scores)
+            justifications.update(fb_justifications)
+
+        return self._ordered(scores), self._ordered(justifications)
+
+    async def _ajudge_joint(self, prompt: str, response: str) -> tuple:
+        scores, justifications = self._local_scores(prompt, response)
+        pending = [a for a in self.ATTRIBUTES if a not in scores]
+        if not pending:
+            return self._ordered(scores), self._ordered(justifications)
+
+        try:
+            async with _judge_slot():
+                result = await self._joint_predictor(pending).acall(
+                    prompt=prompt,
+                    response=response,
+                    rubrics=self.joint_rubrics(pending),
+                    config=self.judge_config,
+                )
+        except Exception as e:
+            if is_throttle(e):
+                raise
+            logger.warning(f"Joint evaluation failed ({e}), falling back to per-attribute calls")
+            result = None
+
+        failed = self._parse_joint(result, pending, scores, justifications)
+        if failed:
+            logger.info(f"Joint evaluation fallback for: {', '.join(failed)}")
+            with span("joint_fallback", "judge", attributes=len(failed)):
+                fb_scores, fb_justifications = await self._ajudge_each(prompt, response, failed,
+                                                                       consult_heuristic=False)
+            scores.update(fb_scores)
+            justifications.update(fb_justifications)
+
+        return self._ordered(scores), self._ordered(justifications)
+
+    def _parse_joint(self, result, attr_names: list, scores: dict, justifications: dict) -> list:
+        """Fills scores / justifications from a joint result; returns the attributes that failed to parse."""
+        failed = []
+
+        for attr_name in attr_names:
+            raw = getattr(result, f'{attr_name}_score', None) if result is not None else None
+            score = self._parse_score(raw) if raw is not None else None
+            if score is None:
+                failed.append(attr_name)
+                continue
+            scores[attr_name] = score
+            justifications[attr_name] = getattr(result, f'{attr_name}_justification', '')
+
+        return failed
+
+    def _ordered(self, values: dict) -> dict:
+        # Keep attribute order identical to the per-attribute path
+        return {a: values[a] for a in self.ATTRIBUTES}
+
+    @classmethod
+    def joint_rubrics(cls, attr_names: list = None) -> str:
+        return '\n\n'.join(cls.ATTRIBUTES[a] for a in (attr_names or cls.ATTRIBUTES))
+
+    def _parse_score(self, text):
+        """Strict parse — returns None instead of a default when no 0-4 score is found."""
         if isinstance(text, (int, float)):
             return int(max(0, min(4, text)))
-        text = str(text).strip()
-        match = re.search(r'\b([0-4])(?:\.\d*)?\b', text)
+        match = re.search(r'\b([0-4])(?:\.\d*)?\b', str(text).strip())
         if match:
             return int(match.group(1))
-        logger.warning(f"Could not parse score from: '{text}', defaulting to 2")
-        return 2  
\ No newline at end of file
+        return None
+
+    def _extract_score(self, text: str) -> int:
+        score = self._parse_score(text)
+        if score is not None:
+            return score
+        with span("extract_score_default", "judge"):
+            logger.warning(f"Could not parse score from: '{str(text).strip()}', defaulting to 2")
+        return 2
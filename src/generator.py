@@ -3,21 +3,115 @@ HelpSteer2 Response Generator
 Simple Predict module using HelpSteer2Signature
 """
 
+import os
+import json
+import time
 import logging
+import threading
 import dspy
 
+from src.cache import GenerationCache, lm_identity
+from src.registry import predictor_for
 from src.signatures import HelpSteer2Signature
 
 logger = logging.getLogger(__name__)
 
+# Module level rather than per instance: dspy deep-copies modules, and locks don't copy
+_swap_lock = threading.Lock()
+
+
+def saved_module(program_path: str) -> str:
+    """Module a saved program was optimized with, read from the optimization_results.json beside it."""
+    results_path = os.path.join(os.path.dirname(program_path), 'optimization_results.json')
+    try:
+        with open(results_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("module", "predict")
+    except FileNotFoundError:
+        return "predict"
+
 
 class HelpSteer2Generator(dspy.Module):
-    """DSPy Predict-based generator for Azure OpenAI"""
+    """
+    DSPy Predict-based generator for Azure OpenAI.
+
+    With a SignatureRegistry, the current version's instructions replace the
+    built-in ones and the registry is re-checked every poll_s seconds; a new
+    version is swapped in by rebinding self.generate, so calls already running
+    finish on the predictor they started with.
 
-    def __init__(self):
+    With an OutputBudget, each call's max_tokens is sized to the prompt's
+    question type instead of the LM-wide ceiling.
+    """
+
+    MODULES = {'predict': dspy.Predict, 'cot': dspy.ChainOfThought}
+
+    def __init__(self, cache: GenerationCache = None, registry=None, poll_s: float = 5.0, budget=None,
+                 module: str = 'predict'):
         super().__init__()
-        self.generate = dspy.Predict(HelpSteer2Signature)
-        logger.info("Initialized HelpSteer2Generator with Predict (simple prompting)")
+        if module not in self.MODULES:
+            raise ValueError(f"Unknown generator module '{module}', expected one of {tuple(self.MODULES)}")
+        self.generate = self.MODULES[module](HelpSteer2Signature)
+        self.cache = cache
+        self.registry = registry
+        self.poll_s = poll_s
+        self.budget = budget
+        self.version = None
+        self._stamp = None
+        self._next_poll = 0.0
+        if registry is not None:
+            self.refresh()
+        logger.info(f"Initialized HelpSteer2Generator with {type(self.generate).__name__}")
+
+    def refresh(self):
+        """Swaps to the registry's current version if it changed since the last check."""
+        with _swap_lock:
+            self._next_poll = time.monotonic() + self.poll_s
+            stamp = self.registry.stamp()
+            if stamp == self._stamp:
+                return
+            self._stamp = stamp
+            record = self.registry.current()
+            if record is None or record["version"] == self.version:
+                return
+            self.generate = predictor_for(record)
+            self.version = record["version"]
+        logger.info(f"HelpSteer2Generator: now serving registry v{self.version:04d}")
 
     def forward(self, prompt: str):
-        return self.generate(prompt=prompt)
\ No newline at end of file
+        if self.registry is not None and time.monotonic() >= self._next_poll:
+            self.refresh()
+        generate = self.generate
+
+        if self.cache is None:
+            return self._generate(generate, prompt)
+
+        key = self._cache_key(prompt, generate)
+        response = self.cache.lookup(key)
+        if response is not None:
+            return dspy.Prediction(response=response)
+
+        result = self._generate(generate, prompt)
+        self.cache.add(key, result.response)
+        return result
+
+    def _generate(self, generate, prompt: str):
+        if self.budget is None:
+            return generate(prompt=prompt)
+        return self.budget.generate(generate, prompt)
+
+    def _cache_key(self, prompt: str, generate=None) -> str:
+        # ChainOfThought wraps its Predict in .predict
+        generate = generate or self.generate
+        predictor = getattr(generate, 'predict', generate)
+        signature = predictor.signature
+        lm = predictor.lm or dspy.settings.lm
+        model, _ = lm_identity(lm)
+
+        return self.cache.make_key(
+            signature.instructions,
+            [(name, field.json_schema_extra.get('desc')) for name, field in signature.fields.items()],
+            [demo.toDict() for demo in predictor.demos],
+            prompt,
+            model,
+            dict(getattr(lm, 'kwargs', {})),
+        )
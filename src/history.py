@@ -0,0 +1,154 @@
+"""
+Bounded LM History
+Keeps only the newest LM history entries in memory and spills older ones to a gzip JSONL log
+"""
+
+import os
+import sys
+import gzip
+import json
+import atexit
+import logging
+import threading
+
+import dspy
+from dspy.clients import base_lm
+
+logger = logging.getLogger(__name__)
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_DIR  = os.path.join(project_root, 'data', 'history')
+
+# The raw provider response object is large and not JSON; usage and outputs already carry what matters
+_SKIP_KEYS = ('response',)
+
+
+class HistorySpill:
+    """Append-only gzip JSONL log of evicted history entries; one gzip member per flush."""
+
+    def __init__(self, path: str, flush_every: int = 200):
+        self.path        = path
+        self.flush_every = flush_every
+        self.written     = 0
+        self._buffer     = []
+        self._lock       = threading.Lock()
+        self._failed     = False
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        atexit.register(self.flush)
+
+    def write(self, entry: dict):
+        line = json.dumps({k: v for k, v in entry.items() if k not in _SKIP_KEYS}, ensure_ascii=False, default=str)
+        with self._lock:
+            self._buffer.append(line)
+            full = len(self._buffer) >= self.flush_every
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            if not lines:
+                return
+            try:
+                with gzip.open(self.path, 'at', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+                self.written += len(lines)
+            except OSError as e:
+                if not self._failed:
+                    logger.warning(f"History spill to {self.path} failed ({e}); older entries are dropped")
+                self._failed = True
+
+
+class SpillingHistory(list):
+    """
+    A list that holds at most `capacity` entries. Whatever leaves the front —
+    evicted here, or popped by dspy's own size check — goes to the spill log,
+    and the aggregate counters cover every entry ever appended.
+    """
+
+    def __init__(self, capacity: int, spill: HistorySpill = None, entries=()):
+        super().__init__()
+        self.capacity = capacity
+        self.spill    = spill
+        self.counters = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0, "by_model": {}}
+        self._lock    = threading.Lock()
+        for entry in entries:
+            self.append(entry)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def append(self, entry):
+        usage = entry.get("usage") or {}
+        model = entry.get("model")
+        with self._lock:
+            c = self.counters
+            c["calls"]             += 1
+            c["prompt_tokens"]     += usage.get("prompt_tokens", 0) or 0
+            c["completion_tokens"] += usage.get("completion_tokens", 0) or 0
+            c["cost"]              += entry.get("cost") or 0.0
+            c["by_model"][model]    = c["by_model"].get(model, 0) + 1
+
+            super().append(entry)
+            evicted = [super(SpillingHistory, self).pop(0) for _ in range(len(self) - self.capacity)]
+        self._spill(evicted)
+
+    def pop(self, index: int = -1):
+        with self._lock:
+            entry = super().pop(index)
+        if index == 0:
+            self._spill([entry])
+        return entry
+
+    def _spill(self, entries: list):
+        if self.spill is not None:
+            for entry in entries:
+                self.spill.write(entry)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {**self.counters, "by_model": dict(self.counters["by_model"]), "in_memory": len(self)}
+        stats["cost"] = round(stats["cost"], 6)
+        if self.spill is not None:
+            stats["spilled"]    = self.spill.written + len(self.spill._buffer)
+            stats["spill_path"] = os.path.relpath(self.spill.path, project_root)
+        return stats
+
+
+def _replace_global_history(history: SpillingHistory):
+    # update_history looks GLOBAL_HISTORY up by name at call time; rebind every module holding the old list
+    old = base_lm.GLOBAL_HISTORY
+    for name, module in list(sys.modules.items()):
+        if name.startswith('dspy') and getattr(module, 'GLOBAL_HISTORY', None) is old:
+            module.GLOBAL_HISTORY = history
+
+
+def bound_history(capacity: int = 200, spill_path: str = None, lms: list = ()) -> SpillingHistory:
+    """
+    Caps dspy's process-wide history at `capacity` entries, spilling the rest
+    to `spill_path` (gzip JSONL) when given. Per-LM and per-module histories
+    only repeat the global entries, so they are just capped via
+    dspy.settings.max_history_size; any LMs passed in are trimmed right away.
+    """
+    if isinstance(base_lm.GLOBAL_HISTORY, SpillingHistory):
+        return base_lm.GLOBAL_HISTORY
+
+    spill   = HistorySpill(spill_path) if spill_path else None
+    history = SpillingHistory(capacity, spill, entries=base_lm.GLOBAL_HISTORY)
+    _replace_global_history(history)
+    dspy.settings.configure(max_history_size=capacity)
+    for lm in lms:
+        if lm is not None and len(lm.history) > capacity:
+            del lm.history[:-capacity]
+
+    logger.info(f"LM history bounded to {capacity} entries"
+                + (f", older entries → {os.path.relpath(spill_path, project_root)}" if spill_path else ""))
+    return history
+
+
+def read_spill(path: str):
+    """Yields the entries of a spill log, oldest first."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
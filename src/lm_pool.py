@@ -0,0 +1,168 @@
+"""
+Pooled LM Across Deployments
+Routes each call to the least-loaded, fastest healthy deployment and fails over when one errors
+"""
+
+import copy
+import time
+import logging
+import threading
+
+import dspy
+
+from src.concurrency import is_throttle, retry_after
+
+logger = logging.getLogger(__name__)
+
+# Errors worth trying on another deployment; any other 4xx is the request's fault
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+# Members can serve several role pools, so their counters share one lock
+_state_lock = threading.Lock()
+
+
+def is_retryable(error: Exception) -> bool:
+    """Throttles and server-side HTTP failures; anything else (parsing, validation, bugs) is the call's own fault."""
+    return is_throttle(error) or getattr(error, 'status_code', None) in RETRYABLE_STATUS
+
+
+class PoolMember:
+    """One deployment plus its live load and health."""
+
+    def __init__(self, name: str, lm, model: str = None):
+        self.name  = name
+        self.lm    = lm
+        self.model = model or lm.model   # what the deployment serves, whatever it is called
+
+        self.in_flight      = 0
+        self.ewma_ms        = None
+        self.calls          = 0
+        self.failures       = 0
+        self.consecutive    = 0
+        self.cooldown_until = 0.0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def expected_ms(self) -> float:
+        # Unmeasured members cost nothing, so each one gets probed early
+        return (self.in_flight + 1) * (self.ewma_ms or 0.0)
+
+
+class PooledLM(dspy.BaseLM):
+    """
+    dspy LM over several deployments of the same model.
+
+    Each call goes to the healthy member with the lowest expected wait —
+    (in-flight calls + 1) × EWMA latency. A member that fails with a retryable
+    error (429, 5xx, timeouts) is put in cooldown, doubling per consecutive
+    failure and honouring Retry-After, and the call moves on to the next member.
+    Every member must serve the same model, and the pool reports that model as
+    its own, so cache keys and usage accounting never see the deployment.
+    """
+
+    def __init__(self, members: list, model: str, alpha: float = 0.2,
+                 cooldown_s: float = 5.0, max_cooldown_s: float = 120.0, **kwargs):
+        if not members:
+            raise ValueError("PooledLM needs at least one member")
+        models = {m.model for m in members}
+        if models != {model}:
+            raise ValueError(f"Pool for {model} mixes models: {sorted(models)}")
+
+        super().__init__(model=model, model_type="chat", cache=False, **kwargs)
+        self.members        = members
+        self.alpha          = alpha
+        self.cooldown_s     = cooldown_s
+        self.max_cooldown_s = max_cooldown_s
+
+    def __deepcopy__(self, memo):
+        # lm.copy() deep-copies; clones share members and their health state
+        clone = copy.copy(self)
+        clone.kwargs  = copy.deepcopy(self.kwargs, memo)
+        clone.history = []
+        return clone
+
+    # ── Routing ──────────────────────────────────────────────────────────────
+    def _order(self) -> list:
+        """Members to try, best first: healthy by expected wait, then cooling down by recovery time."""
+        now = time.time()
+        with _state_lock:
+            healthy = sorted((m for m in self.members if m.healthy(now)), key=PoolMember.expected_ms)
+            cooling = sorted((m for m in self.members if not m.healthy(now)), key=lambda m: m.cooldown_until)
+        return healthy + cooling
+
+    def _start(self, member: PoolMember):
+        with _state_lock:
+            member.in_flight += 1
+
+    def _succeeded(self, member: PoolMember, elapsed_ms: float):
+        with _state_lock:
+            member.in_flight  -= 1
+            member.calls      += 1
+            member.consecutive = 0
+            member.ewma_ms = elapsed_ms if member.ewma_ms is None else \
+                (1 - self.alpha) * member.ewma_ms + self.alpha * elapsed_ms
+
+    def _failed(self, member: PoolMember, error: Exception):
+        with _state_lock:
+            member.in_flight -= 1
+            if not is_retryable(error):
+                return
+            member.failures    += 1
+            member.consecutive += 1
+            cooldown = min(self.max_cooldown_s, self.cooldown_s * 2 ** (member.consecutive - 1))
+            cooldown = max(cooldown, retry_after(error))
+            member.cooldown_until = time.time() + cooldown
+        logger.warning(f"PooledLM: {member.name} failed ({error}); cooling down {cooldown:.0f}s")
+
+    # ── dspy BaseLM interface ────────────────────────────────────────────────
+    def forward(self, prompt=None, messages=None, **kwargs):
+        kwargs = {**self.kwargs, **kwargs}
+        error  = None
+        for member in self._order():
+            self._start(member)
+            start = time.perf_counter()
+            try:
+                response = member.lm.forward(prompt=prompt, messages=messages, **kwargs)
+            except Exception as e:
+                self._failed(member, e)
+                if not is_retryable(e):
+                    raise
+                error = e
+                continue
+            self._succeeded(member, (time.perf_counter() - start) * 1000)
+            return response
+        raise error
+
+    async def aforward(self, prompt=None, messages=None, **kwargs):
+        kwargs = {**self.kwargs, **kwargs}
+        error  = None
+        for member in self._order():
+            self._start(member)
+            start = time.perf_counter()
+            try:
+                response = await member.lm.aforward(prompt=prompt, messages=messages, **kwargs)
+            except Exception as e:
+                self._failed(member, e)
+                if not is_retryable(e):
+                    raise
+                error = e
+                continue
+            self._succeeded(member, (time.perf_counter() - start) * 1000)
+            return response
+        raise error
+
+    def stats(self) -> dict:
+        now = time.time()
+        with _state_lock:
+            return {
+                m.name: {
+                    "calls":     m.calls,
+                    "failures":  m.failures,
+                    "in_flight": m.in_flight,
+                    "ewma_ms":   round(m.ewma_ms, 1) if m.ewma_ms is not None else None,
+                    "healthy":   m.healthy(now),
+                }
+                for m in self.members
+            }
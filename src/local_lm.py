@@ -0,0 +1,242 @@
+"""
+Local LM Stand-in for Offline Runs
+Replays recorded LM history or synthesizes well-formed dspy responses without a live deployment
+"""
+
+import re
+import copy
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from types import SimpleNamespace
+
+import dspy
+
+logger = logging.getLogger(__name__)
+
+
+def messages_key(messages: list) -> str:
+    payload = json.dumps(messages, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class SyntheticRateLimitError(Exception):
+    """Injected failure shaped like a provider 429."""
+    status_code = 429
+
+    def __init__(self, retry_after: float = 1.0):
+        super().__init__(f"Synthetic rate limit (retry after {retry_after:.1f}s)")
+        self.retry_after = retry_after
+
+
+# ── Recording ────────────────────────────────────────────────────────────────
+class HistoryRecorder:
+    """History listener that appends every LM call to a JSONL file for later replay."""
+
+    def __init__(self, path: str):
+        self.path  = path
+        self._lock = threading.Lock()
+
+    def __call__(self, entry: dict):
+        messages = entry.get("messages") or [{"role": "user", "content": entry.get("prompt")}]
+        record = {
+            "key":      messages_key(messages),
+            "model":    entry.get("model"),
+            "messages": messages,
+            "outputs":  entry.get("outputs"),
+            "usage":    entry.get("usage") or {},
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+# ── Synthesis ────────────────────────────────────────────────────────────────
+_OUTPUT_SECTION = re.compile(r"Your output fields are:\s*\n(.*?)(?:\n\s*\n|All interactions)", re.S)
+_FIELD_LINE     = re.compile(r"^\s*\d+\.\s*`(\w+)`\s*(?:\(([^)]*)\))?", re.M)
+
+_FILLER = (
+    "the answer depends on context but the key idea is simple and can be explained "
+    "in plain language with one short example that shows how it works in practice"
+).split()
+
+_INSTRUCTION_VARIANTS = (
+    "Answer the user's question directly, using plain language and only as many words as it needs.",
+    "Respond clearly and concisely; define technical terms when first used and skip filler phrases.",
+    "Give a focused answer sized to the question: brief for simple asks, structured for multi-part ones.",
+    "Address every part of the question accurately, explain jargon immediately, and stop when done.",
+)
+
+
+def output_fields(system_message: str) -> list:
+    """[(name, type)] of the output fields a dspy ChatAdapter/JSONAdapter prompt asks for."""
+    section = _OUTPUT_SECTION.search(system_message or '')
+    if not section:
+        return [("response", "str")]
+    return [(name, (ftype or "str").strip()) for name, ftype in _FIELD_LINE.findall(section.group(1))]
+
+
+class LocalLM(dspy.BaseLM):
+    """
+    dspy LM that never leaves the process.
+
+    Calls whose messages were recorded (see HistoryRecorder) are replayed from the
+    recording, cycling through multiple recorded outputs for the same messages.
+    Anything else is synthesized: every requested output field is filled with a
+    plausible value, so adapters parse it like a real completion. Latency and
+    failure rate are configurable, and usage is estimated at ~4 characters per token.
+    Like a real deployment, output past max_tokens is cut off with
+    finish_reason "length", and ms_per_token adds decode time per output token.
+    """
+
+    def __init__(self, model: str = "local/synthetic", replay_path: str = None,
+                 latency_ms: float = 0.0, latency_jitter_ms: float = 0.0,
+                 failure_rate: float = 0.0, on_miss: str = "synthesize", seed: int = 0,
+                 ms_per_token: float = 0.0, temperature: float = 0.7, max_tokens: int = 2000, **kwargs):
+        super().__init__(model=model, model_type="chat", temperature=temperature,
+                         max_tokens=max_tokens, cache=False, **kwargs)
+        if on_miss not in ("synthesize", "error"):
+            raise ValueError("on_miss must be 'synthesize' or 'error'")
+
+        self.latency_ms        = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.failure_rate      = failure_rate
+        self.ms_per_token      = ms_per_token
+        self.on_miss           = on_miss
+        self.replay_path       = replay_path
+
+        self._rng        = random.Random(seed)
+        self._lock       = threading.Lock()
+        self._served     = {}
+        self.recorded    = {}
+        self.replayed    = 0
+        self.synthesized = 0
+
+        if replay_path:
+            with open(replay_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.recorded.setdefault(record["key"], []).append(record)
+            logger.info(f"LocalLM: loaded {sum(map(len, self.recorded.values()))} recorded calls")
+
+    def __deepcopy__(self, memo):
+        # lm.copy() deep-copies; clones share the recordings, RNG and lock
+        clone = copy.copy(self)
+        clone.kwargs  = copy.deepcopy(self.kwargs, memo)
+        clone.history = []
+        return clone
+
+    # ── Behaviour knobs ──────────────────────────────────────────────────────
+    def _draw(self) -> tuple:
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-1, 1) * self.latency_jitter_ms) / 1000
+            fail  = self._rng.random() < self.failure_rate
+        return delay, fail
+
+    def _complete(self, messages: list, kwargs: dict) -> SimpleNamespace:
+        key = messages_key(messages)
+        records = self.recorded.get(key)
+
+        if records:
+            with self._lock:
+                i = self._served.get(key, 0)
+                self._served[key] = i + 1
+                self.replayed += 1
+            record = records[i % len(records)]
+            text   = (record["outputs"] or [""])[0]
+            text   = text.get("text", "") if isinstance(text, dict) else text
+            usage  = record.get("usage") or {}
+        elif self.on_miss == "error":
+            raise KeyError(f"LocalLM: no recording for messages {key[:12]}")
+        else:
+            with self._lock:
+                self.synthesized += 1
+            text  = self._synthesize(messages, kwargs)
+            usage = {}
+
+        prompt_tokens = usage.get("prompt_tokens") or sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+        completion_tokens = usage.get("completion_tokens") or estimate_tokens(text)
+
+        finish_reason = "stop"
+        max_tokens    = kwargs.get("max_tokens", self.kwargs.get("max_tokens"))
+        if max_tokens and completion_tokens > max_tokens:
+            text, completion_tokens, finish_reason = text[:max_tokens * 4], max_tokens, "length"
+
+        return SimpleNamespace(
+            model=self.model,
+            choices=[SimpleNamespace(
+                message=SimpleNamespace(content=text, tool_calls=None),
+                finish_reason=finish_reason,
+            )],
+            usage={
+                "prompt_tokens":     prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens":      prompt_tokens + completion_tokens,
+            },
+            _hidden_params={"response_cost": 0.0},
+        )
+
+    def _synthesize(self, messages: list, kwargs: dict) -> str:
+        system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        user   = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+
+        with self._lock:
+            values = {name: self._value(name, ftype, user) for name, ftype in output_fields(system)}
+
+        if kwargs.get("response_format"):
+            return json.dumps(values)
+        body = "".join(f"[[ ## {name} ## ]]\n{value}\n\n" for name, value in values.items())
+        return body + "[[ ## completed ## ]]"
+
+    def _value(self, name: str, ftype: str, user: str):
+        ftype = ftype.lower()
+        if name == "score" or name.endswith("_score"):
+            return str(self._rng.choice([2, 3, 3, 4]))
+        if "justification" in name:
+            return "The response addresses the criterion adequately with minor room for improvement."
+        if "instruction" in name:
+            return self._rng.choice(_INSTRUCTION_VARIANTS)
+        if ftype.startswith(("int", "float")):
+            return str(self._rng.randint(0, 4))
+        if ftype.startswith("bool"):
+            return "True"
+        if ftype.startswith(("list", "dict")):
+            return "[]" if ftype.startswith("list") else "{}"
+        if name == "response":
+            # Longer prompts get longer answers, roughly like a real generator
+            n = min(400, 30 + len(user.split()) * 3 + self._rng.randint(0, 60))
+            return " ".join(self._rng.choice(_FILLER) for _ in range(n)).capitalize() + "."
+        return "A short synthesized summary of the requested content."
+
+    # ── dspy BaseLM interface ────────────────────────────────────────────────
+    def _decode_s(self, response) -> float:
+        return self.ms_per_token * response.usage["completion_tokens"] / 1000
+
+    def forward(self, prompt=None, messages=None, **kwargs):
+        messages = messages or [{"role": "user", "content": prompt}]
+        delay, fail = self._draw()
+        time.sleep(delay)
+        if fail:
+            raise SyntheticRateLimitError(retry_after=max(delay, 0.5))
+        response = self._complete(messages, kwargs)
+        time.sleep(self._decode_s(response))
+        return response
+
+    async def aforward(self, prompt=None, messages=None, **kwargs):
+        messages = messages or [{"role": "user", "content": prompt}]
+        delay, fail = self._draw()
+        await asyncio.sleep(delay)
+        if fail:
+            raise SyntheticRateLimitError(retry_after=max(delay, 0.5))
+        response = self._complete(messages, kwargs)
+        await asyncio.sleep(self._decode_s(response))
+        return response
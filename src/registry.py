@@ -0,0 +1,257 @@
+"""
+Versioned Signature Registry
+Publishes optimized instructions as numbered versions that running generators pick up without a restart
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+import dspy
+
+from src.signatures import HelpSteer2Signature
+
+logger = logging.getLogger(__name__)
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REGISTRY_DIR = os.path.join(project_root, 'data', 'registry')
+
+
+def _write_tmp(path: str, data) -> str:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_path
+
+
+def _write_atomic(path: str, data):
+    os.replace(_write_tmp(path, data), path)
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Exclusive lock on path across processes; the OS drops it if the holder dies."""
+    with open(path, 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _create_exclusive(path: str, data) -> bool:
+    """Writes path only if nothing is there yet — atomically, even across processes; False if taken."""
+    tmp_path = _write_tmp(path, data)
+    try:
+        os.link(tmp_path, path)    # unlike os.replace, fails when path exists
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(tmp_path)
+
+
+class SignatureRegistry:
+    """
+    Versions live in vNNNN.json and never change once written. pointers.json
+    names the current version, an optional pending one and the activation
+    history; it is replaced atomically, so readers see either the old pointers
+    or the new ones, and every read-modify-write of it holds pointers.lock, so
+    concurrent writers in other processes never lose each other's changes.
+    Rollback re-activates the previous entry of that history.
+    """
+
+    def __init__(self, root: str = REGISTRY_DIR):
+        self.root          = root
+        self.pointers_path = os.path.join(root, 'pointers.json')
+        self.lock_path     = os.path.join(root, 'pointers.lock')
+        self._lock         = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    # ── Reading ──────────────────────────────────────────────────────────────
+    def _version_path(self, version: int) -> str:
+        return os.path.join(self.root, f"v{version:04d}.json")
+
+    def pointers(self) -> dict:
+        try:
+            with open(self.pointers_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"current": None, "pending": None, "history": []}
+
+    def stamp(self):
+        """Changes whenever the pointers do; cheap enough to poll per request."""
+        try:
+            st = os.stat(self.pointers_path)
+            return st.st_ino, st.st_mtime_ns   # os.replace gives every write a new inode
+        except FileNotFoundError:
+            return None
+
+    def versions(self) -> list:
+        return sorted(int(name[1:5]) for name in os.listdir(self.root)
+                      if name.startswith('v') and name.endswith('.json'))
+
+    def load(self, version: int) -> dict:
+        with open(self._version_path(version), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def current(self):
+        version = self.pointers()["current"]
+        return self.load(version) if version is not None else None
+
+    def pending(self):
+        version = self.pointers()["pending"]
+        return self.load(version) if version is not None else None
+
+    # ── Writing ──────────────────────────────────────────────────────────────
+    @contextmanager
+    def _pointers_locked(self):
+        with self._lock, _file_lock(self.lock_path):
+            yield
+
+    def publish(self, instructions: str, demos: list = None, metadata: dict = None,
+                activate: bool = True, module: str = "predict") -> int:
+        """Writes a new version and makes it current (or pending, for shadow evaluation)."""
+        record = {
+            "instructions": instructions,
+            "demos":        demos or [],
+            "module":       module,
+            "created_at":   time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "metadata":     metadata or {},
+        }
+        # Another process (e.g. a parallel sweep run) may claim the same number; take the next one
+        version = (self.versions() or [0])[-1] + 1
+        while not _create_exclusive(self._version_path(version), {"version": version, **record}):
+            version += 1
+        logger.info(f"Registry: published v{version:04d}")
+        if activate:
+            self.activate(version)
+        else:
+            self.set_pending(version)
+        return version
+
+    def activate(self, version: int):
+        with self._pointers_locked():
+            self.load(version)   # fail before touching pointers if it doesn't exist
+            pointers = self.pointers()
+            if pointers["current"] == version:
+                return
+            pointers["current"] = version
+            pointers["history"].append(version)
+            if pointers["pending"] == version:
+                pointers["pending"] = None
+            _write_atomic(self.pointers_path, pointers)
+        logger.info(f"Registry: v{version:04d} is now current")
+
+    def set_pending(self, version):
+        with self._pointers_locked():
+            if version is not None:
+                self.load(version)
+            pointers = self.pointers()
+            pointers["pending"] = version
+            _write_atomic(self.pointers_path, pointers)
+        logger.info(f"Registry: pending version → {f'v{version:04d}' if version else 'none'}")
+
+    def rollback(self) -> int:
+        with self._pointers_locked():
+            pointers = self.pointers()
+            if len(pointers["history"]) < 2:
+                raise ValueError("Nothing to roll back to")
+            pointers["history"].pop()
+            pointers["current"] = pointers["history"][-1]
+            _write_atomic(self.pointers_path, pointers)
+        logger.info(f"Registry: rolled back to v{pointers['current']:04d}")
+        return pointers["current"]
+
+    # ── Shadow results ───────────────────────────────────────────────────────
+    def record_shadow(self, version: int, live_scores: dict, shadow_scores: dict):
+        line = json.dumps({"live": live_scores, "shadow": shadow_scores})
+        with self._lock, open(os.path.join(self.root, f"shadow_v{version:04d}.jsonl"), 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+    def shadow_report(self, version: int) -> dict:
+        """Per-attribute mean live vs shadow score over the traffic sampled so far."""
+        path = os.path.join(self.root, f"shadow_v{version:04d}.jsonl")
+        if not os.path.exists(path):
+            return {"version": version, "samples": 0, "attributes": {}}
+
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        attributes = {}
+        for attr in rows[0]["live"] if rows else []:
+            live   = sum(r["live"][attr] for r in rows) / len(rows)
+            shadow = sum(r["shadow"][attr] for r in rows) / len(rows)
+            attributes[attr] = {"live": round(live, 3), "shadow": round(shadow, 3), "diff": round(shadow - live, 3)}
+        return {"version": version, "samples": len(rows), "attributes": attributes}
+
+
+def predictor_for(record: dict) -> dspy.Module:
+    """A fresh generator module (Predict or ChainOfThought, as published) carrying a version's instructions and demos."""
+    from src.generator import HelpSteer2Generator   # generator imports this module
+    module = HelpSteer2Generator.MODULES[record.get("module", "predict")]
+    predictor = module(HelpSteer2Signature.with_instructions(record["instructions"]))
+    demos = [dspy.Example(**demo) for demo in record.get("demos", [])]
+    for inner in predictor.predictors():   # ChainOfThought keeps its Predict under .predict
+        inner.demos = demos
+    return predictor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and manage the signature registry")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Show versions and pointers")
+    sub.add_parser("rollback", help="Re-activate the previously current version")
+    activate = sub.add_parser("activate", help="Make a version current")
+    activate.add_argument("version", type=int)
+    pending = sub.add_parser("pending", help="Stage a version for shadow evaluation (0 clears)")
+    pending.add_argument("version", type=int)
+    shadow = sub.add_parser("shadow", help="Live vs shadow scores of a pending version")
+    shadow.add_argument("version", type=int, nargs="?")
+    args = parser.parse_args()
+
+    registry = SignatureRegistry()
+    if args.command == "list":
+        pointers = registry.pointers()
+        for version in registry.versions():
+            record = registry.load(version)
+            tag = " (current)" if version == pointers["current"] else " (pending)" if version == pointers["pending"] else ""
+            logger.info(f"v{version:04d}{tag} {record['created_at']}  {record['instructions'][:80]}")
+    elif args.command == "rollback":
+        registry.rollback()
+    elif args.command == "activate":
+        registry.activate(args.version)
+    elif args.command == "pending":
+        registry.set_pending(args.version or None)
+    elif args.command == "shadow":
+        version = args.version or registry.pointers()["pending"]
+        if version is None:
+            raise SystemExit("No pending version")
+        logger.info(json.dumps(registry.shadow_report(version), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    main()
@@ -0,0 +1,150 @@
+"""
+Columnar Per-Example Score Store
+Keeps every judge result as append-only npz columns so metrics can be recomputed without judge calls
+"""
+
+import os
+import time
+import atexit
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCORES_DIR   = os.path.join(project_root, 'data', 'scores')
+
+ATTRIBUTES = ('helpfulness', 'correctness', 'coherence', 'complexity', 'verbosity')
+MISSING    = -1
+
+
+class ScoreStore:
+    """
+    One directory per run under data/scores, holding immutable part_NNNNN.npz
+    chunks. Each row is one judged (phase, candidate, example) with a 0-4 score
+    and a justification per attribute; a run is never rewritten, only appended to.
+    """
+
+    def __init__(self, root: str = SCORES_DIR, run: str = None, phase_fn=None, flush_every: int = 500):
+        self.root        = root
+        self.run         = run
+        self.phase_fn    = phase_fn or (lambda: "")
+        self.flush_every = flush_every
+
+        self._rows  = []
+        self._parts = 0
+        self._lock  = threading.Lock()
+
+        if run is not None:
+            os.makedirs(os.path.join(root, run), exist_ok=True)
+            self._parts = len(self._part_paths(run))
+            atexit.register(self.flush)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    # ── Writing ──────────────────────────────────────────────────────────────
+    def record(self, candidate: str, example: str, scores: dict, justifications: dict = None):
+        justifications = justifications or {}
+        row = (
+            self.phase_fn(),
+            candidate or "",
+            example,
+            [scores.get(a, MISSING) for a in ATTRIBUTES],
+            [str(justifications.get(a, "")) for a in ATTRIBUTES],
+            time.time(),
+        )
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.flush_every
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+            if not rows:
+                return
+            part = self._parts
+            self._parts += 1
+
+        phases, candidates, examples, scores, justifications, ts = zip(*rows)
+        path     = os.path.join(self.root, self.run, f"part_{part:05d}.npz")
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                phase=np.array(phases),
+                candidate=np.array(candidates),
+                example=np.array(examples),
+                scores=np.array(scores, dtype=np.int8),
+                justifications=np.array(justifications),
+                ts=np.array(ts),
+            )
+        os.replace(tmp_path, path)
+        logger.debug(f"ScoreStore: wrote {len(rows)} rows → {os.path.relpath(path, project_root)}")
+
+    # ── Reading ──────────────────────────────────────────────────────────────
+    def _part_paths(self, run: str) -> list:
+        run_dir = os.path.join(self.root, run)
+        return sorted(os.path.join(run_dir, name) for name in os.listdir(run_dir)
+                      if name.startswith('part_') and name.endswith('.npz'))
+
+    def runs(self) -> list:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+    def load(self, runs: list = None, justifications: bool = False) -> dict:
+        """All stored rows of the given runs (default: all) as column arrays."""
+        columns = {k: [] for k in ('run', 'phase', 'candidate', 'example', 'scores', 'ts')}
+        if justifications:
+            columns['justifications'] = []
+
+        for run in runs or self.runs():
+            for path in self._part_paths(run):
+                with np.load(path) as part:
+                    n = len(part['example'])
+                    columns['run'].append(np.full(n, run))
+                    for key in columns:
+                        if key != 'run':
+                            columns[key].append(part[key])
+
+        if not columns['run']:
+            return {k: np.empty((0, len(ATTRIBUTES)) if k in ('scores', 'justifications') else 0)
+                    for k in columns}
+        return {k: np.concatenate(v) for k, v in columns.items()}
+
+
+# ── Vectorized re-scoring ────────────────────────────────────────────────────
+def composite(scores: np.ndarray, weights: dict, value_maps: dict) -> np.ndarray:
+    """
+    Composite metric for every row of an (n, 5) score matrix. Attributes with a
+    value map (e.g. complexity, verbosity) are looked up in it, the rest are
+    score / 4; rows with a missing score get that attribute's worst value, 0.
+    """
+    total = np.zeros(len(scores))
+    valid = scores >= 0
+    for i, attr in enumerate(ATTRIBUTES):
+        column = np.clip(scores[:, i], 0, 4)
+        if attr in value_maps:
+            table  = np.array([value_maps[attr].get(v, 0.0) for v in range(5)])
+            values = table[column]
+        else:
+            values = column / 4.0
+        total += weights.get(attr, 0.0) * np.where(valid[:, i], values, 0.0)
+    return np.round(total, 4)
+
+
+def group_means(columns: dict, values: np.ndarray, by: tuple = ('run', 'phase')) -> list:
+    """[(key tuple, mean, count)] of values grouped by the given columns, in first-seen order."""
+    if not len(values):
+        return []
+    keys = np.array(['\x1f'.join(parts) for parts in zip(*(columns[c] for c in by))])
+    uniq, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    sums   = np.bincount(inverse, weights=values)
+    counts = np.bincount(inverse)
+    order  = np.argsort(first)
+    return [(tuple(uniq[i].split('\x1f')), sums[i] / counts[i], int(counts[i])) for i in order]
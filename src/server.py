@@ -0,0 +1,275 @@
+"""
+Serving Mode for the Optimized Program
+Local HTTP API over optimized_program.json with request coalescing and latency metrics
+"""
+
+import os
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.cache import content_key
+from src.config import configure_dspy_with_azure, role_lm
+from src.evaluator import HelpSteer2Evaluator
+from src.generator import HelpSteer2Generator, saved_module
+from src.registry import SignatureRegistry, predictor_for
+
+logger = logging.getLogger(__name__)
+
+project_root    = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PROGRAM = os.path.join(project_root, 'data', 'optimized_program.json')
+
+
+def percentile(sorted_values: list, q: float):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class GenerationService:
+    """
+    Loads the program once and answers prompts on a worker pool.
+
+    Identical prompts that are already queued or in flight share one Future, so
+    they cost one LM call. Every other request goes straight to the pool: chat
+    completion APIs take one conversation per call, so holding requests back to
+    form a batch would only add latency.
+
+    With a registry and shadow_rate > 0, that fraction of live prompts is also
+    answered by the registry's pending version on a separate pool; both answers
+    are judged and recorded for `python -m src.registry shadow`.
+    """
+
+    def __init__(self, program, evaluator: HelpSteer2Evaluator = None, workers: int = 32,
+                 latency_window: int = 4096, registry: SignatureRegistry = None, shadow_rate: float = 0.0):
+        if shadow_rate and (registry is None or evaluator is None):
+            raise ValueError("Shadow evaluation needs a registry and a judge")
+        self.program     = program
+        self.evaluator   = evaluator
+        self.registry    = registry
+        self.shadow_rate = shadow_rate
+
+        self._inflight = {}               # request key → Future
+        self._lock     = threading.Lock()
+        self._pool     = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='generate')
+
+        self.latencies   = deque(maxlen=latency_window)
+        self.requests    = 0
+        self.coalesced   = 0
+        self.errors      = 0
+        self.queued      = 0
+        self.running     = 0
+        self.shadowed    = 0
+        self.started_at  = time.time()
+
+        self._shadow_pool      = ThreadPoolExecutor(max_workers=2, thread_name_prefix='shadow')
+        self._shadow_predictor = (None, None)   # (version, predictor)
+        self._shadow_lock      = threading.Lock()
+
+    # ── Requests ─────────────────────────────────────────────────────────────
+    def submit(self, prompt: str, score: bool = False) -> tuple:
+        """(Future of the result dict, whether it joined an identical in-flight request)."""
+        if score and self.evaluator is None:
+            raise ValueError("Scoring is disabled; start the server with --judge-mode")
+
+        key = content_key('serve', prompt, score)
+        with self._lock:
+            self.requests += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, True
+            future = Future()
+            self._inflight[key] = future
+            self.queued += 1
+
+        self._pool.submit(self._run, key, prompt, score, future)
+        return future, False
+
+    def _run(self, key: str, prompt: str, score: bool, future: Future):
+        with self._lock:
+            self.queued  -= 1
+            self.running += 1
+        try:
+            prediction = self.program(prompt=prompt)
+            result = {"response": prediction.response}
+            if score:
+                judged = self.evaluator(prompt=prompt, response=prediction.response)
+                result["scores"] = judged.scores
+            future.set_result(result)
+            if self.shadow_rate and random.random() < self.shadow_rate:
+                self._shadow_pool.submit(self._shadow, prompt, result)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self._inflight.pop(key, None)
+
+    def _shadow(self, prompt: str, live: dict):
+        record = self.registry.pending()
+        if record is None:
+            return
+        # Separate from _lock so a rebuild never stalls the request path
+        with self._shadow_lock:
+            version, predictor = self._shadow_predictor
+            if version != record["version"]:
+                predictor = predictor_for(record)
+                self._shadow_predictor = (record["version"], predictor)
+
+        try:
+            response      = predictor(prompt=prompt).response
+            shadow_scores = self.evaluator(prompt=prompt, response=response).scores
+            live_scores   = live.get("scores") or self.evaluator(prompt=prompt, response=live["response"]).scores
+        except Exception as e:
+            logger.warning(f"Shadow evaluation of v{record['version']:04d} failed: {e}")
+            return
+        self.registry.record_shadow(record["version"], live_scores, shadow_scores)
+        with self._lock:
+            self.shadowed += 1
+
+    def record_latency(self, latency_ms: float):
+        with self._lock:
+            self.latencies.append(latency_ms)
+
+    # ── Metrics ──────────────────────────────────────────────────────────────
+    def metrics(self) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            return {
+                "uptime_s":        round(time.time() - self.started_at, 1),
+                "requests":        self.requests,
+                "coalesced":       self.coalesced,
+                "errors":          self.errors,
+                "queue_depth":     self.queued,
+                "running":         self.running,
+                "shadowed":        self.shadowed,
+                "serving_version": getattr(self.program, 'version', None),
+                "latency_ms": {
+                    "p50":     round(percentile(latencies, 0.50), 1) if latencies else None,
+                    "p99":     round(percentile(latencies, 0.99), 1) if latencies else None,
+                    "max":     round(latencies[-1], 1) if latencies else None,
+                    "samples": len(latencies),
+                },
+            }
+
+
+# ── HTTP ─────────────────────────────────────────────────────────────────────
+class ServeHandler(BaseHTTPRequestHandler):
+    service: GenerationService = None
+    timeout_s: float = 120.0
+
+    def _send(self, status: int, body: dict):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, {"status": "ok"})
+        elif self.path == '/metrics':
+            self._send(200, self.service.metrics())
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != '/generate':
+            self._send(404, {"error": f"Unknown path {self.path}"})
+            return
+
+        start = time.perf_counter()
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("body must be a JSON object")
+            prompt = body['prompt']
+            if not isinstance(prompt, str):
+                raise ValueError("prompt must be a string")
+            future, coalesced = self.service.submit(prompt, score=bool(body.get('score')))
+        except (KeyError, ValueError) as e:
+            self._send(400, {"error": f"Bad request: {e}"})
+            return
+
+        try:
+            result = dict(future.result(timeout=self.timeout_s))
+        except Exception as e:
+            logger.warning(f"Generation failed: {e}")
+            self._send(502, {"error": str(e)})
+            return
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.service.record_latency(latency_ms)
+        result.update(latency_ms=round(latency_ms, 1), coalesced=coalesced)
+        self._send(200, result)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def load_program(path: str, module: str = None) -> HelpSteer2Generator:
+    # A cot program's state sits under generate.predict, so it must be loaded into a ChainOfThought
+    module  = module or saved_module(path)
+    program = HelpSteer2Generator(module=module)
+    program.load(path)
+    logger.info(f"Loaded optimized {module} program from {os.path.relpath(path, project_root)}")
+    return program
+
+
+def serve(host: str = '127.0.0.1', port: int = 8080, program_path: str = DEFAULT_PROGRAM,
+          judge_mode: str = None, workers: int = 32, use_registry: bool = False, shadow_rate: float = 0.0,
+          module: str = None):
+    configure_dspy_with_azure()
+    evaluator = HelpSteer2Evaluator(mode=judge_mode, lm=role_lm("judge")) if judge_mode else None
+
+    # From the registry, new versions are picked up live; otherwise the saved program is fixed
+    registry = SignatureRegistry() if use_registry else None
+    program  = HelpSteer2Generator(registry=registry) if registry else load_program(program_path, module)
+
+    ServeHandler.service = GenerationService(
+        program, evaluator=evaluator, workers=workers,
+        registry=registry, shadow_rate=shadow_rate,
+    )
+    server = ThreadingHTTPServer((host, port), ServeHandler)
+    server.daemon_threads = True
+    logger.info(f"Serving on http://{host}:{port} (POST /generate, GET /metrics, GET /health)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the optimized HelpSteer2 program over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--program", default=DEFAULT_PROGRAM, help="Saved program (optimized_program.json)")
+    parser.add_argument("--module", choices=list(HelpSteer2Generator.MODULES), default=None,
+                        help="Module the program was optimized with (default: read from its optimization_results.json)")
+    parser.add_argument("--judge-mode", choices=HelpSteer2Evaluator.MODES, default=None,
+                        help="Enable {\"score\": true} requests, judged in this mode")
+    parser.add_argument("--workers", type=int, default=32, help="Concurrent LM-backed requests")
+    parser.add_argument("--registry", action="store_true",
+                        help="Serve the registry's current version and hot-swap when a new one is activated")
+    parser.add_argument("--shadow-rate", type=float, default=0.0,
+                        help="Fraction of traffic also answered by the pending version (needs --registry, --judge-mode)")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.program, args.judge_mode,
+          args.workers, args.registry, args.shadow_rate, args.module)
+
+
+if __name__ == "__main__":
+    main()
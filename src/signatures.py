@@ -37,4 +37,22 @@ class EvaluationSignature(dspy.Signature):
     )
     justification = dspy.OutputField(
         desc="Brief 1-2 sentence explanation for the score"
-    )
\ No newline at end of file
+    )
+
+class JointEvaluationSignature(dspy.Signature):
+    """Evaluate response quality on all five HelpSteer2 attributes in one pass (0-4 integer scale each)"""
+
+    prompt = dspy.InputField(desc="Original user question")
+    response = dspy.InputField(desc="Generated response to evaluate")
+    rubrics = dspy.InputField(desc="Detailed scoring criteria for every attribute, one block per attribute")
+
+    helpfulness_score = dspy.OutputField(desc="Integer score from 0-4 for helpfulness. Return only the number.")
+    helpfulness_justification = dspy.OutputField(desc="Brief 1-2 sentence explanation for the helpfulness score")
+    correctness_score = dspy.OutputField(desc="Integer score from 0-4 for correctness. Return only the number.")
+    correctness_justification = dspy.OutputField(desc="Brief 1-2 sentence explanation for the correctness score")
+    coherence_score = dspy.OutputField(desc="Integer score from 0-4 for coherence. Return only the number.")
+    coherence_justification = dspy.OutputField(desc="Brief 1-2 sentence explanation for the coherence score")
+    complexity_score = dspy.OutputField(desc="Integer score from 0-4 for complexity. Return only the number.")
+    complexity_justification = dspy.OutputField(desc="Brief 1-2 sentence explanation for the complexity score")
+    verbosity_score = dspy.OutputField(desc="Integer score from 0-4 for verbosity. Return only the number.")
+    verbosity_justification = dspy.OutputField(desc="Brief 1-2 sentence explanation for the verbosity score")
@@ -0,0 +1,191 @@
+"""
+Local Surrogate Metric
+CPU-only ridge regression on cheap text features that approximates the LLM judge for ranking
+"""
+
+import re
+import math
+import logging
+import threading
+
+import numpy as np
+
+from src.heuristics import VERBOSITY_BANDS, classify_question, jargon_density, last_user_turn, word_count
+
+logger = logging.getLogger(__name__)
+
+ATTRIBUTES = ('helpfulness', 'correctness', 'coherence', 'complexity', 'verbosity')
+
+# Human HelpSteer2 complexity / verbosity run monotonically (0 = simple / terse, 4 = expert /
+# verbose) while the judge rubric scores them 2 = ideal; only these three share a scale
+SHARED_SCALE = ('helpfulness', 'correctness', 'coherence')
+
+_SENTENCE = re.compile(r"[.!?]+(?:\s|$)")
+_BULLET   = re.compile(r"^\s*(\d+[.)]|[-*•])\s+", re.M)
+_REFUSAL  = re.compile(r"\b(i can(?:no|')t|i am unable|i'm unable|as an ai|i won't)\b", re.I)
+_TOKEN    = re.compile(r"[a-z0-9]+")
+
+
+def features(prompt: str, response: str) -> np.ndarray:
+    """Fixed-length feature vector for one (prompt, response) pair — no LM involved."""
+    turn         = last_user_turn(prompt)
+    qtype, qconf = classify_question(prompt)
+    lower, upper = VERBOSITY_BANDS[qtype]
+    words        = word_count(response)
+    sentences    = max(1, len(_SENTENCE.findall(response)))
+    density, explained = jargon_density(response)
+
+    prompt_tokens   = set(_TOKEN.findall(turn.lower()))
+    response_tokens = set(_TOKEN.findall(response.lower()))
+    overlap = len(prompt_tokens & response_tokens) / len(prompt_tokens) if prompt_tokens else 0.0
+
+    return np.array([
+        math.log1p(words),
+        words / lower if lower else 0.0,
+        float(words < lower),
+        float(words > upper),
+        words / sentences,
+        len(_BULLET.findall(response)),
+        response.count('```') / 2,
+        density,
+        explained,
+        overlap,
+        float(bool(_REFUSAL.search(response))),
+        math.log1p(word_count(turn)),
+        turn.count('?'),
+        float(qtype == 'simple'),
+        float(qtype == 'explanation'),
+        float(qtype == 'complex'),
+        qconf,
+    ])
+
+
+def rank(values: np.ndarray) -> np.ndarray:
+    """Ranks with ties averaged, as Spearman's rho expects."""
+    order  = np.argsort(values, kind='mergesort')
+    ranks  = np.empty(len(values))
+    sorted_values = values[order]
+    i = 0
+    while i < len(values):
+        j = i
+        while j + 1 < len(values) and sorted_values[j + 1] == sorted_values[i]:
+            j += 1
+        ranks[order[i:j + 1]] = (i + j) / 2
+        i = j + 1
+    return ranks
+
+
+def spearman(a, b):
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    if len(a) < 3:
+        return None
+    ra, rb = rank(a), rank(b)
+    if ra.std() == 0 or rb.std() == 0:
+        return None
+    return round(float(np.corrcoef(ra, rb)[0, 1]), 4)
+
+
+class SurrogateScorer:
+    """
+    Multi-output ridge regression from features() to the five 0-4 attribute
+    scores plus the composite metric. Trained on LLM judge results observed
+    during the run (weighted higher, since those are what it has to imitate)
+    and on human HelpSteer2 labels, which only inform the SHARED_SCALE
+    attributes; complexity, verbosity and the composite are learnt from judge
+    results alone. Refit whenever asked, in milliseconds.
+    """
+
+    def __init__(self, composite_fn, alpha: float = 1.0, judge_weight: float = 2.0):
+        self.composite_fn = composite_fn
+        self.alpha        = alpha
+        self.judge_weight = judge_weight
+
+        self.labelled = []      # (prompt, response, scores, source)
+        self.coef     = None
+        self.fit_size = 0
+        self._mean    = None
+        self._std     = None
+        self._lock    = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        return self
+
+    # ── Training data ────────────────────────────────────────────────────────
+    def add_human_labels(self, examples):
+        for ex in examples:
+            scores = {a: int(round(float(ex[a]))) for a in SHARED_SCALE}
+            self.labelled.append((ex.prompt, ex.response, scores, "human"))
+
+    def observe(self, prompt: str, response: str, scores: dict):
+        """Records one LLM judge result (called from the metric)."""
+        if response and all(a in scores for a in ATTRIBUTES):
+            with self._lock:
+                self.labelled.append((prompt, response, dict(scores), "judge"))
+
+    def _targets(self, scores: dict) -> list:
+        """One value per output; NaN where the row says nothing about it (see SHARED_SCALE)."""
+        composite = self.composite_fn(scores) if all(a in scores for a in ATTRIBUTES) else math.nan
+        return [scores.get(a, math.nan) for a in ATTRIBUTES] + [composite]
+
+    # ── Model ────────────────────────────────────────────────────────────────
+    def fit(self):
+        with self._lock:
+            rows = list(self.labelled)
+        judged = sum(src == "judge" for *_, src in rows)
+        if len(rows) < 10 or judged == 0:
+            raise ValueError(f"Surrogate needs at least 10 labelled responses including judge-scored ones, "
+                             f"has {len(rows)} ({judged} judge-scored)")
+
+        X = np.array([features(p, r) for p, r, _, _ in rows])
+        Y = np.array([self._targets(s) for _, _, s, _ in rows], dtype=float)
+        w = np.array([self.judge_weight if src == "judge" else 1.0 for *_, src in rows])
+
+        self._mean = X.mean(axis=0)
+        self._std  = X.std(axis=0) + 1e-9
+        Xs = np.hstack([(X - self._mean) / self._std, np.ones((len(X), 1))])
+
+        # Weighted ridge, closed form, one output at a time so unlabelled rows weigh nothing;
+        # the intercept column is not penalised
+        penalty = self.alpha * np.eye(Xs.shape[1])
+        penalty[-1, -1] = 0.0
+        known   = ~np.isnan(Y)
+        coef    = np.empty((Xs.shape[1], Y.shape[1]))
+        for k in range(Y.shape[1]):
+            Xw = Xs * (w * known[:, k])[:, None]
+            coef[:, k] = np.linalg.solve(Xs.T @ Xw + penalty, Xw.T @ np.nan_to_num(Y[:, k]))
+        self.coef     = coef
+        self.fit_size = len(rows)
+
+        logger.info(f"Surrogate fit on {len(rows)} responses ({judged} judge-scored)")
+        return self
+
+    def predict(self, pairs: list) -> np.ndarray:
+        """(n, 6) predictions: the five attributes (clipped to 0-4), then the composite."""
+        X  = np.array([features(p, r) for p, r in pairs])
+        Xs = np.hstack([(X - self._mean) / self._std, np.ones((len(X), 1))])
+        out = Xs @ self.coef
+        out[:, :len(ATTRIBUTES)] = np.clip(out[:, :len(ATTRIBUTES)], 0, 4)
+        return out
+
+    def composite(self, pairs: list) -> np.ndarray:
+        return self.predict(pairs)[:, -1]
+
+    # ── Fidelity ─────────────────────────────────────────────────────────────
+    def fidelity(self, pairs: list, scores: list) -> dict:
+        """Spearman rank correlation between surrogate predictions and the attributes the reference scores have."""
+        if not pairs:
+            return {"n": 0}
+        predicted = self.predict(pairs)
+        report    = {"n": len(pairs)}
+        if all(a in scores[0] for a in ATTRIBUTES):
+            report["composite"] = spearman(predicted[:, -1], [self.composite_fn(s) for s in scores])
+        for i, attr in enumerate(ATTRIBUTES):
+            if attr in scores[0]:
+                report[attr] = spearman(predicted[:, i], [s[attr] for s in scores])
+        return report
+
+    def heldout_fidelity(self) -> dict:
+        """Fidelity against the judge results observed after the last fit — never trained on."""
+        with self._lock:
+            heldout = [(p, r, sc) for p, r, sc, src in self.labelled[self.fit_size:] if src == "judge"]
+        return self.fidelity([(p, r) for p, r, _ in heldout], [sc for _, _, sc in heldout])
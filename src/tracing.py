@@ -0,0 +1,290 @@
+"""
+Hierarchical Span Tracing
+Opt-in run > phase > trial > example > module > LM spans, exported as Chrome-trace JSON plus a top-sinks table
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+
+import dspy
+from dspy.utils.callback import BaseCallback
+
+from src.accounting import _module_label, add_history_listener
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('trace_span', default=None)
+
+
+class Span:
+    __slots__ = ('name', 'cat', 'args', 'start', 'parent', 'child_s', 'tid', 'token')
+
+    def __init__(self, name: str, cat: str, args: dict, parent):
+        self.name    = name
+        self.cat     = cat
+        self.args    = args
+        self.start   = time.perf_counter()
+        self.parent  = parent
+        self.child_s = 0.0
+        self.tid     = _track_id()
+        self.token   = None
+
+
+def _track_id() -> int:
+    # Concurrent asyncio tasks share a thread; give each task its own track so spans nest cleanly
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+
+class _NoopSpan:
+    """What span() returns while tracing is off: one shared object, no allocation, no clock read."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _SpanContext:
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'span')
+
+    def __init__(self, tracer, name: str, cat: str, args: dict):
+        self.tracer = tracer
+        self.name   = name
+        self.cat    = cat
+        self.args   = args
+
+    def __enter__(self):
+        self.span = self.tracer.begin(self.name, self.cat, **self.args)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.end(self.span, error=type(exc).__name__ if exc_type else None)
+        return False
+
+
+class Tracer:
+    """
+    Collects finished spans as Chrome-trace "complete" events. Parents come from
+    a contextvar, so nesting follows the call stack within a thread or asyncio
+    task; spans started in Evaluate worker threads are the roots of their track.
+    Disabled (the default) every entry point returns after one attribute check.
+    """
+
+    def __init__(self):
+        self.enabled    = False
+        self.path       = None
+        self.max_events = 0
+        self.events     = []
+        self.dropped    = 0
+        self.totals     = {}     # (cat, name) → [count, wall_s, self_s]
+        self._phase     = None
+        self._t0        = time.perf_counter()
+        self._lock      = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def enable(self, path: str, max_events: int = 2_000_000):
+        self.enabled    = True
+        self.path       = path
+        self.max_events = max_events
+        self._t0        = time.perf_counter()
+        logger.info(f"Tracing enabled → {path}")
+        return self
+
+    # ── Spans ────────────────────────────────────────────────────────────────
+    def span(self, name: str, cat: str = "app", **args):
+        if not self.enabled:
+            return _NOOP
+        return _SpanContext(self, name, cat, args)
+
+    def begin(self, name: str, cat: str = "app", **args):
+        if not self.enabled:
+            return None
+        span = Span(name, cat, args, _current.get())
+        span.token = _current.set(span)
+        return span
+
+    def end(self, span, **args):
+        if span is None:
+            return
+        now   = time.perf_counter()
+        wall  = now - span.start
+        try:
+            _current.reset(span.token)
+        except ValueError:
+            # Ended from another context (e.g. a phase closed by the next set_phase)
+            _current.set(span.parent)
+        if span.parent is not None:
+            span.parent.child_s += wall
+
+        args = {**span.args, **{k: v for k, v in args.items() if v is not None}}
+        with self._lock:
+            t = self.totals.setdefault((span.cat, span.name), [0, 0.0, 0.0])
+            t[0] += 1
+            t[1] += wall
+            t[2] += max(0.0, wall - span.child_s)
+            if len(self.events) < self.max_events:
+                self.events.append({
+                    "name": span.name,
+                    "cat":  span.cat,
+                    "ph":   "X",
+                    "ts":   round((span.start - self._t0) * 1e6, 1),
+                    "dur":  round(wall * 1e6, 1),
+                    "pid":  os.getpid(),
+                    "tid":  span.tid,
+                    "args": args,
+                })
+            else:
+                self.dropped += 1
+
+    def set_phase(self, name: str = None):
+        """Closes the open phase span, if any, and opens the next one (None just closes)."""
+        if not self.enabled:
+            return
+        self.end(self._phase)
+        self._phase = self.begin(name, "phase") if name else None
+
+    def traced(self, name: str = None, cat: str = "app"):
+        """Decorator form of span() for whole functions."""
+        def decorate(fn):
+            label = name or fn.__qualname__
+
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self.span(label, cat):
+                    return fn(*args, **kwargs)
+
+            wrapper.__wrapped__ = fn
+            wrapper.__name__    = fn.__name__
+            wrapper.__doc__     = fn.__doc__
+            return wrapper
+        return decorate
+
+    # ── dspy integration ─────────────────────────────────────────────────────
+    def install(self, lm=None):
+        """Registers the span callback (once) and records token counts from the LM's history."""
+        if not self.enabled:
+            return self
+        callbacks = dspy.settings.callbacks or []
+        if not any(isinstance(cb, TraceCallback) for cb in callbacks):
+            dspy.settings.configure(callbacks=[*callbacks, TraceCallback(self)])
+        if lm is not None:
+            add_history_listener(lm, self._on_history)
+        return self
+
+    def _on_history(self, entry: dict):
+        span = _current.get()
+        if span is not None and span.cat == "lm":
+            usage = entry.get("usage") or {}
+            span.args["prompt_tokens"]     = usage.get("prompt_tokens", 0) or 0
+            span.args["completion_tokens"] = usage.get("completion_tokens", 0) or 0
+            span.args["model"]             = entry.get("model") or span.args.get("model")
+
+    # ── Export ───────────────────────────────────────────────────────────────
+    # Trial spans only wait on their example threads, which are timed on their own tracks
+    NOT_SINKS = ("trial",)
+
+    def summary(self, top: int = 15) -> list:
+        with self._lock:
+            rows = [
+                {"cat": cat, "name": name, "count": n, "wall_s": round(wall, 3), "self_s": round(self_s, 3),
+                 "mean_ms": round(wall / n * 1000, 2)}
+                for (cat, name), (n, wall, self_s) in self.totals.items() if cat not in self.NOT_SINKS
+            ]
+        return sorted(rows, key=lambda r: -r["self_s"])[:top]
+
+    def export(self, path: str = None) -> str:
+        """Writes the Chrome-trace JSON (chrome://tracing, ui.perfetto.dev) and a .summary.json beside it."""
+        path = path or self.path
+        self.set_phase(None)
+        with self._lock:
+            trace = {"traceEvents": list(self.events), "displayTimeUnit": "ms",
+                     "otherData": {"dropped_events": self.dropped}}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        for target, payload in ((path, trace), (os.path.splitext(path)[0] + '.summary.json', self.summary(top=50))):
+            tmp_path = target + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, target)
+        logger.info(f"Trace: {len(trace['traceEvents']):,} spans → {path}")
+        return path
+
+    def report(self, top: int = 15) -> list:
+        rows = self.summary(top)
+        logger.info("─" * 50)
+        logger.info("TOP TIME SINKS (self time)")
+        logger.info("─" * 50)
+        for r in rows:
+            logger.info(f"  {r['cat'] + ':' + r['name']:<44} {r['self_s']:9.2f}s self | {r['wall_s']:9.2f}s wall | "
+                        f"{r['count']:>6,} × {r['mean_ms']:.1f} ms")
+        logger.info("─" * 50)
+        return rows
+
+
+class TraceCallback(BaseCallback):
+    """Turns dspy's module / adapter / LM / evaluate callbacks into spans."""
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._open  = {}
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def _begin(self, call_id, name: str, cat: str, **args):
+        self._open[call_id] = self.tracer.begin(name, cat, **args)
+
+    def _end(self, call_id, exception=None):
+        self.tracer.end(self._open.pop(call_id, None), error=type(exception).__name__ if exception else None)
+
+    def on_module_start(self, call_id, instance, inputs):
+        # A module with no enclosing span runs in an Evaluate worker thread: that call is the example
+        self._begin(call_id, _module_label(instance), "module" if _current.get() is not None else "example")
+
+    def on_module_end(self, call_id, outputs, exception=None):
+        self._end(call_id, exception)
+
+    def on_lm_start(self, call_id, instance, inputs):
+        self._begin(call_id, "lm", "lm", model=getattr(instance, 'model', 'unknown'))
+
+    def on_lm_end(self, call_id, outputs, exception=None):
+        self._end(call_id, exception)
+
+    def on_adapter_format_start(self, call_id, instance, inputs):
+        self._begin(call_id, "format", "adapter", adapter=type(instance).__name__)
+
+    def on_adapter_format_end(self, call_id, outputs, exception=None):
+        self._end(call_id, exception)
+
+    def on_adapter_parse_start(self, call_id, instance, inputs):
+        self._begin(call_id, "parse", "adapter", adapter=type(instance).__name__)
+
+    def on_adapter_parse_end(self, call_id, outputs, exception=None):
+        self._end(call_id, exception)
+
+    def on_evaluate_start(self, call_id, instance, inputs):
+        self._begin(call_id, "evaluate", "trial", examples=len(getattr(instance, 'devset', []) or []))
+
+    def on_evaluate_end(self, call_id, outputs, exception=None):
+        self._end(call_id, exception)
+
+
+# One process-wide tracer; off unless enable() is called
+tracer = Tracer()
+span   = tracer.span
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+pytest.importorskip("dspy")
+
+from src.batch import BatchProgress, iter_lines, run_batch
+
+
+def _write_input(path, prompts):
+    with open(path, 'w', encoding='utf-8') as f:
+        for prompt in prompts:
+            f.write(json.dumps({"prompt": prompt}) + '\n')
+    return [offset for offset, _ in iter_lines(str(path))]
+
+
+def _rows(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_low_water_waits_for_the_oldest_open_row(tmp_path):
+    offsets  = _write_input(tmp_path / "in.jsonl", ["a", "b", "c"])
+    progress = BatchProgress(str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"))
+    for i, offset in enumerate(offsets):
+        progress.start(offset, offsets[i + 1] if i + 1 < len(offsets) else offset + 100)
+
+    progress.finish(offsets[1])
+    assert progress.low_water == offsets[0]
+    progress.finish(offsets[0])
+    assert progress.low_water == offsets[2]
+    progress.finish(offsets[2])
+    assert progress.low_water == offsets[2] + 100
+    assert progress.rows_done == 3
+
+
+def test_load_rebuilds_from_output_and_retries_failed_rows(tmp_path):
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    offsets = _write_input(input_path, ["a", "b", "c", "d"])
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({"offset": offsets[0], "response": "ok"}) + '\n')
+        f.write(json.dumps({"offset": offsets[2], "error": "RateLimitError"}) + '\n')
+        f.write(json.dumps({"offset": offsets[3], "response": "ok"}) + '\n')
+        f.write('{"offset": ')    # torn final write
+
+    progress = BatchProgress(str(input_path), str(output_path))
+    progress.load(str(output_path))
+
+    assert [row["offset"] for row in _rows(output_path)] == [offsets[0], offsets[3]]
+    assert progress.rows_done == 2
+    assert progress.low_water == 0   # no progress file: everything is re-checked against the output
+    todo = [o for o in offsets if not progress.already_done(o)]
+    assert todo == [offsets[1], offsets[2]]
+
+
+def test_load_rejects_progress_of_another_input(tmp_path):
+    _write_input(tmp_path / "in.jsonl", ["a"])
+    progress = BatchProgress(str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"))
+    progress.save()
+
+    other = BatchProgress(str(tmp_path / "other.jsonl"), str(tmp_path / "out.jsonl"))
+    with pytest.raises(ValueError):
+        other.load(str(tmp_path / "out.jsonl"))
+
+
+def test_run_batch_resumes_without_redoing_rows(tmp_path, monkeypatch):
+    monkeypatch.setenv("LM_BACKEND", "local")
+    input_path, output_path = str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl")
+    offsets = _write_input(input_path, [f"What is {n} plus {n}?" for n in range(6)])
+    kwargs  = dict(score=False, concurrency=2, program_path=None, judge_cache=False, history_buffer=0)
+
+    run_batch(input_path, output_path, **kwargs)
+    assert sorted(row["offset"] for row in _rows(output_path)) == offsets
+
+    # Interrupted after the first three rows, one of which failed
+    rows = _rows(output_path)
+    kept = sorted(rows, key=lambda r: r["offset"])[:3]
+    kept[1] = {"offset": kept[1]["offset"], "error": "TimeoutError"}
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.writelines(json.dumps(row) + '\n' for row in kept)
+
+    stats = run_batch(input_path, output_path, **kwargs)
+    rows  = _rows(output_path)
+    assert sorted(row["offset"] for row in rows) == offsets
+    assert not any("error" in row for row in rows)
+    assert (stats["rows"], stats["rows_total"]) == (4, 6)   # the failed row and the three never written
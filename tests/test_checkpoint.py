@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+pytest.importorskip("dspy")
+
+from optimizer.checkpoint import RESUME_KEYS, RunCheckpoint
+
+CONFIG = {"judge_mode": "per_attribute", "seed": 42, "module": "predict", "num_trials": 10}
+
+
+def test_resume_keeps_saved_state(tmp_path):
+    path = str(tmp_path / "run_state.json")
+    RunCheckpoint.fresh(path, CONFIG).set_baseline_score(0.71)
+
+    resumed = RunCheckpoint.load(path, {**CONFIG, "run_name": "again"})
+    assert resumed.baseline_score == 0.71
+    assert resumed.state["config"]["run_name"] == "again"
+
+
+@pytest.mark.parametrize("key, value", [("seed", 7), ("module", "cot"), ("num_trials", 20)])
+def test_resume_refuses_a_changed_setting(tmp_path, key, value):
+    assert key in RESUME_KEYS
+    path = str(tmp_path / "run_state.json")
+    RunCheckpoint.fresh(path, CONFIG).save(force=True)
+    with pytest.raises(ValueError, match=key):
+        RunCheckpoint.load(path, {**CONFIG, key: value})
+
+
+def test_fresh_moves_an_unfinished_checkpoint_aside(tmp_path):
+    path = tmp_path / "run_state.json"
+    RunCheckpoint.fresh(str(path), CONFIG).set_baseline_score(0.5)
+
+    RunCheckpoint.fresh(str(path), CONFIG)
+    aside = [p for p in tmp_path.iterdir() if p.name != "run_state.json"]
+    assert len(aside) == 1
+    assert json.loads(aside[0].read_text())["baseline_score"] == 0.5
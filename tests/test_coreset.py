@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("dspy")
+
+from src.coreset import MinHasher, near_duplicates
+
+BASE = "Explain how a hash table resolves collisions and what happens to lookup time as the load factor grows"
+
+
+def test_minhash_is_deterministic_and_tracks_similarity():
+    hasher = MinHasher(num_perm=64)
+    assert hasher.signature(BASE) == hasher.signature(BASE.upper())
+
+    def similarity(a, b):
+        return sum(x == y for x, y in zip(hasher.signature(a), hasher.signature(b))) / 64
+
+    assert similarity(BASE, BASE + " please") > 0.7
+    assert similarity(BASE, "Write a short poem about autumn leaves falling in a quiet park") < 0.2
+
+
+def test_near_duplicates_clusters_rewordings_only():
+    texts = [
+        BASE,
+        "Write a short poem about autumn leaves falling in a quiet park",
+        BASE + " please",
+        "What is the capital of France?",
+    ]
+    assert near_duplicates(texts, threshold=0.7) == [[0, 2], [1], [3]]
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("dspy")
+
+from optimizer.early_stopping import SequentialStopper
+
+
+def _score_all(stopper, candidate, scores):
+    for i, score in enumerate(scores):
+        stopper.record(candidate, f"ex{i}", score)
+
+
+def test_first_full_candidate_becomes_incumbent():
+    stopper = SequentialStopper(num_examples=4, min_examples=2)
+    _score_all(stopper, "base", [0.5, 0.5, 0.5, 0.5])
+    assert stopper.incumbent == "base"
+    _score_all(stopper, "better", [0.9, 0.9, 0.9, 0.9])
+    assert stopper.incumbent == "better"
+
+
+def test_worse_candidate_is_stopped_and_cannot_win():
+    stopper = SequentialStopper(num_examples=20, min_examples=8)
+    _score_all(stopper, "base", [0.6] * 20)
+    _score_all(stopper, "worse", [0.2] * 10)
+    assert stopper.stopped == {"worse": 8}
+
+    # Unscored examples answer with the floor, so the partial mean never carries over
+    filled = [stopper.lookup("worse", f"ex{i}") for i in range(20)]
+    assert filled[:8] == [0.2] * 8
+    assert filled[8:] == [SequentialStopper.FLOOR] * 12
+    assert sum(filled) / 20 < 0.6
+    assert stopper.skipped == 12
+
+
+def test_close_candidate_keeps_running():
+    stopper = SequentialStopper(num_examples=20, min_examples=8)
+    _score_all(stopper, "base", [0.6] * 20)
+    _score_all(stopper, "close", [0.6, 0.58] * 5)
+    assert "close" not in stopper.stopped
+    assert stopper.lookup("close", "ex15") is None
+
+
+def test_without_early_stop_only_reuses_scores():
+    stopper = SequentialStopper(num_examples=20, min_examples=8, early_stop=False)
+    _score_all(stopper, "base", [0.6] * 20)
+    _score_all(stopper, "worse", [0.2] * 10)
+    assert stopper.stopped == {}
+    assert stopper.lookup("worse", "ex3") == 0.2
+    assert stopper.lookup("worse", "ex15") is None
+
+
+def test_restore_rederives_the_incumbent():
+    stopper = SequentialStopper(num_examples=3)
+    stopper.restore({"a": {"x": 0.4, "y": 0.4, "z": 0.4}, "b": {"x": 0.8, "y": 0.8, "z": 0.8}, "c": {"x": 1.0}}, {})
+    assert stopper.incumbent == "b"
@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+dspy = pytest.importorskip("dspy")
+
+from src.registry import SignatureRegistry, predictor_for
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return SignatureRegistry(root=str(tmp_path))
+
+
+def test_publish_activate_and_rollback(registry):
+    v1 = registry.publish("first")
+    v2 = registry.publish("second")
+    assert (v1, v2) == (1, 2)
+    assert registry.current()["instructions"] == "second"
+
+    assert registry.rollback() == v1
+    assert registry.current()["instructions"] == "first"
+    with pytest.raises(ValueError):
+        registry.rollback()
+
+
+def test_pending_is_cleared_by_activation(registry):
+    v1 = registry.publish("live")
+    v2 = registry.publish("candidate", activate=False)
+    assert registry.pointers()["current"] == v1
+    assert registry.pending()["version"] == v2
+
+    registry.activate(v2)
+    assert registry.pointers() == {"current": v2, "pending": None, "history": [v1, v2]}
+
+
+def test_activating_a_missing_version_leaves_pointers_alone(registry):
+    registry.publish("live")
+    before = registry.pointers()
+    with pytest.raises(FileNotFoundError):
+        registry.activate(7)
+    assert registry.pointers() == before
+
+
+def test_concurrent_activations_keep_every_history_entry(tmp_path):
+    # Separate instances share only the file lock, like separate processes
+    versions = [SignatureRegistry(root=str(tmp_path)).publish(f"v{i}", activate=False) for i in range(20)]
+    threads  = [threading.Thread(target=SignatureRegistry(root=str(tmp_path)).activate, args=(v,)) for v in versions]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(SignatureRegistry(root=str(tmp_path)).pointers()["history"]) == versions
+
+
+def test_predictor_for_rebuilds_the_published_module(registry):
+    demo    = {"prompt": "hi", "response": "hello"}
+    record  = registry.load(registry.publish("Be brief.", demos=[demo], module="cot"))
+    program = predictor_for(record)
+    assert isinstance(program, dspy.ChainOfThought)
+    assert program.predict.signature.instructions == "Be brief."
+    assert [d.toDict() for d in program.predict.demos] == [demo]
+
+    legacy = {k: v for k, v in record.items() if k != "module"}
+    assert isinstance(predictor_for(legacy), dspy.Predict)
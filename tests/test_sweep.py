@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("dspy")
+
+from optimizer.sweep import mean_ci
+
+
+def test_single_value_has_no_interval():
+    assert mean_ci([0.7]) == (0.7, None)
+
+
+def test_interval_uses_the_t_distribution():
+    mean, half = mean_ci([0.6, 0.7, 0.8])
+    assert mean == 0.7
+    assert half == pytest.approx(4.303 * 0.1 / 3 ** 0.5, abs=1e-3)
+
+
+def test_identical_values_have_zero_width():
+    assert mean_ci([0.5, 0.5, 0.5, 0.5]) == (0.5, 0.0)